@@ -0,0 +1,109 @@
+# aggregates.py
+import os
+import pandas as pd
+from database_manager import begin, bulk_insert, cursor, rollback, target_connection
+from instrumentation import path_size, span
+from settings import WAREHOUSE_DIR
+from warehouse import read_warehouse
+
+AGGREGATES_DIR = os.path.join(WAREHOUSE_DIR, "aggregates")
+
+# Summary table -> grouping columns. Every table carries Revenue (sum) and Lines (order line count).
+AGGREGATES = {
+    "AggRevenueByCountry": ["Country"],
+    "AggRevenueByCategory": ["Category"],
+    "AggRevenueByEmployee": ["EmployeeName", "FirstName"],
+    "AggRevenueByDate": ["FullDate"],
+    "AggRevenueByMonth": ["YearMonth"],
+    "AggRevenueByMonthCountry": ["Year", "MonthNum", "YearMonth", "Country"],
+    "AggRevenueByEmployeeMonth": ["EmployeeName", "Year", "YearMonth"],
+    "AggRevenueByCategoryCountry": ["Category", "Country"],
+    "AggDeliveryStatus": ["DeliveredFlag"],
+}
+
+SOURCE_COLUMNS = ["FullDate", "Revenue", "DeliveredFlag", "Category", "Country", "FirstName", "LastName"]
+
+
+def with_derived_columns(df):
+    """Returns the grouping columns the aggregates need, without touching the caller's frame."""
+    derived = pd.DataFrame(index=df.index)
+    if "FullDate" in df.columns:
+        full_date = pd.to_datetime(df["FullDate"])
+        derived["Year"] = full_date.dt.year
+        derived["MonthNum"] = full_date.dt.month
+        derived["YearMonth"] = full_date.dt.to_period("M").astype(str)
+    if "FirstName" in df.columns and "LastName" in df.columns:
+        derived["EmployeeName"] = df["FirstName"].astype(str) + " " + df["LastName"].astype(str)
+    return pd.concat([df, derived.drop(columns=[c for c in derived.columns if c in df.columns])], axis=1)
+
+
+def build_aggregate(df, name):
+    """Computes one summary table from order-line rows."""
+    keys = AGGREGATES[name]
+    if not set(keys) <= set(df.columns):
+        df = with_derived_columns(df)
+    agg = (
+        df.groupby(keys, observed=True)
+        .agg(Revenue=("Revenue", "sum"), Lines=("Revenue", "size"))
+        .reset_index()
+    )
+    # Summary tables are small; plain key columns keep them independent of the warehouse's categoricals
+    for key in keys:
+        if isinstance(agg[key].dtype, pd.CategoricalDtype):
+            agg[key] = agg[key].astype(agg[key].cat.categories.dtype)
+    return agg
+
+
+def build_aggregates(df):
+    df = with_derived_columns(df)
+    return {name: build_aggregate(df, name) for name in AGGREGATES}
+
+
+def write_aggregates(aggs, conn=None):
+    """Persists the summary tables as Parquet files and replaces their SQL Server copies."""
+    os.makedirs(AGGREGATES_DIR, exist_ok=True)
+    for name, agg in aggs.items():
+        agg.to_parquet(os.path.join(AGGREGATES_DIR, f"{name}.parquet"), index=False)
+
+    with target_connection(conn) as conn:
+        begin(conn)
+        try:
+            cur = cursor(conn)
+            for name, agg in aggs.items():
+                cur.execute(f"DELETE FROM {name}")
+                bulk_insert(conn, name, agg)
+            conn.commit()
+        except Exception as e:
+            print(f"[ERROR] Aggregate load failed: {e}")
+            rollback(conn)
+            raise
+    print(f"Materialized {len(aggs)} aggregate tables.")
+
+
+def refresh_aggregates(conn=None):
+    """Rebuilds every summary table from the warehouse, reading only the columns they group on."""
+    with span("aggregates.refresh") as s:
+        df = read_warehouse(columns=SOURCE_COLUMNS)
+        aggs = build_aggregates(df)
+        write_aggregates(aggs, conn)
+        s.add(rows=len(df), bytes_written=path_size(AGGREGATES_DIR), tables=len(aggs))
+    return aggs
+
+
+def load_aggregates(names=None):
+    """Reads materialized summary tables from disk. Missing tables are simply absent from the result."""
+    aggs = {}
+    for name in names or AGGREGATES:
+        path = os.path.join(AGGREGATES_DIR, f"{name}.parquet")
+        if os.path.exists(path):
+            aggs[name] = pd.read_parquet(path)
+    return aggs
+
+
+def aggregate(df, aggs, name):
+    """Returns a materialized summary table when available, otherwise computes it from df."""
+    if aggs and name in aggs:
+        return aggs[name]
+    if df is None:
+        raise ValueError(f"Aggregate {name} is not materialized and no detail rows were given")
+    return build_aggregate(df, name)
@@ -0,0 +1,81 @@
+# analysis_context.py
+import os
+from aggregates import build_aggregate, load_aggregates, with_derived_columns
+from warehouse import STAR_DIR, read_warehouse
+
+# Every column the figures, dashboard charts and OLAP report read from the warehouse
+CONTEXT_COLUMNS = [
+    "OrderId", "CustomerId", "EmployeeId", "ProductName", "Category", "FullDate", "Country", "City",
+    "FirstName", "LastName", "UnitPrice", "Quantity", "Discount", "Revenue", "DeliveredFlag",
+]
+
+# OLAP report column -> context column
+OLAP_COLUMNS = {
+    "OrderId": "OrderId",
+    "CustomerId": "CustomerId",
+    "EmployeeId": "EmployeeId",
+    "ProductName": "ProductName",
+    "Category": "Category",
+    "FullDate": "FullDate",
+    "CustomerCountry": "Country",
+    "CustomerCity": "City",
+    "EmployeeName": "EmployeeName",
+    "UnitPrice": "UnitPrice",
+    "Quantity": "Quantity",
+    "Discount": "Discount",
+    "Revenue": "Revenue",
+    "DeliveredFlag": "DeliveredFlag",
+    "Year": "Year",
+    "Month": "MonthName",
+}
+
+
+class AnalysisContext:
+    """Denormalized facts loaded once per process and shared by every report.
+
+    The warehouse is read on first use with only CONTEXT_COLUMNS, and derived
+    columns (Year, MonthNum, YearMonth, MonthName, EmployeeName) are added once.
+    Consumers must treat `frame` as read-only. Summary tables come from the ETL's
+    materialized aggregates when they cover the whole range, otherwise they
+    are computed from `frame`; either way each is built at most once.
+    """
+
+    def __init__(self, start=None, end=None, columns=CONTEXT_COLUMNS):
+        self.start = start
+        self.end = end
+        self.columns = columns
+        self._frame = None
+        self._aggs = {}
+        self._materialized = None
+
+    @property
+    def cache_key(self):
+        return f"context:{os.path.abspath(STAR_DIR)}:{self.start}:{self.end}"
+
+    @property
+    def frame(self):
+        if self._frame is None:
+            df = with_derived_columns(read_warehouse(columns=self.columns, start=self.start, end=self.end))
+            df["MonthName"] = df["FullDate"].dt.month_name()
+            self._frame = df
+            print(f"Analysis context loaded: {len(df)} order lines, {len(df.columns)} columns.")
+        return self._frame
+
+    def aggregate(self, name):
+        if name not in self._aggs:
+            if self._materialized is None:
+                # Materialized tables span the whole warehouse, so a date range rules them out
+                whole_range = self.start is None and self.end is None
+                self._materialized = load_aggregates() if whole_range else {}
+            if name in self._materialized:
+                self._aggs[name] = self._materialized[name]
+            else:
+                self._aggs[name] = build_aggregate(self.frame, name)
+        return self._aggs[name]
+
+    def aggregates(self, names):
+        return {name: self.aggregate(name) for name in names}
+
+    def olap_frame(self):
+        """The order lines with the OLAP report's column names."""
+        return self.frame[list(OLAP_COLUMNS.values())].set_axis(list(OLAP_COLUMNS), axis=1)
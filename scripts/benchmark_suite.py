@@ -0,0 +1,308 @@
+# benchmark_suite.py
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from settings import BASE_DIR
+
+RESULTS_DIR = os.path.join(BASE_DIR, "reports", "benchmarks")
+STAGES = ["transform", "load", "cube", "figures"]
+DEFAULT_SCALES = [10_000, 100_000]
+
+# A case is slower/larger than its baseline when the ratio exceeds 1 + threshold and
+# the difference is above the noise floor
+REGRESSION_THRESHOLD = 0.10
+MIN_WALL_DELTA_S = 0.005
+MIN_MEM_DELTA_MB = 5.0
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process so far, or None where the resource module is missing (Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _traced_peak_mb(run):
+    """Peak of the memory run() allocates, above what was allocated before it.
+
+    Measured with tracemalloc, which sees Python objects and NumPy/pandas
+    buffers but not Arrow's or SQLite's own allocators.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run()
+        return (tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+    finally:
+        if started:
+            tracemalloc.stop()
+
+
+def _measure(stage, case, scale, rows, run, repeat):
+    """Times run() `repeat` times, keeping the best wall time, then measures its peak memory in one more run.
+
+    Meant to run once per process: the peak RSS recorded is the process's, setup included.
+    """
+    record = {"stage": stage, "case": case, "scale": scale, "rows": rows, "setup_rss_mb": _peak_rss_mb()}
+    try:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        # Untimed: tracing slows allocation-heavy code down
+        peak_mb = _traced_peak_mb(run)
+    except Exception as e:
+        message = str(e).strip().splitlines()
+        record["error"] = f"{type(e).__name__}: {message[0] if message else ''}"
+        print(f"  {stage}.{case} @ {scale:,}: failed ({record['error']})")
+        return record
+    best = min(times)
+    record.update({
+        "wall_s": best,
+        "rows_per_s": rows / best if best > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "traced_peak_mb": peak_mb,
+        "repeat": repeat,
+    })
+    rss = f"peak RSS {record['peak_rss_mb']:.0f} MB, " if record["peak_rss_mb"] is not None else ""
+    print(f"  {stage}.{case} @ {scale:,}: {best:.3f}s ({record['rows_per_s'] or 0:,.0f} rows/s, "
+          f"{rss}{record['traced_peak_mb']:.0f} MB allocated)")
+    return record
+
+
+def bench_transform(scale, workdir):
+    from benchmark_transforms import make_raw_tables
+    from etl_pipeline import transform_customers, transform_employees, transform_products, transform_facts
+
+    raw = make_raw_tables(scale)
+    lines = len(raw["order_details"])
+
+    def run():
+        dims = {
+            "dim_customers": transform_customers(raw["customers"]),
+            "dim_employees": transform_employees(raw["employees"]),
+            "dim_products": transform_products(raw["products"]),
+        }
+        transform_facts(raw["orders"].copy(), raw["order_details"], dims)
+
+    return lines, {"transform_facts": run}
+
+
+def bench_load(scale, workdir):
+    from benchmark_warehouse import LINES_PER_ORDER, make_frames
+    from database_manager import get_sqlite_connection, load_data, setup_sqlite
+
+    frames = make_frames(int(scale * LINES_PER_ORDER))
+    rows = sum(len(df) for df in frames.values())
+    path = os.path.join(workdir, "bench.sqlite")
+
+    def run():
+        # Schema setup is part of every load into a fresh target
+        if os.path.exists(path):
+            os.remove(path)
+        conn = get_sqlite_connection(path)
+        try:
+            setup_sqlite(conn)
+            load_data(**frames, conn=conn)
+        finally:
+            conn.close()
+
+    return rows, {"load_data_sqlite": run}
+
+
+def _context(scale, workdir):
+    """Writes a scratch warehouse of `scale` orders and returns an analysis context over it."""
+    import warehouse
+    from analysis_context import AnalysisContext
+    from benchmark_warehouse import LINES_PER_ORDER, make_frames
+
+    warehouse.write_warehouse(make_frames(int(scale * LINES_PER_ORDER)), export_csv=False)
+    context = AnalysisContext()
+    context.frame
+    return context
+
+
+def bench_cube(scale, workdir):
+    import olap_cube
+
+    df = _context(scale, workdir).olap_frame()
+    rows = len(df)
+    cube = olap_cube.build_report_cube(df)
+    return rows, {
+        "build": lambda: olap_cube.build_report_cube(df),
+        "roll_up": lambda: cube.roll_up(["Year", "Month", "CustomerCountry"], "Date", measures=["Revenue"]),
+        "slice": lambda: cube.slice("Category", olap_cube.SLICE_CATEGORY).to_frame(),
+        "dice": lambda: cube.dice({"Year": olap_cube.DICE_YEARS, "CustomerCountry": olap_cube.DICE_COUNTRIES}).to_frame(),
+        "pivot": lambda: cube.pivot("Category", "CustomerCountry", "Revenue"),
+        "grouping_sets": lambda: cube.grouping_sets(olap_cube.REPORT_GROUPING_SETS),
+    }
+
+
+def bench_figures(scale, workdir):
+    import generate_interactive_figures as figures
+
+    context = _context(scale, workdir)
+    aggs = context.aggregates(figures.FIGURE_AGGREGATES)
+    rows = len(context.frame)
+    figures.FIGURES_DIR = os.path.join(workdir, "figures")
+    os.makedirs(figures.FIGURES_DIR, exist_ok=True)
+    return rows, {builder.__name__: lambda b=builder: b(context.frame, aggs) for builder in figures.FIGURE_BUILDERS}
+
+
+# Each stage sets up its input and returns (rows, {case: run}); the setup is repeated for every case
+BENCHMARKS = {
+    "transform": bench_transform,
+    "load": bench_load,
+    "cube": bench_cube,
+    "figures": bench_figures,
+}
+
+
+def _run_case(stage, case, scale, repeat):
+    """Runs one case of a stage at one scale, in its own process so the peak RSS recorded is the case's own.
+
+    `case` None runs the stage's first case. Returns the case's record and the names of all the stage's cases.
+    """
+    from benchmark_warehouse import scratch_warehouse
+
+    workdir = tempfile.mkdtemp(prefix=f"bench_{stage}_")
+    try:
+        with scratch_warehouse(workdir):
+            rows, cases = BENCHMARKS[stage](scale, workdir)
+            case = case or next(iter(cases))
+            return _measure(stage, case, scale, rows, cases[case], repeat), list(cases)
+    except Exception as e:
+        traceback.print_exc()
+        return {"stage": stage, "case": case or "setup", "scale": scale, "error": f"{type(e).__name__}: {e}"}, []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(stages=STAGES, scales=DEFAULT_SCALES, repeat=3, output=None):
+    """Runs every stage at every scale (number of orders, ~2.5 lines each) and writes the results as JSON."""
+    results = []
+    # A fresh interpreter per case: imports, caches and the RSS high-water mark are not carried over between cases
+    spawn = multiprocessing.get_context("spawn")
+
+    def run_case(stage, case, scale):
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            record, cases = pool.submit(_run_case, stage, case, scale, repeat).result()
+        results.append(record)
+        return cases
+
+    for scale in scales:
+        for stage in stages:
+            print(f"[{stage}] {scale:,} orders")
+            # The first case's process also reports the stage's case names
+            cases = run_case(stage, None, scale)
+            for case in cases[1:]:
+                run_case(stage, case, scale)
+
+    report = {
+        "meta": {
+            "created_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "scales": list(scales),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench-{pd.Timestamp.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    return report
+
+
+def _mb(record, metric):
+    value = record.get(metric)
+    return float("nan") if value is None else value
+
+
+def compare_results(baseline_path, candidate_path, threshold=REGRESSION_THRESHOLD):
+    """Prints wall time and peak memory of matching cases side by side. Returns the regressed cases."""
+    with open(baseline_path) as f:
+        baseline = {(r["stage"], r["case"], r["scale"]): r for r in json.load(f)["results"]}
+    with open(candidate_path) as f:
+        candidate = {(r["stage"], r["case"], r["scale"]): r for r in json.load(f)["results"]}
+
+    regressions = []
+    print(f"{'case':<45} {'scale':>9} {'wall (s)':>21} {'peak RSS (MB)':>21} {'peak alloc (MB)':>21}")
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        name = f"{key[0]}.{key[1]}"
+        if "error" in old or "error" in new:
+            print(f"{name:<45} {key[2]:>9,}   {'error' if 'error' in new else 'fixed'}")
+            if "error" in new and "error" not in old:
+                regressions.append((key, "error"))
+            continue
+        flags = []
+        for metric, floor in (("wall_s", MIN_WALL_DELTA_S), ("peak_rss_mb", MIN_MEM_DELTA_MB),
+                              ("traced_peak_mb", MIN_MEM_DELTA_MB)):
+            # Older result files, and runs where RSS is unavailable, only compare on what both recorded
+            if old.get(metric) is None or new.get(metric) is None:
+                continue
+            if new[metric] > old[metric] * (1 + threshold) and new[metric] - old[metric] > floor:
+                flags.append(metric)
+                regressions.append((key, metric))
+        print(f"{name:<45} {key[2]:>9,} {old['wall_s']:>9.3f} -> {new['wall_s']:<9.3f} "
+              f"{_mb(old, 'peak_rss_mb'):>9.0f} -> {_mb(new, 'peak_rss_mb'):<9.0f} "
+              f"{_mb(old, 'traced_peak_mb'):>9.0f} -> {_mb(new, 'traced_peak_mb'):<9.0f} "
+              f"{'REGRESSION ' + ', '.join(flags) if flags else ''}")
+    for key in sorted(baseline.keys() - candidate.keys()):
+        print(f"{key[0]}.{key[1]} @ {key[2]:,}: missing from {os.path.basename(candidate_path)}")
+    print(f"{len(regressions)} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the ETL transform, SQLite load, OLAP cube and figure stages.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="run the suite and write a JSON result file")
+    run.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    run.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="numbers of orders")
+    run.add_argument("--repeat", type=int, default=3, help="runs per case; the best wall time is kept")
+    run.add_argument("--output", help=f"result file (default: a timestamped file in {RESULTS_DIR})")
+    compare = commands.add_parser("compare", help="flag regressions of a result file against a baseline")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run_suite(args.stages, args.scales, args.repeat, args.output)
+    else:
+        sys.exit(1 if compare_results(args.baseline, args.candidate, args.threshold) else 0)
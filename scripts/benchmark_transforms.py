@@ -0,0 +1,106 @@
+# benchmark_transforms.py
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from etl_pipeline import transform_customers, transform_employees, transform_products, transform_facts
+
+
+def make_raw_tables(n_orders, seed=42):
+    """Builds Access-shaped source frames with n_orders orders and ~2.5 lines per order."""
+    rng = np.random.default_rng(seed)
+    n_customers, n_employees, n_products = 500, 20, 80
+
+    customers = pd.DataFrame({
+        "ID": np.arange(1, n_customers + 1),
+        "Company": [f"Company {i}" for i in range(n_customers)],
+        "First Name": "Anna", "Last Name": "Bedecs",
+        "Address": "123 1st Street", "City": "Seattle", "State/Province": "WA",
+        "ZIP/Postal Code": "99999", "Country/Region": "USA", "Business Phone": "(123)555-0100",
+    })
+    employees = pd.DataFrame({
+        "ID": np.arange(1, n_employees + 1),
+        "First Name": "Nancy", "Last Name": "Freehafer", "Job Title": "Sales Representative",
+        "City": "Seattle", "State/Province": "WA", "Country/Region": "USA", "Home Phone": "(123)555-0102",
+    })
+    products = pd.DataFrame({
+        "ID": np.arange(1, n_products + 1),
+        "Product Name": [f"Product {i}" for i in range(n_products)],
+        "Category": "Beverages", "List Price": rng.uniform(2, 80, n_products).round(2),
+    })
+
+    order_dates = pd.Timestamp("2006-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365, n_orders), unit="D")
+    shipped = pd.Series(order_dates + pd.to_timedelta(rng.integers(1, 10, n_orders), unit="D"))
+    shipped[rng.random(n_orders) < 0.15] = pd.NaT
+    orders = pd.DataFrame({
+        "Order ID": np.arange(1, n_orders + 1),
+        "Employee ID": rng.integers(1, n_employees + 1, n_orders),
+        "Customer ID": rng.integers(1, n_customers + 1, n_orders),
+        "Order Date": order_dates,
+        "Shipped Date": shipped,
+        "Shipping Fee": rng.uniform(0, 200, n_orders).round(2),
+        "Taxes": 0.0,
+    })
+
+    lines = rng.integers(1, 5, n_orders)
+    details = pd.DataFrame({
+        "Order ID": np.repeat(orders["Order ID"].to_numpy(), lines),
+        "Product ID": rng.integers(1, n_products + 1, lines.sum()),
+        "Unit Price": rng.uniform(2, 80, lines.sum()).round(2),
+        "Quantity": rng.integers(1, 100, lines.sum()),
+        "Discount": rng.choice([0.0, 0.05, 0.1], lines.sum()),
+    })
+    return {"customers": customers, "employees": employees, "products": products,
+            "orders": orders, "order_details": details}
+
+
+def legacy_fact_orders(raw_orders):
+    """The former row-wise FactOrders columns, kept only as a baseline."""
+    def to_sql_date(val):
+        if pd.isna(val):
+            return None
+        return val.to_pydatetime() if hasattr(val, 'to_pydatetime') else val
+
+    fact_orders = raw_orders.copy()
+    parsed = pd.to_datetime(fact_orders["Order Date"])
+    fact_orders["DateId"] = parsed.apply(lambda x: int(x.strftime("%Y%m%d")) if pd.notna(x) else -1)
+    fact_orders["ShippedDate"] = pd.to_datetime(fact_orders["Shipped Date"]).apply(to_sql_date)
+    dates = pd.DataFrame({"FullDate": pd.Series(parsed.dropna().unique()).sort_values()})
+    dates["DateId"] = dates["FullDate"].dt.strftime("%Y%m%d").astype(int)
+    dates["MonthName"] = dates["FullDate"].dt.strftime("%B")
+    return fact_orders
+
+
+def bench_transforms(n_orders, legacy=True):
+    raw = make_raw_tables(n_orders)
+    dims = {
+        "dim_customers": transform_customers(raw["customers"]),
+        "dim_employees": transform_employees(raw["employees"]),
+        "dim_products": transform_products(raw["products"]),
+    }
+    results = {}
+
+    start = time.perf_counter()
+    frames = transform_facts(raw["orders"].copy(), raw["order_details"], dims)
+    elapsed = time.perf_counter() - start
+    results["vectorized"] = elapsed
+    print(f"[vectorized] {n_orders:,} orders / {len(frames['fact_order_details']):,} lines "
+          f"in {elapsed:.2f}s ({n_orders / elapsed:,.0f} orders/sec)")
+
+    if legacy:
+        start = time.perf_counter()
+        legacy_fact_orders(raw["orders"])
+        elapsed = time.perf_counter() - start
+        results["row_wise_dates_only"] = elapsed
+        print(f"[row-wise]   DateId/ShippedDate/DimDate columns alone: {elapsed:.2f}s "
+              f"({n_orders / elapsed:,.0f} orders/sec)")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark of the ETL transform layer.")
+    parser.add_argument("--orders", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--no-legacy", action="store_true", help="skip the row-wise baseline")
+    args = parser.parse_args()
+    for n in args.orders:
+        bench_transforms(n, legacy=not args.no_legacy)
@@ -0,0 +1,97 @@
+# benchmark_warehouse.py
+import argparse
+import os
+from contextlib import contextmanager
+import shutil
+import tempfile
+import time
+import pandas as pd
+import aggregates
+import warehouse
+from benchmark_transforms import make_raw_tables
+from etl_pipeline import transform_customers, transform_employees, transform_products, transform_facts
+
+LINES_PER_ORDER = 2.5
+
+
+def make_frames(n_rows, seed=42):
+    """Builds the ETL frames (dimensions and facts) for about n_rows order lines through the real transforms."""
+    raw = make_raw_tables(int(n_rows / LINES_PER_ORDER), seed=seed)
+    dims = {
+        "dim_customers": transform_customers(raw["customers"]),
+        "dim_employees": transform_employees(raw["employees"]),
+        "dim_products": transform_products(raw["products"]),
+    }
+    return transform_facts(raw["orders"], raw["order_details"], dims)
+
+
+def _dir_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+@contextmanager
+def scratch_warehouse(workdir):
+    """Points the warehouse (facts, dimensions and summary tables) at `workdir` for the duration."""
+    saved = (warehouse.STAR_DIR, warehouse.FACTS_DIR, warehouse.DIMENSIONS_DIR, aggregates.AGGREGATES_DIR)
+    warehouse.STAR_DIR = os.path.join(workdir, "star")
+    warehouse.FACTS_DIR = os.path.join(warehouse.STAR_DIR, "fact_order_lines")
+    warehouse.DIMENSIONS_DIR = os.path.join(warehouse.STAR_DIR, "dimensions")
+    aggregates.AGGREGATES_DIR = os.path.join(workdir, "aggregates")
+    try:
+        yield
+    finally:
+        warehouse.STAR_DIR, warehouse.FACTS_DIR, warehouse.DIMENSIONS_DIR, aggregates.AGGREGATES_DIR = saved
+
+
+def bench_warehouse(n_rows, workdir=None):
+    """Compares the legacy wide CSV read with default dtypes against the typed star-schema warehouse."""
+    frames = make_frames(n_rows)
+    scratch = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="warehouse_bench_")
+    csv_path = os.path.join(workdir, "merged_northwind.csv")
+    results = {}
+    try:
+        with scratch_warehouse(workdir):
+            warehouse.write_warehouse(frames, export_csv=False)
+            del frames
+            # The wide file the warehouse used to be, with the same rows and columns
+            warehouse.read_warehouse().to_csv(csv_path, index=False)
+            start = time.perf_counter()
+            df = pd.read_csv(csv_path)
+            results["csv_defaults"] = {
+                "load_s": time.perf_counter() - start,
+                "memory_mb": df.memory_usage(deep=True).sum() / 1e6,
+                "disk_mb": _dir_size(csv_path) / 1e6,
+            }
+            del df
+
+            start = time.perf_counter()
+            df = warehouse.read_warehouse()
+            results["parquet_typed"] = {
+                "load_s": time.perf_counter() - start,
+                "memory_mb": df.memory_usage(deep=True).sum() / 1e6,
+                "disk_mb": _dir_size(warehouse.STAR_DIR) / 1e6,
+            }
+            rows = len(df)
+    finally:
+        if scratch:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{rows:,} order lines")
+    for name, r in results.items():
+        print(f"  [{name:<13}] load {r['load_s']:7.2f}s  memory {r['memory_mb']:9.1f} MB  disk {r['disk_mb']:9.1f} MB")
+    csv, typed = results["csv_defaults"], results["parquet_typed"]
+    print(f"  typed warehouse: {csv['memory_mb'] / typed['memory_mb']:.1f}x less memory, "
+          f"{csv['load_s'] / typed['load_s']:.1f}x faster load")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Memory and load time of the warehouse frame: legacy CSV vs typed star-schema Parquet.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000_000])
+    parser.add_argument("--workdir", help="scratch directory (default: a temporary directory)")
+    args = parser.parse_args()
+    for n in args.rows:
+        bench_warehouse(n, args.workdir)
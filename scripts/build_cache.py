@@ -0,0 +1,173 @@
+# build_cache.py
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from collections import namedtuple
+import pandas as pd
+from settings import FIGURES_DIR, BUILD_CACHE_KEEP
+
+MANIFEST_PATH = os.path.join(FIGURES_DIR, "build_manifest.json")
+STORE_DIR = os.path.join(FIGURES_DIR, ".build_cache")
+
+# One planned build: `reason` is None when the outputs are already up to date
+Build = namedtuple("Build", ["target", "outputs", "key", "digest", "reason"])
+
+
+def _update(h, value):
+    if isinstance(value, pd.DataFrame):
+        h.update(json.dumps([list(map(str, value.columns)), list(map(str, value.dtypes))]).encode())
+        h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, pd.Series):
+        h.update(str(value.dtype).encode())
+        h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(str(k).encode())
+            _update(h, value[k])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _update(h, item)
+    elif callable(value):
+        try:
+            h.update(inspect.getsource(value).encode())
+        except (OSError, TypeError):
+            h.update(value.__code__.co_code)
+    else:
+        h.update(json.dumps(value, sort_keys=True, default=str).encode())
+    h.update(b"\x00")
+
+
+def fingerprint(value):
+    """Stable hash of frames, plain values, nested dicts/lists and function source code."""
+    h = hashlib.sha256()
+    _update(h, value)
+    return h.hexdigest()[:32]
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:32]
+
+
+class BuildCache:
+    """Skips regenerating figure files whose inputs have not changed.
+
+    A build is keyed by hashes of the data slice it consumes, its parameters
+    (theme, layout, ...) and its code. Outputs are also copied to a store
+    addressed by that key, so returning to an earlier input restores them
+    without rendering. The manifest records every target's key and, per script
+    (`name`), what its last run rebuilt, restored or skipped, and why.
+    """
+
+    def __init__(self, name, manifest_path=MANIFEST_PATH, store_dir=STORE_DIR, keep=BUILD_CACHE_KEEP, force=False):
+        self.name = name
+        self.manifest_path = manifest_path
+        self.store_dir = store_dir
+        self.keep = keep
+        self.force = force
+        self.targets, self.runs = {}, {}
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    manifest = json.load(f)
+                self.targets, self.runs = manifest.get("targets", {}), manifest.get("runs", {})
+            except ValueError:
+                pass
+        self.run_log = []
+
+    def _stale_reason(self, target, key, outputs):
+        if self.force:
+            return "forced"
+        entry = self.targets.get(target)
+        if entry is None:
+            return "no previous build"
+        changed = [part for part in ("data", "params", "code") if entry["key"].get(part) != key[part]]
+        if changed:
+            return f"{', '.join(changed)} changed"
+        for path in outputs:
+            if not os.path.exists(path):
+                return f"{os.path.basename(path)} missing"
+            if entry["outputs"].get(os.path.basename(path)) != _file_hash(path):
+                return f"{os.path.basename(path)} modified"
+        return None
+
+    def _restore(self, digest, outputs):
+        stored = [os.path.join(self.store_dir, digest, os.path.basename(path)) for path in outputs]
+        if not all(os.path.exists(path) for path in stored):
+            return False
+        for src, dst in zip(stored, outputs):
+            shutil.copy2(src, dst)
+        return True
+
+    def plan(self, target, outputs, data=None, params=None, code=None):
+        """Decides whether `target` must be rebuilt, restoring its outputs from the store when possible."""
+        key = {"data": fingerprint(data), "params": fingerprint(params), "code": fingerprint(code)}
+        digest = fingerprint(key)
+        reason = self._stale_reason(target, key, outputs)
+        if reason is None:
+            self.run_log.append({"target": target, "action": "skipped", "reason": "up to date"})
+        elif not self.force and self._restore(digest, outputs):
+            self._record(target, outputs, key, digest)
+            self.run_log.append({"target": target, "action": "restored", "reason": reason})
+            reason = None
+        return Build(target, list(outputs), key, digest, reason)
+
+    def done(self, build, error=None):
+        """Records the result of running a planned build and stores its outputs."""
+        if error is not None or not all(os.path.exists(path) for path in build.outputs):
+            self.targets.pop(build.target, None)
+            self.run_log.append({"target": build.target, "action": "failed", "reason": build.reason})
+            return
+        store = os.path.join(self.store_dir, build.digest)
+        os.makedirs(store, exist_ok=True)
+        for path in build.outputs:
+            shutil.copy2(path, os.path.join(store, os.path.basename(path)))
+        self._record(build.target, build.outputs, build.key, build.digest)
+        self.run_log.append({"target": build.target, "action": "rebuilt", "reason": build.reason})
+
+    def _record(self, target, outputs, key, digest):
+        previous = self.targets.get(target, {}).get("history", [])
+        history = [digest] + [d for d in previous if d != digest]
+        for old in history[self.keep:]:
+            if not any(old in entry.get("history", []) for name, entry in self.targets.items() if name != target):
+                shutil.rmtree(os.path.join(self.store_dir, old), ignore_errors=True)
+        self.targets[target] = {
+            "key": key,
+            "outputs": {os.path.basename(path): _file_hash(path) for path in outputs},
+            "history": history[:self.keep],
+            "built_at": pd.Timestamp.now().isoformat(timespec="seconds"),
+        }
+
+    def run(self, target, outputs, build, data=None, params=None, code=None):
+        """Runs build() only if target is stale. Returns True when it was rebuilt."""
+        planned = self.plan(target, outputs, data, params, code)
+        if planned.reason is None:
+            return False
+        try:
+            build()
+        except Exception:
+            self.done(planned, error=True)
+            raise
+        self.done(planned)
+        return True
+
+    def save(self):
+        """Writes the manifest, including what this run (the latest for `name`) rebuilt and why."""
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        self.runs[self.name] = {"finished_at": pd.Timestamp.now().isoformat(timespec="seconds"), "builds": self.run_log}
+        manifest = {"targets": self.targets, "runs": self.runs}
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    def summary(self):
+        counts = {}
+        for entry in self.run_log:
+            counts[entry["action"]] = counts.get(entry["action"], 0) + 1
+        return "Build cache: " + ", ".join(f"{n} {action}" for action, n in sorted(counts.items()))
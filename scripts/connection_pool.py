@@ -0,0 +1,128 @@
+# connection_pool.py
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections shared by the scripts.
+
+    `factory` is any zero-argument callable returning a connection (pyodbc,
+    sqlite3, ...). Idle connections are health-checked before being handed
+    out and closed once they have been idle for `idle_timeout` seconds.
+    """
+
+    def __init__(self, factory, max_size=4, idle_timeout=300, health_check="SELECT 1", acquire_timeout=30, name="pool"):
+        self.factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self.acquire_timeout = acquire_timeout
+        self.name = name
+        self._idle = deque()  # (connection, last_used)
+        self._open = 0
+        self._cond = threading.Condition()
+        self.stats = {"created": 0, "reused": 0, "evicted": 0, "failed_checks": 0}
+        atexit.register(self.close_all)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        """Closes connections idle for longer than idle_timeout. Caller holds the lock."""
+        now = time.monotonic()
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+            self._open -= 1
+            self.stats["evicted"] += 1
+
+    def _is_healthy(self, conn):
+        if not self.health_check:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute(self.health_check)
+            cur.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Returns a healthy connection, opening one if the pool is not full."""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    # most recently used first, so rarely used connections age out
+                    conn, _ = self._idle.pop()
+                    break
+                if self._open < self.max_size:
+                    self._open += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"[{self.name}] no connection available after {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            # The health check runs outside the lock; only the counters need it
+            healthy = self._is_healthy(conn)
+            with self._cond:
+                self.stats["reused" if healthy else "failed_checks"] += 1
+            if healthy:
+                return conn
+            self._close(conn)
+
+        try:
+            conn = self.factory()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["created"] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Returns a connection to the pool, or closes it when discard is set."""
+        with self._cond:
+            if discard:
+                self._close(conn)
+                self._open -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._evict_idle()
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Leases a connection for the duration of a with block."""
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close_all(self):
+        """Closes every idle connection."""
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._close(conn)
+                self._open -= 1
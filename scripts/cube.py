@@ -0,0 +1,247 @@
+# cube.py
+import numpy as np
+import pandas as pd
+
+
+class Dimension:
+    """A dictionary-encoded dimension: one integer code per row and the distinct labels they point to.
+
+    Labels are sorted (or keep the category order of a Categorical), so ordering
+    by code is ordering by label. Missing values get code -1.
+    """
+
+    def __init__(self, name, codes, labels):
+        self.name = name
+        self.codes = codes
+        self.labels = labels
+
+    @classmethod
+    def from_values(cls, name, values):
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            values = pd.Categorical(values)
+            codes, labels = values.codes, values.categories
+        else:
+            codes, labels = pd.factorize(values, sort=True)
+        dtype = np.int32 if len(labels) < np.iinfo(np.int32).max else np.int64
+        return cls(name, np.ascontiguousarray(codes, dtype=dtype), np.asarray(labels))
+
+    def lookup(self, values):
+        """Returns the codes of the given labels, -1 for labels not in the dimension."""
+        return pd.Index(self.labels).get_indexer(list(values))
+
+    def take(self, mask):
+        return Dimension(self.name, self.codes[mask], self.labels)
+
+
+class Cube:
+    """In-memory OLAP cube over a frame of order lines.
+
+    Dimensions are stored as integer codes and measures as contiguous float64
+    arrays, so every aggregation is a bincount over combined group codes rather
+    than a hash group-by on strings. `dimensions` is a list of column names or a
+    dict of name -> values for dimensions derived outside the frame;
+    `hierarchies` maps a hierarchy name to its levels, coarsest first
+    (e.g. {"Date": ["Year", "Month", "Day"]}). Missing measure values count as
+    zero, as in a pandas sum.
+
+    With a `cache` (see query_cache.QueryCache) and a `cache_key` naming the
+    source frame, aggregate and pivot results are cached by dimensions,
+    measures and the slice/dice filters applied so far.
+    """
+
+    def __init__(self, frame, dimensions, measures, hierarchies=None, cache=None, cache_key=None):
+        if not isinstance(dimensions, dict):
+            dimensions = {name: frame[name] for name in dimensions}
+        self.dimensions = {name: Dimension.from_values(name, values) for name, values in dimensions.items()}
+        self.measures = {
+            name: np.ascontiguousarray(np.nan_to_num(frame[name].to_numpy(dtype=np.float64)))
+            for name in measures
+        }
+        self.hierarchies = dict(hierarchies or {})
+        for hierarchy, levels in self.hierarchies.items():
+            missing = [level for level in levels if level not in self.dimensions]
+            if missing:
+                raise ValueError(f"Hierarchy {hierarchy} refers to unknown dimensions {missing}")
+        self.frame = frame
+        self.rows = np.arange(len(frame))
+        self.cache = cache
+        self.cache_key = cache_key
+        self.filters = []
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cached(self, operation, compute, **params):
+        if self.cache is None or self.cache_key is None:
+            return compute()
+        key = {"cube": self.cache_key, "operation": operation, "filters": self.filters, **params}
+        return self.cache.get_or_compute(key, compute)
+
+    def _subset(self, mask, selections):
+        cube = Cube.__new__(Cube)
+        cube.dimensions = {name: dim.take(mask) for name, dim in self.dimensions.items()}
+        cube.measures = {name: values[mask] for name, values in self.measures.items()}
+        cube.hierarchies = self.hierarchies
+        cube.frame = self.frame
+        cube.rows = self.rows[mask]
+        cube.cache = self.cache
+        cube.cache_key = self.cache_key
+        cube.filters = self.filters + [selections]
+        return cube
+
+    def _group_ids(self, by):
+        """Combines the codes of `by` into one id per row (row-major over the label grid)."""
+        dims = [self.dimensions[name] for name in by]
+        shape = tuple(len(dim.labels) for dim in dims)
+        valid = np.ones(len(self), dtype=bool)
+        for dim in dims:
+            valid &= dim.codes >= 0
+        ids = np.zeros(int(valid.sum()), dtype=np.int64)
+        for dim, size in zip(dims, shape):
+            ids = ids * size + dim.codes[valid]
+        return ids, valid, shape
+
+    def aggregate(self, by, measures=None):
+        """Sums measures grouped by the given dimensions, one row per non-empty cell, ordered by label."""
+        by = [by] if isinstance(by, str) else list(by)
+        measures = list(self.measures) if measures is None else list(measures)
+        return self._cached("aggregate", lambda: self._aggregate(by, measures), by=by, measures=measures)
+
+    def _aggregate(self, by, measures):
+        if not by:
+            return pd.DataFrame({m: [self.measures[m].sum()] for m in measures})
+
+        ids, valid, shape = self._group_ids(by)
+        n_cells = int(np.prod(shape, dtype=np.int64))
+        if n_cells > 4 * len(ids) + 1024:
+            # Sparse grid: number only the cells that occur
+            cells, ids = np.unique(ids, return_inverse=True)
+        else:
+            cells = np.arange(n_cells)
+        counts = np.bincount(ids, minlength=len(cells))
+        present = counts > 0
+
+        result = {}
+        for name, codes in zip(by, np.unravel_index(cells[present], shape)):
+            result[name] = self.dimensions[name].labels[codes]
+        for m in measures:
+            result[m] = np.bincount(ids, weights=self.measures[m][valid], minlength=len(cells))[present]
+        return pd.DataFrame(result)
+
+    def _hierarchy_levels(self, by, hierarchy):
+        levels = self.hierarchies[hierarchy]
+        return levels, [level for level in levels if level in by]
+
+    def roll_up(self, by, hierarchy, measures=None):
+        """Aggregates one level coarser along `hierarchy` by dropping its finest level from `by`."""
+        by = list(by)
+        levels, present = self._hierarchy_levels(by, hierarchy)
+        if not present:
+            raise ValueError(f"None of the {hierarchy} levels {levels} are in {by}")
+        return self.aggregate([name for name in by if name != present[-1]], measures)
+
+    def drill_down(self, by, hierarchy, measures=None):
+        """Aggregates one level finer along `hierarchy` by adding its next level after the finest in `by`."""
+        by = list(by)
+        levels, present = self._hierarchy_levels(by, hierarchy)
+        depth = levels.index(present[-1]) + 1 if present else 0
+        if depth >= len(levels):
+            raise ValueError(f"{hierarchy} is already at its finest level ({levels[-1]})")
+        position = by.index(present[-1]) + 1 if present else len(by)
+        by.insert(position, levels[depth])
+        return self.aggregate(by, measures)
+
+    def dice(self, selections):
+        """Returns the sub-cube whose rows match every {dimension: [labels]} selection."""
+        mask = np.ones(len(self), dtype=bool)
+        for name, values in selections.items():
+            dim = self.dimensions[name]
+            # Lookup table over codes; the extra last slot answers code -1 (missing)
+            keep = np.zeros(len(dim.labels) + 1, dtype=bool)
+            codes = dim.lookup(values)
+            keep[codes[codes >= 0]] = True
+            mask &= keep[dim.codes]
+        return self._subset(mask, {name: list(values) for name, values in selections.items()})
+
+    def slice(self, name, value):
+        """Returns the sub-cube where one dimension is fixed to a single label."""
+        return self.dice({name: [value]})
+
+    def pivot(self, rows, columns, measure, fill_value=0):
+        """Cross-tabulates a measure, keeping only the row and column labels that occur."""
+        return self._cached("pivot", lambda: self._pivot(rows, columns, measure, fill_value),
+                            rows=rows, columns=columns, measure=measure, fill_value=fill_value)
+
+    def _pivot(self, rows, columns, measure, fill_value):
+        ids, valid, shape = self._group_ids([rows, columns])
+        n_cells = shape[0] * shape[1]
+        counts = np.bincount(ids, minlength=n_cells).reshape(shape)
+        values = np.bincount(ids, weights=self.measures[measure][valid], minlength=n_cells).reshape(shape)
+        values[counts == 0] = fill_value
+        keep_rows, keep_cols = counts.any(axis=1), counts.any(axis=0)
+        return pd.DataFrame(
+            values[keep_rows][:, keep_cols],
+            index=pd.Index(self.dimensions[rows].labels[keep_rows], name=rows),
+            columns=pd.Index(self.dimensions[columns].labels[keep_cols], name=columns),
+        )
+
+    def grouping_sets(self, sets, measures=None):
+        """Aggregates every grouping set in one pass, like SQL GROUP BY GROUPING SETS.
+
+        `sets` maps a name to its dimensions ([] for the grand total). Rows are
+        grouped once at the grain of all the sets' dimensions together, with
+        missing labels kept as their own group, and each set is rolled up from
+        that small table. Returns {name: frame of labels, summed measures and Lines}.
+        """
+        measures = list(self.measures) if measures is None else list(measures)
+        sets = {name: list(by) for name, by in sets.items()}
+        return self._cached("grouping_sets", lambda: self._grouping_sets(sets, measures), sets=sets, measures=measures)
+
+    def _grouping_sets(self, sets, measures):
+        grain = list(dict.fromkeys(name for by in sets.values() for name in by))
+        dims = [self.dimensions[name] for name in grain]
+        # One extra code per dimension for missing labels, so no row drops out of the sets that ignore it
+        shape = tuple(len(dim.labels) + 1 for dim in dims)
+        ids = np.zeros(len(self), dtype=np.int64)
+        for dim, size in zip(dims, shape):
+            ids = ids * size + np.where(dim.codes >= 0, dim.codes, size - 1)
+        n_cells = int(np.prod(shape, dtype=np.int64))
+        if n_cells > 4 * len(ids) + 1024:
+            cells, ids = np.unique(ids, return_inverse=True)
+        else:
+            cells = np.arange(n_cells)
+        counts = np.bincount(ids, minlength=len(cells))
+        present = counts > 0
+
+        fine = {name: codes for name, codes in zip(grain, np.unravel_index(cells[present], shape))}
+        for m in measures:
+            fine[m] = np.bincount(ids, weights=self.measures[m], minlength=len(cells))[present]
+        fine["Lines"] = counts[present]
+        results = roll_up_grouping_sets(pd.DataFrame(fine), sets, measures + ["Lines"])
+
+        for name, by in sets.items():
+            for dim in by:
+                labels = self.dimensions[dim].labels
+                codes = results[name][dim].to_numpy()
+                results[name][dim] = pd.api.extensions.take(labels, np.where(codes < len(labels), codes, -1), allow_fill=True)
+        return results
+
+    def to_frame(self):
+        """Returns the source rows in this (sub-)cube."""
+        return self.frame.take(self.rows)
+
+
+def roll_up_grouping_sets(frame, sets, measures):
+    """Sums `measures` of a frame already grouped at a fine grain into each of the grouping sets.
+
+    Missing keys form their own group, as NULLs do in SQL. Returns {name: frame}
+    ordered by the set's keys.
+    """
+    results = {}
+    for name, by in sets.items():
+        if by:
+            grouped = frame.groupby(list(by), dropna=False, observed=True, sort=True)[measures].sum()
+            results[name] = grouped.reset_index()
+        else:
+            results[name] = frame[measures].sum().to_frame().T.astype(frame[measures].dtypes.to_dict())
+    return results
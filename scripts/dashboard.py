@@ -1,12 +1,14 @@
 
 import os
-import pyodbc
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from olap_cube import generate_olap_report
+from analysis_context import AnalysisContext
 
-from settings import SQL_SERVER, SQL_DATABASE, FIGURES_DIR
+from database_manager import SQL_POOL, rollback
+from query_cache import QUERY_CACHE, cached_read_sql
+from build_cache import BuildCache
+from settings import FIGURES_DIR
 
 if not os.path.exists(FIGURES_DIR):
     os.makedirs(FIGURES_DIR)
@@ -17,18 +19,53 @@ plt.rcParams['figure.figsize'] = (12, 6)
 plt.rcParams['savefig.dpi'] = 300
 plt.rcParams['font.family'] = 'sans-serif'
 
-def get_connection():
-    from settings import SQL_DRIVER
-    conn_str = f"DRIVER={{{SQL_DRIVER}}};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};Trusted_Connection=yes;"
-    return pyodbc.connect(conn_str)
-
-def generate_charts():
+def read_summary(conn, summary_query, detail_query):
+    """Reads a summary table materialized by the ETL, falling back to aggregating the fact tables."""
     try:
-        conn = get_connection()
-    except Exception as e:
-        print(f"[WARN] Could not connect to SQL Server: {e}. Skipping static chart generation.")
-        return
-    
+        df = cached_read_sql(summary_query, conn)
+        if not df.empty:
+            return df
+    except Exception:
+        rollback(conn)
+    return cached_read_sql(detail_query, conn)
+
+def plot_revenue_by_country(df):
+    plt.figure()
+    ax = sns.barplot(data=df.head(10), x="TotalRevenue", y="Country", palette="viridis", hue="Country", legend=False)
+    ax.set_title("Top 10 Markets by Revenue", fontsize=20, fontweight='bold', pad=20)
+    ax.set_xlabel("Revenue ($)", fontsize=12)
+    ax.set_ylabel("")
+    plt.tight_layout()
+    plt.savefig(f"{FIGURES_DIR}/revenue_by_country.png")
+    plt.close()
+
+def plot_revenue_trend(df):
+    plt.figure()
+    sns.lineplot(data=df, x="FullDate", y="DailyRevenue", color="#89b4fa", linewidth=3)
+    plt.fill_between(df["FullDate"], df["DailyRevenue"], color="#89b4fa", alpha=0.2)
+
+    plt.title("Daily Revenue Performance", fontsize=20, fontweight='bold', pad=20)
+    plt.xlabel("Date", fontsize=12)
+    plt.ylabel("Revenue ($)", fontsize=12)
+    plt.grid(True, linestyle='--', alpha=0.3)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(f"{FIGURES_DIR}/orders_trend.png")
+    plt.close()
+
+def plot_employee_performance(df):
+    plt.figure()
+    sns.barplot(data=df, x="FirstName", y="Revenue", palette="flare", hue="FirstName", legend=False)
+    plt.title("Employee Revenue Generation", fontsize=20, fontweight='bold', pad=20)
+    plt.xlabel("Employee")
+    plt.ylabel("Total Revenue ($)")
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.savefig(f"{FIGURES_DIR}/employee_performance.png")
+    plt.close()
+
+def chart_data_from_sql(conn):
+    """Reads each chart's data from the summary tables, or the star schema when they are missing."""
     print("Generating: Revenue by Country...")
     query = """
     SELECT c.Country, SUM(fd.UnitPrice * fd.Quantity * (1 - fd.Discount)) as TotalRevenue 
@@ -39,16 +76,10 @@ def generate_charts():
     HAVING SUM(fd.UnitPrice * fd.Quantity * (1 - fd.Discount)) > 0
     ORDER BY TotalRevenue DESC
     """
-    df = pd.read_sql(query, conn)
-    
-    plt.figure()
-    ax = sns.barplot(data=df.head(10), x="TotalRevenue", y="Country", palette="viridis", hue="Country", legend=False)
-    ax.set_title("Top 10 Markets by Revenue", fontsize=20, fontweight='bold', pad=20)
-    ax.set_xlabel("Revenue ($)", fontsize=12)
-    ax.set_ylabel("")
-    plt.tight_layout()
-    plt.savefig(f"{FIGURES_DIR}/orders_by_country.png")
-    plt.close()
+    country = read_summary(conn, """
+    SELECT Country, Revenue as TotalRevenue FROM AggRevenueByCountry
+    WHERE Revenue > 0 ORDER BY TotalRevenue DESC
+    """, query)
 
     print("Generating: Revenue Trend...")
     query = """
@@ -60,20 +91,10 @@ def generate_charts():
     GROUP BY FullDate 
     ORDER BY FullDate
     """
-    df = pd.read_sql(query, conn)
-    
-    plt.figure()
-    sns.lineplot(data=df, x="FullDate", y="DailyRevenue", color="#89b4fa", linewidth=3)
-    plt.fill_between(df["FullDate"], df["DailyRevenue"], color="#89b4fa", alpha=0.2)
-    
-    plt.title("Daily Revenue Performance", fontsize=20, fontweight='bold', pad=20)
-    plt.xlabel("Date", fontsize=12)
-    plt.ylabel("Revenue ($)", fontsize=12)
-    plt.grid(True, linestyle='--', alpha=0.3)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(f"{FIGURES_DIR}/orders_trend.png")
-    plt.close()
+    daily = read_summary(conn, """
+    SELECT FullDate, Revenue as DailyRevenue FROM AggRevenueByDate
+    WHERE FullDate IS NOT NULL ORDER BY FullDate
+    """, query)
 
     print("Generating: Employee Revenue Performance...")
     query = """
@@ -84,19 +105,56 @@ def generate_charts():
     GROUP BY e.FirstName 
     ORDER BY Revenue DESC
     """
-    df = pd.read_sql(query, conn)
-    
-    plt.figure()
-    sns.barplot(data=df, x="FirstName", y="Revenue", palette="flare", hue="FirstName", legend=False)
-    plt.title("Employee Revenue Generation", fontsize=20, fontweight='bold', pad=20)
-    plt.xlabel("Employee")
-    plt.ylabel("Total Revenue ($)")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.savefig(f"{FIGURES_DIR}/employee_performance.png")
-    plt.close()
-    
-    conn.close()
+    employee = read_summary(conn, """
+    SELECT FirstName, SUM(Revenue) as Revenue FROM AggRevenueByEmployee
+    GROUP BY FirstName ORDER BY Revenue DESC
+    """, query)
+    return {"revenue_by_country": country, "orders_trend": daily, "employee_performance": employee}
+
+def chart_data_from_context(context):
+    """Derives each chart's data from the shared analysis context, without touching SQL Server."""
+    country = context.aggregate("AggRevenueByCountry").rename(columns={"Revenue": "TotalRevenue"})
+    country = country.loc[country["TotalRevenue"] > 0, ["Country", "TotalRevenue"]]
+    daily = context.aggregate("AggRevenueByDate").rename(columns={"Revenue": "DailyRevenue"})
+    employee = context.aggregate("AggRevenueByEmployee").groupby("FirstName", as_index=False)["Revenue"].sum()
+    return {
+        "revenue_by_country": country.sort_values("TotalRevenue", ascending=False).reset_index(drop=True),
+        "orders_trend": daily.loc[daily["FullDate"].notna(), ["FullDate", "DailyRevenue"]].sort_values("FullDate").reset_index(drop=True),
+        "employee_performance": employee.sort_values("Revenue", ascending=False).reset_index(drop=True),
+    }
+
+# chart -> function drawing figures/<chart>.png
+CHARTS = {
+    "revenue_by_country": plot_revenue_by_country,
+    "orders_trend": plot_revenue_trend,
+    "employee_performance": plot_employee_performance,
+}
+
+def generate_charts(force=False, context=None):
+    """Draws the static charts from `context` when given, otherwise from SQL Server."""
+    if context is not None:
+        data = chart_data_from_context(context)
+    else:
+        try:
+            # The lease is rolled back and discarded if the queries leave the connection unusable
+            with SQL_POOL.connection() as conn:
+                data = chart_data_from_sql(conn)
+        except Exception as e:
+            print(f"[WARN] Could not read the chart data from SQL Server: {e}. Skipping static chart generation.")
+            return
+        print(QUERY_CACHE.report())
+
+    # Charts are only redrawn when their data, the theme or the plot code changed
+    cache = BuildCache("dashboard", force=force)
+    params = {"theme": sns.axes_style(), "rc": {k: str(v) for k, v in plt.rcParams.items() if k.startswith(("figure.", "savefig.", "font."))}}
+    try:
+        for chart, plot in CHARTS.items():
+            df = data[chart]
+            cache.run(f"dashboard/{chart}", [f"{FIGURES_DIR}/{chart}.png"], lambda: plot(df),
+                      data=df, params=params, code=plot)
+    finally:
+        cache.save()
+        print(cache.summary())
 
 def generate_html_report():
     html_content = """
@@ -135,7 +193,7 @@ def generate_html_report():
         <div class="grid">
             <div class="card">
                 <h3>Revenue by Market</h3>
-                <img src="orders_by_country.png" alt="Revenue by Country">
+                <img src="revenue_by_country.png" alt="Revenue by Country">
             </div>
             <div class="card">
                 <h3>Product Category Insights</h3>
@@ -171,10 +229,17 @@ def generate_html_report():
     print(f"Strategic Dashboard generated at: {os.path.abspath(f'{FIGURES_DIR}/index.html')}")
 
 from generate_interactive_figures import generate_all_figures
+from instrumentation import run_report, span
 
 if __name__ == "__main__":
-  
-    generate_all_figures()
-    generate_charts()
-    generate_html_report()
-    generate_olap_report()
+    # One warehouse read feeds the figures, the charts and the OLAP report; one run report covers them all
+    with run_report("dashboard"):
+        context = AnalysisContext()
+        with span("dashboard.context") as s:
+            s.add(rows=len(context.frame))
+        generate_all_figures(context=context)
+        with span("dashboard.charts"):
+            generate_charts(context=context)
+        with span("dashboard.html_report"):
+            generate_html_report()
+        generate_olap_report(context=context)
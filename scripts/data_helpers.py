@@ -1,10 +1,14 @@
 # data_helpers.py
-import pyodbc
-import pandas as pd
-from settings import ACCESS_DB_PATH, ACCESS_DRIVER
+import threading
+from connection_pool import ConnectionPool
+from settings import (ACCESS_DB_PATH, ACCESS_DRIVER, ACCESS_POOL_SIZE, POOL_IDLE_TIMEOUT,
+                      EXTRACT_SOURCE, EXTRACT_FILES_DIR, EXTRACT_SQLITE_PATH)
+from sources import ArrowFileSource, PooledSqlSource, SqliteSource
 
 def get_access_connection():
     """Establishes connection to the Access Database."""
+    # Only the "odbc" source needs pyodbc (and an ODBC driver manager)
+    import pyodbc
     conn_str = f"DRIVER={{{ACCESS_DRIVER}}};DBQ={ACCESS_DB_PATH};"
     try:
         return pyodbc.connect(conn_str)
@@ -12,29 +16,83 @@ def get_access_connection():
         print(f"[ERROR] Connection to Access failed: {e}")
         raise
 
-def fetch_from_access(query):
-    """Executes a SQL query against Access DB and returns a DataFrame."""
+ACCESS_POOL = ConnectionPool(get_access_connection, max_size=ACCESS_POOL_SIZE,
+                             idle_timeout=POOL_IDLE_TIMEOUT, name="access")
+
+# Backend name -> factory taking an optional path (file directory or SQLite file)
+SOURCES = {
+    "odbc": lambda path=None: PooledSqlSource(ACCESS_POOL, name="Access"),
+    "files": lambda path=None: ArrowFileSource(path or EXTRACT_FILES_DIR),
+    "sqlite": lambda path=None: SqliteSource(path or EXTRACT_SQLITE_PATH),
+}
+
+_source = None
+_source_lock = threading.Lock()
+
+def set_source(source, path=None):
+    """Selects the extraction backend: a name in SOURCES (with an optional path) or an ExtractSource."""
+    global _source
+    if isinstance(source, str):
+        if source not in SOURCES:
+            raise ValueError(f"Unknown extraction source {source!r}; expected one of {list(SOURCES)}")
+        source = SOURCES[source](path)
+    with _source_lock:
+        previous, _source = _source, source
+    if previous is not None and previous is not source:
+        previous.close()
+    return source
+
+def get_source():
+    """The extraction backend, EXTRACT_SOURCE unless set_source chose another."""
+    global _source
+    with _source_lock:
+        if _source is None:
+            _source = SOURCES[EXTRACT_SOURCE]()
+        return _source
+
+def fetch_from_access(query, params=None, chunksize=None):
+    """Executes an Access SQL query against the extraction source and returns a DataFrame.
+
+    The source is the Access database through ODBC unless configured
+    otherwise (see sources.py). With chunksize, returns an iterator of
+    DataFrames instead, holding one pooled connection until the iterator is
+    exhausted. Source errors propagate.
+    """
+    source = get_source()
+    if chunksize:
+        return _fetch_chunks(source, query, params, chunksize)
+    print(f"[{source.name}] Executing: {query}")
     try:
-        conn = get_access_connection()
-        print(f"[Access] Executing: {query}")
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        return source.fetch(query, params)
     except Exception as e:
+        # Raised, not turned into an empty frame: an empty extract would be loaded as if the source were empty
         print(f"[ERROR] Query failed: {e}")
-        return pd.DataFrame()
+        raise
+
+def _fetch_chunks(source, query, params, chunksize):
+    print(f"[{source.name}] Streaming ({chunksize} rows/chunk): {query}")
+    yield from source.fetch_chunks(query, params, chunksize)
 
 def get_employees():
     """Fetches list of employees from Access."""
     query = "SELECT ID, [First Name] & ' ' & [Last Name] AS FullName FROM Employees"
     return fetch_from_access(query)
 
+EMPLOYEE_ORDERS_QUERY = """
+    SELECT O.[Order ID], O.[Order Date], O.[Shipped Date], C.Company AS CustomerName
+    FROM Orders O
+    LEFT JOIN Customers C ON O.[Customer ID] = C.ID
+    WHERE O.[Employee ID] = ?
+"""
+
+# Every employee's orders in one scan (see employee_orders.EmployeeOrdersLookup)
+ALL_EMPLOYEE_ORDERS_QUERY = """
+    SELECT O.[Employee ID], O.[Order ID], O.[Order Date], O.[Shipped Date], C.Company AS CustomerName
+    FROM Orders O
+    LEFT JOIN Customers C ON O.[Customer ID] = C.ID
+"""
+
 def get_employee_orders(employee_id):
     """Fetches orders for a specific employee from Access."""
-    query = f"""
-        SELECT O.[Order ID], O.[Order Date], O.[Shipped Date], C.Company AS CustomerName
-        FROM Orders O
-        LEFT JOIN Customers C ON O.[Customer ID] = C.ID
-        WHERE O.[Employee ID] = {employee_id}
-    """
-    return fetch_from_access(query)
+    # A bound parameter keeps the statement text constant, so the driver can reuse its prepared plan
+    return fetch_from_access(EMPLOYEE_ORDERS_QUERY, (int(employee_id),))
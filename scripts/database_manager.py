@@ -1,17 +1,148 @@
 # database_manager.py
-import pyodbc
-from settings import SQL_SERVER, SQL_DATABASE, SQL_DRIVER
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from contextlib import contextmanager
+from connection_pool import ConnectionPool
+from instrumentation import span
+from settings import (SQL_SERVER, SQL_DATABASE, SQL_DRIVER, SQLITE_DB_PATH, LOAD_BATCH_SIZE, SQL_POOL_SIZE, POOL_IDLE_TIMEOUT,
+                      WAREHOUSE_TARGET, DUCKDB_PATH)
 
 def get_sql_conn_str(db="master"):
     return f"DRIVER={{{SQL_DRIVER}}};SERVER={SQL_SERVER};DATABASE={db};Trusted_Connection=yes;"
 
+def get_sql_connection(db=SQL_DATABASE, autocommit=False):
+    """Opens a connection to the warehouse database (or another database on the same server)."""
+    # Only the SQL Server target needs pyodbc (and an ODBC driver manager)
+    import pyodbc
+    return pyodbc.connect(get_sql_conn_str(db), autocommit=autocommit)
+
+def get_duckdb_connection(path=DUCKDB_PATH):
+    """Opens (creating on first use) the embedded DuckDB warehouse file."""
+    # Optional dependency: only the DuckDB target needs it
+    import duckdb
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return duckdb.connect(path)
+
+# DuckDB allows one writing process per file: the database is opened once and pooled connections are its cursors
+_duckdb_database = None
+_duckdb_lock = threading.Lock()
+
+def _duckdb_cursor():
+    global _duckdb_database
+    with _duckdb_lock:
+        if _duckdb_database is None:
+            _duckdb_database = get_duckdb_connection()
+        return _duckdb_database.cursor()
+
+def get_target_connection():
+    """Opens a connection to the configured warehouse target (WAREHOUSE_TARGET)."""
+    if WAREHOUSE_TARGET == "duckdb":
+        return _duckdb_cursor()
+    return get_sql_connection()
+
+SQL_POOL = ConnectionPool(get_target_connection, max_size=SQL_POOL_SIZE,
+                          idle_timeout=POOL_IDLE_TIMEOUT, name=WAREHOUSE_TARGET)
+
+@contextmanager
+def target_connection(conn=None):
+    """Yields the given connection, or leases one from SQL_POOL when none is given."""
+    if conn is not None:
+        yield conn
+    else:
+        with SQL_POOL.connection() as pooled:
+            yield pooled
+
+TABLE_SCHEMAS = {
+    "DimCustomer": """
+        CustomerId NVARCHAR(50) PRIMARY KEY,
+        CompanyName NVARCHAR(255),
+        ContactName NVARCHAR(255),
+        Address NVARCHAR(255),
+        City NVARCHAR(100),
+        Region NVARCHAR(100),
+        PostalCode NVARCHAR(50),
+        Country NVARCHAR(100),
+        Phone NVARCHAR(50)
+    """,
+    "DimEmployee": """
+        EmployeeId NVARCHAR(50) PRIMARY KEY,
+        FirstName NVARCHAR(100),
+        LastName NVARCHAR(100),
+        Title NVARCHAR(100),
+        BirthDate DATETIME2,
+        HireDate DATETIME2,
+        City NVARCHAR(100),
+        Region NVARCHAR(100),
+        Country NVARCHAR(100),
+        HomePhone NVARCHAR(50)
+    """,
+    "DimProduct": """
+        ProductId INT PRIMARY KEY,
+        ProductName NVARCHAR(255),
+        Category NVARCHAR(100),
+        UnitPrice MONEY
+    """,
+    "DimDate": """
+        DateId INT PRIMARY KEY,
+        FullDate DATETIME2,
+        Day INT,
+        Month INT,
+        MonthName NVARCHAR(20)
+    """,
+    "FactOrders": """
+        OrderId INT PRIMARY KEY,
+        CustomerId NVARCHAR(50),
+        EmployeeId NVARCHAR(50),
+        DateId INT,
+        ShippedDate DATETIME2,
+        ShippingFee MONEY,
+        Taxes MONEY,
+        DeliveredFlag INT,
+        FOREIGN KEY (CustomerId) REFERENCES DimCustomer(CustomerId),
+        FOREIGN KEY (EmployeeId) REFERENCES DimEmployee(EmployeeId),
+        FOREIGN KEY (DateId) REFERENCES DimDate(DateId)
+    """,
+    "FactOrderDetails": """
+        DetailId INT IDENTITY(1,1) PRIMARY KEY,
+        OrderId INT,
+        ProductId INT,
+        UnitPrice MONEY,
+        Quantity INT,
+        Discount FLOAT,
+        FOREIGN KEY (OrderId) REFERENCES FactOrders(OrderId),
+        FOREIGN KEY (ProductId) REFERENCES DimProduct(ProductId)
+    """,
+    "EtlWatermark": """
+        PipelineName NVARCHAR(50) PRIMARY KEY,
+        LastOrderId INT,
+        LastOrderDate DATETIME2,
+        UpdatedAt DATETIME2
+    """
+}
+
+def setup_target():
+    """Recreates the star schema in the configured warehouse target."""
+    if WAREHOUSE_TARGET == "duckdb":
+        print(f"--- Setting up DuckDB ({DUCKDB_PATH}) ---")
+        with target_connection() as conn:
+            setup_duckdb(conn)
+    else:
+        setup_sql_server()
+
 def setup_sql_server():
     """Ensures SQL Server DB and Schema exist."""
     print("--- Setting up SQL Server ---")
     
 
     try:
-        conn = pyodbc.connect(get_sql_conn_str("master"), autocommit=True)
+        conn = get_sql_connection("master", autocommit=True)
         cur = conn.cursor()
         cur.execute("SELECT name FROM sys.databases WHERE name = ?", SQL_DATABASE)
         if not cur.fetchone():
@@ -26,70 +157,9 @@ def setup_sql_server():
 
  
     try:
-        conn = pyodbc.connect(get_sql_conn_str(SQL_DATABASE), autocommit=True)
+        conn = get_sql_connection(autocommit=True)
         cur = conn.cursor()
         
-        tables = {
-            "DimCustomer": """
-                CustomerId NVARCHAR(50) PRIMARY KEY,
-                CompanyName NVARCHAR(255),
-                ContactName NVARCHAR(255),
-                Address NVARCHAR(255),
-                City NVARCHAR(100),
-                Region NVARCHAR(100),
-                PostalCode NVARCHAR(50),
-                Country NVARCHAR(100),
-                Phone NVARCHAR(50)
-            """,
-            "DimEmployee": """
-                EmployeeId NVARCHAR(50) PRIMARY KEY,
-                FirstName NVARCHAR(100),
-                LastName NVARCHAR(100),
-                Title NVARCHAR(100),
-                BirthDate DATETIME2,
-                HireDate DATETIME2,
-                City NVARCHAR(100),
-                Region NVARCHAR(100),
-                Country NVARCHAR(100),
-                HomePhone NVARCHAR(50)
-            """,
-            "DimProduct": """
-                ProductId INT PRIMARY KEY,
-                ProductName NVARCHAR(255),
-                Category NVARCHAR(100),
-                UnitPrice MONEY
-            """,
-            "DimDate": """
-                DateId INT PRIMARY KEY,
-                FullDate DATETIME2,
-                Day INT,
-                Month INT,
-                MonthName NVARCHAR(20)
-            """,
-            "FactOrders": """
-                OrderId INT PRIMARY KEY,
-                CustomerId NVARCHAR(50),
-                EmployeeId NVARCHAR(50),
-                DateId INT,
-                ShippedDate DATETIME2,
-                ShippingFee MONEY,
-                Taxes MONEY,
-                DeliveredFlag INT,
-                FOREIGN KEY (CustomerId) REFERENCES DimCustomer(CustomerId),
-                FOREIGN KEY (EmployeeId) REFERENCES DimEmployee(EmployeeId),
-                FOREIGN KEY (DateId) REFERENCES DimDate(DateId)
-            """,
-            "FactOrderDetails": """
-                DetailId INT IDENTITY(1,1) PRIMARY KEY,
-                OrderId INT,
-                ProductId INT,
-                UnitPrice MONEY,
-                Quantity INT,
-                Discount FLOAT,
-                FOREIGN KEY (OrderId) REFERENCES FactOrders(OrderId),
-                FOREIGN KEY (ProductId) REFERENCES DimProduct(ProductId)
-            """
-        }
 
         # Drop tables in reverse order of dependencies if schema needs refresh
         # (For simplicity here, we only CREATE IF NOT EXISTS, but user might want a full refresh)
@@ -98,10 +168,10 @@ def setup_sql_server():
         # Actually, since we are adding columns, we should probably DROP them if they exist and we want to change schema.
         # Let's add a DROP logic for a clean sync.
         
-        for table in reversed(list(tables.keys())):
+        for table in reversed(list(TABLE_SCHEMAS.keys())):
             cur.execute(f"IF EXISTS (SELECT * FROM sysobjects WHERE name='{table}' AND xtype='U') DROP TABLE {table}")
 
-        for table, schema in tables.items():
+        for table, schema in TABLE_SCHEMAS.items():
             print(f"Creating Table: {table}")
             cur.execute(f"CREATE TABLE {table} ({schema})")
         
@@ -111,58 +181,375 @@ def setup_sql_server():
         print(f"[ERROR] Schema setup failed: {e}")
         raise
 
-def clear_tables():
+def clear_tables(conn=None):
     """Truncates tables before load."""
-    conn = pyodbc.connect(get_sql_conn_str(SQL_DATABASE), autocommit=True)
-    cur = conn.cursor()
-   
-    for t in ["FactOrderDetails", "FactOrders", "DimDate", "DimEmployee", "DimCustomer", "DimProduct"]:
-        try:
-            cur.execute(f"DELETE FROM {t}")
-        except:
-            pass
-    conn.close()
+    with target_connection(conn) as conn:
+        cur = cursor(conn)
+
+        for t in ["FactOrderDetails", "FactOrders", "DimDate", "DimEmployee", "DimCustomer", "DimProduct", "EtlWatermark"]:
+            try:
+                cur.execute(f"DELETE FROM {t}")
+            except:
+                pass
+        conn.commit()
     print("Target tables cleared.")
 
-def load_data(dim_customers, dim_employees, dim_date, dim_products, fact_orders, fact_order_details):
-    """Inserts DataFrames into SQL Server."""
-    conn = pyodbc.connect(get_sql_conn_str(SQL_DATABASE))
-    cur = conn.cursor()
-
-    print(f"Loading {len(dim_customers)} Customers...")
-    for _, r in dim_customers.iterrows():
-        cur.execute("INSERT INTO DimCustomer (CustomerId, CompanyName, ContactName, Address, City, Region, PostalCode, Country, Phone) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    str(r["CustomerId"]), r["CompanyName"], r.get("ContactName"), r.get("Address"), r["City"], r.get("Region"), r.get("PostalCode"), r["Country"], r.get("Phone"))
-
-    print(f"Loading {len(dim_employees)} Employees...")
-    for _, r in dim_employees.iterrows():
-        cur.execute("INSERT INTO DimEmployee (EmployeeId, FirstName, LastName, Title, BirthDate, HireDate, City, Region, Country, HomePhone) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                    str(r["EmployeeId"]), r["FirstName"], r["LastName"], r.get("Title"), r.get("BirthDate"), r.get("HireDate"), r["City"], r.get("Region"), r["Country"], r.get("HomePhone"))
-
-    print(f"Loading {len(dim_products)} Products...")
-    for _, r in dim_products.iterrows():
-        cur.execute("INSERT INTO DimProduct (ProductId, ProductName, Category, UnitPrice) VALUES (?, ?, ?, ?)",
-                    int(r["ProductId"]), r["ProductName"], r.get("Category"), r.get("UnitPrice"))
-
-    print(f"Loading {len(dim_date)} Dates...")
-    for _, r in dim_date.iterrows():
-        cur.execute("INSERT INTO DimDate (DateId, FullDate, Day, Month, MonthName) VALUES (?, ?, ?, ?, ?)",
-                    int(r["DateId"]), r["FullDate"].to_pydatetime(), r["Day"], r["Month"], r["MonthName"])
-
-    print(f"Loading {len(fact_orders)} Orders...")
-    for _, r in fact_orders.iterrows():
+LOAD_COLUMNS = {
+    "DimCustomer": ["CustomerId", "CompanyName", "ContactName", "Address", "City", "Region", "PostalCode", "Country", "Phone"],
+    "DimEmployee": ["EmployeeId", "FirstName", "LastName", "Title", "BirthDate", "HireDate", "City", "Region", "Country", "HomePhone"],
+    "DimProduct": ["ProductId", "ProductName", "Category", "UnitPrice"],
+    "DimDate": ["DateId", "FullDate", "Day", "Month", "MonthName"],
+    "FactOrders": ["OrderId", "CustomerId", "EmployeeId", "DateId", "ShippedDate", "ShippingFee", "Taxes", "DeliveredFlag"],
+    "FactOrderDetails": ["OrderId", "ProductId", "UnitPrice", "Quantity", "Discount"],
+}
+
+# Summary tables materialized by aggregates.py, keyed by their grouping columns.
+AGGREGATE_KEY_COLUMNS = {
+    "AggRevenueByCountry": ["Country NVARCHAR(100)"],
+    "AggRevenueByCategory": ["Category NVARCHAR(100)"],
+    "AggRevenueByEmployee": ["EmployeeName NVARCHAR(255)", "FirstName NVARCHAR(100)"],
+    "AggRevenueByDate": ["FullDate DATETIME2"],
+    "AggRevenueByMonth": ["YearMonth NVARCHAR(7)"],
+    "AggRevenueByMonthCountry": ["Year INT", "MonthNum INT", "YearMonth NVARCHAR(7)", "Country NVARCHAR(100)"],
+    "AggRevenueByEmployeeMonth": ["EmployeeName NVARCHAR(255)", "Year INT", "YearMonth NVARCHAR(7)"],
+    "AggRevenueByCategoryCountry": ["Category NVARCHAR(100)", "Country NVARCHAR(100)"],
+    "AggDeliveryStatus": ["DeliveredFlag INT"],
+}
+
+for _table, _keys in AGGREGATE_KEY_COLUMNS.items():
+    TABLE_SCHEMAS[_table] = ",\n".join(_keys + ["Revenue FLOAT", "Lines INT"])
+    LOAD_COLUMNS[_table] = [k.split()[0] for k in _keys] + ["Revenue", "Lines"]
+
+# Key columns are bound as text or integers regardless of the dtype pandas inferred.
+KEY_CASTS = {
+    "CustomerId": str,
+    "EmployeeId": str,
+    "ProductId": int,
+    "OrderId": int,
+    "DateId": int,
+}
+
+def get_sqlite_connection(path=SQLITE_DB_PATH):
+    """Opens the local SQLite target used for benchmarking the loader."""
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+def to_sqlite_schema(schema):
+    """Rewrites a SQL Server column list into its SQLite equivalent."""
+    return schema.replace("INT IDENTITY(1,1) PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+
+def setup_sqlite(conn):
+    """Recreates the star schema in a SQLite database."""
+    for table in reversed(list(TABLE_SCHEMAS.keys())):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for table, schema in TABLE_SCHEMAS.items():
+        conn.execute(f"CREATE TABLE {table} ({to_sqlite_schema(schema)})")
+    conn.commit()
+
+# SQL Server column types and their DuckDB equivalents (FLOAT is 8 bytes in SQL Server, 4 in DuckDB)
+DUCKDB_TYPES = [
+    (r"\bNVARCHAR\(\d+\)", "VARCHAR"),
+    (r"\bDATETIME2\b", "TIMESTAMP"),
+    (r"\bMONEY\b", "DOUBLE"),
+    (r"\bFLOAT\b", "DOUBLE"),
+]
+
+def to_duckdb_schema(table, schema):
+    """Rewrites a SQL Server column list into DuckDB's.
+
+    IDENTITY columns draw from a `Seq_<table>` sequence. Foreign keys are left
+    out: the ETL only loads rows whose keys exist (see transform_facts), and
+    DuckDB would refuse the dimension upserts of incremental loads on
+    referenced rows.
+    """
+    columns = [line.strip().rstrip(",") for line in schema.strip().splitlines()]
+    schema = ",\n".join(c for c in columns if c and not c.startswith("FOREIGN KEY"))
+    schema = schema.replace("INT IDENTITY(1,1) PRIMARY KEY", f"BIGINT DEFAULT nextval('Seq_{table}') PRIMARY KEY")
+    for pattern, duckdb_type in DUCKDB_TYPES:
+        schema = re.sub(pattern, duckdb_type, schema)
+    return schema
+
+def setup_duckdb(conn):
+    """Recreates the star schema in a DuckDB database from the same TABLE_SCHEMAS."""
+    for table in reversed(list(TABLE_SCHEMAS.keys())):
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+    for table, schema in TABLE_SCHEMAS.items():
+        if "IDENTITY" in schema:
+            conn.execute(f"CREATE OR REPLACE SEQUENCE Seq_{table}")
+        conn.execute(f"CREATE TABLE {table} ({to_duckdb_schema(table, schema)})")
+    conn.commit()
+
+def _concat_operator(parts):
+    """Rewrites `+` next to a string literal as `||` in the non-literal parts (odd indexes are literals)."""
+    for i in range(0, len(parts), 2):
+        if i > 0:
+            parts[i] = re.sub(r"^(\s*)\+", r"\1||", parts[i])
+        if i < len(parts) - 1:
+            parts[i] = re.sub(r"\+(\s*)$", r"||\1", parts[i])
+    return parts
+
+def to_dialect(query, dialect):
+    """Rewrites T-SQL written for SQL Server so it runs on SQLite or DuckDB.
+
+    String concatenation with `+` becomes `||` where one side is a string
+    literal (`FirstName + ' ' + LastName`), and ISNULL becomes COALESCE.
+    Everything else the reporting queries use is common to the three dialects.
+    """
+    if dialect == "mssql":
+        return query
+    parts = _concat_operator(re.split(r"('(?:[^']|'')*')", query))
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\bISNULL\s*\(", "COALESCE(", parts[i], flags=re.I)
+    return "".join(parts)
+
+def read_sql(query, conn, params=None):
+    """pd.read_sql with the query rewritten for the connection's dialect (see to_dialect)."""
+    return pd.read_sql(to_dialect(query, get_dialect(conn)), conn, params=params)
+
+def begin(conn):
+    """Starts an explicit transaction where the driver does not (DuckDB connections autocommit)."""
+    if get_dialect(conn) == "duckdb":
+        conn.execute("BEGIN TRANSACTION")
+
+def rollback(conn):
+    """Rolls back the current transaction; on DuckDB there may be none outside begin()."""
+    try:
+        conn.rollback()
+    except Exception:
+        if get_dialect(conn) != "duckdb":
+            raise
+
+def native_values(s):
+    """A Series as a list of native Python values (datetime for timestamps, None for missing)."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        # Positional: newer pandas returns a Series with a fresh index from to_pydatetime
+        values = pd.Series(np.asarray(s.dt.to_pydatetime(), dtype=object), index=s.index, dtype=object)
+    else:
+        values = s.astype(object)
+    return values.where(s.notna(), None).tolist()
+
+def to_native_columns(df, columns):
+    """Converts DataFrame columns to lists of native Python values, one column at a time."""
+    native = []
+    for col in columns:
+        s = df[col]
+        if col in KEY_CASTS and not s.empty:
+            s = s.astype(KEY_CASTS[col])
+        native.append(native_values(s))
+    return native
+
+def bulk_insert(conn, table, df, batch_size=LOAD_BATCH_SIZE, target=None):
+    """Inserts a DataFrame into a table with batched executemany calls. Returns rows/sec."""
+    columns = LOAD_COLUMNS[table]
+    target = target or table
+    placeholders = ", ".join("?" for _ in columns)
+    sql = f"INSERT INTO {target} ({', '.join(columns)}) VALUES ({placeholders})"
+    if get_dialect(conn) == "duckdb":
+        return _duckdb_insert(conn, target, df, columns)
+    rows = list(zip(*to_native_columns(df, columns))) if len(df) else []
+
+    start = time.perf_counter()
+    with span(f"load.{target}", rows=len(rows), table=table):
+        cur = conn.cursor()
+        if hasattr(cur, "fast_executemany"):
+            # pyodbc: bind each batch as a parameter array instead of one round trip per row
+            cur.fast_executemany = True
+        for i in range(0, len(rows), batch_size):
+            cur.executemany(sql, rows[i:i + batch_size])
+    elapsed = time.perf_counter() - start
+
+    rate = len(rows) / elapsed if elapsed > 0 else float("inf")
+    print(f"Loaded {len(rows)} rows into {target} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return rate
+
+def _duckdb_insert(conn, target, df, columns):
+    """Bulk loads a DataFrame into DuckDB as one Arrow scan, without converting rows to Python values."""
+    frame = df[columns]
+    casts = {col: KEY_CASTS[col] for col in columns if col in KEY_CASTS}
+    if casts and len(frame):
+        frame = frame.astype(casts)
+    col_list = ", ".join(columns)
+    start = time.perf_counter()
+    with span(f"load.{target}", rows=len(frame), table=target):
+        conn.register("bulk_frame", pa.Table.from_pandas(frame, preserve_index=False))
         try:
-            cur.execute("INSERT INTO FactOrders (OrderId, CustomerId, EmployeeId, DateId, ShippedDate, ShippingFee, Taxes, DeliveredFlag) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                        int(r["OrderId"]), str(r["CustomerId"]), str(r["EmployeeId"]), r["DateId"], r.get("ShippedDate"), r.get("ShippingFee"), r.get("Taxes"), r["DeliveredFlag"])
+            conn.execute(f"INSERT INTO {target} ({col_list}) SELECT {col_list} FROM bulk_frame")
+        finally:
+            conn.unregister("bulk_frame")
+    elapsed = time.perf_counter() - start
+    rate = len(frame) / elapsed if elapsed > 0 else float("inf")
+    print(f"Loaded {len(frame)} rows into {target} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return rate
+
+def load_data(dim_customers, dim_employees, dim_date, dim_products, fact_orders, fact_order_details,
+              conn=None, batch_size=LOAD_BATCH_SIZE):
+    """Bulk inserts DataFrames into SQL Server (or into the given connection, e.g. SQLite)."""
+    frames = {
+        "DimCustomer": dim_customers,
+        "DimEmployee": dim_employees,
+        "DimProduct": dim_products,
+        "DimDate": dim_date,
+        "FactOrders": fact_orders,
+        "FactOrderDetails": fact_order_details,
+    }
+    with target_connection(conn) as conn:
+        stats = {}
+        begin(conn)
+        try:
+            for table, df in frames.items():
+                print(f"Loading {len(df)} rows into {table}...")
+                stats[table] = bulk_insert(conn, table, df, batch_size)
+            conn.commit()
         except Exception as e:
-            print(f"[ERROR] Failed to load Order {r.get('OrderId')}: {e}")
-            print(f"Row data: {r.to_dict()}")
+            print(f"[ERROR] Bulk load failed: {e}")
+            rollback(conn)
             raise
+    return stats
 
-    print(f"Loading {len(fact_order_details)} Order Details...")
-    for _, r in fact_order_details.iterrows():
-        cur.execute("INSERT INTO FactOrderDetails (OrderId, ProductId, UnitPrice, Quantity, Discount) VALUES (?, ?, ?, ?, ?)",
-                    int(r["OrderId"]), int(r["ProductId"]), r["UnitPrice"], r["Quantity"], r["Discount"])
+# Natural keys used to merge staged rows. FactOrderDetails has no natural key,
+# so its staged rows replace every existing line of the staged orders (those
+# staged in FactOrders when it is merged too, so orders left without lines lose
+# their old ones, as in the warehouse).
+MERGE_KEYS = {
+    "DimCustomer": ["CustomerId"],
+    "DimEmployee": ["EmployeeId"],
+    "DimProduct": ["ProductId"],
+    "DimDate": ["DateId"],
+    "FactOrders": ["OrderId"],
+    "FactOrderDetails": None,
+}
 
-    conn.commit()
-    conn.close()
+def get_dialect(conn):
+    if isinstance(conn, sqlite3.Connection):
+        return "sqlite"
+    # DuckDB connections are defined in its "_duckdb" extension module
+    if type(conn).__module__.split(".")[0].lstrip("_") == "duckdb":
+        return "duckdb"
+    return "mssql"
+
+def target_identity(conn=None):
+    """Names the database a connection reads (the pooled warehouse target when none is given), for cache keys.
+
+    None for in-memory databases, which are not the same database in the next process.
+    """
+    if conn is None:
+        if WAREHOUSE_TARGET == "duckdb":
+            return f"duckdb:{os.path.abspath(DUCKDB_PATH)}"
+        return f"mssql:{SQL_SERVER}/{SQL_DATABASE}"
+    dialect = get_dialect(conn)
+    if dialect == "sqlite":
+        path = next((row[2] for row in conn.execute("PRAGMA database_list") if row[1] == "main"), "")
+    elif dialect == "duckdb":
+        path = conn.execute("SELECT path FROM duckdb_databases() WHERE database_name = current_database()").fetchone()[0]
+    else:
+        # Warehouse connections are only opened by get_sql_connection
+        path = f"{SQL_SERVER}/{SQL_DATABASE}"
+    return f"{dialect}:{path}" if path else None
+
+def cursor(conn):
+    """A cursor on the connection's own session (DuckDB's cursor() opens a separate one, with its own transaction and temp tables)."""
+    return conn if get_dialect(conn) == "duckdb" else conn.cursor()
+
+def stage_frame(conn, table, df, batch_size=LOAD_BATCH_SIZE):
+    """Bulk loads a DataFrame into an empty temporary copy of a table. Returns the stage name."""
+    columns = ", ".join(LOAD_COLUMNS[table])
+    cur = cursor(conn)
+    dialect = get_dialect(conn)
+    if dialect in ("sqlite", "duckdb"):
+        stage = f"Stage_{table}"
+        cur.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+        cur.execute(f"CREATE TEMP TABLE {stage} AS SELECT {columns} FROM {table} WHERE {'0' if dialect == 'sqlite' else 'false'}")
+    else:
+        stage = f"#Stage_{table}"
+        cur.execute(f"IF OBJECT_ID('tempdb..{stage}') IS NOT NULL DROP TABLE {stage}")
+        cur.execute(f"SELECT TOP 0 {columns} INTO {stage} FROM {table}")
+    bulk_insert(conn, table, df, batch_size, target=stage)
+    return stage
+
+def merge_stage(conn, table, stage, orders_stage=None):
+    """Merges a staged table into its target with a single set-based statement.
+
+    For FactOrderDetails, `orders_stage` is the staged FactOrders whose lines
+    are replaced; by default, the orders of the staged lines.
+    """
+    columns = LOAD_COLUMNS[table]
+    keys = MERGE_KEYS[table]
+    col_list = ", ".join(columns)
+    cur = cursor(conn)
+
+    if keys is None:
+        cur.execute(f"DELETE FROM {table} WHERE OrderId IN (SELECT DISTINCT OrderId FROM {orders_stage or stage})")
+        cur.execute(f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {stage}")
+        return
+
+    updates = [c for c in columns if c not in keys]
+    dialect = get_dialect(conn)
+    if dialect in ("sqlite", "duckdb"):
+        set_list = ", ".join(f"{c} = excluded.{c}" for c in updates)
+        # The WHERE keeps SQLite from reading ON CONFLICT as a join constraint
+        cur.execute(
+            f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {stage} WHERE {'1' if dialect == 'sqlite' else 'true'} "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {set_list}"
+        )
+    else:
+        on = " AND ".join(f"t.{k} = s.{k}" for k in keys)
+        set_list = ", ".join(f"t.{c} = s.{c}" for c in updates)
+        values = ", ".join(f"s.{c}" for c in columns)
+        cur.execute(
+            f"MERGE {table} AS t USING {stage} AS s ON {on} "
+            f"WHEN MATCHED THEN UPDATE SET {set_list} "
+            f"WHEN NOT MATCHED THEN INSERT ({col_list}) VALUES ({values});"
+        )
+
+def upsert_frames(frames, conn=None, batch_size=LOAD_BATCH_SIZE):
+    """Stages {table: DataFrame} and merges every table in dependency order, in one transaction."""
+    tables = [t for t in LOAD_COLUMNS if t in frames]
+    with target_connection(conn) as conn:
+        begin(conn)
+        try:
+            stages = {}
+            for table in tables:
+                stages[table] = stage_frame(conn, table, frames[table], batch_size)
+            for table in tables:
+                print(f"Merging {len(frames[table])} staged rows into {table}...")
+                with span(f"load.merge.{table}", rows=len(frames[table])):
+                    merge_stage(conn, table, stages[table], orders_stage=stages.get("FactOrders"))
+            conn.commit()
+        except Exception as e:
+            print(f"[ERROR] Incremental merge failed: {e}")
+            rollback(conn)
+            raise
+
+def upsert_data(dim_customers, dim_employees, dim_date, dim_products, fact_orders, fact_order_details,
+                conn=None, batch_size=LOAD_BATCH_SIZE):
+    """Stages the DataFrames and merges them into the star schema in one transaction."""
+    upsert_frames({
+        "DimCustomer": dim_customers,
+        "DimEmployee": dim_employees,
+        "DimProduct": dim_products,
+        "DimDate": dim_date,
+        "FactOrders": fact_orders,
+        "FactOrderDetails": fact_order_details,
+    }, conn, batch_size)
+
+def get_watermark(conn=None, pipeline="northwind"):
+    """Returns the (LastOrderId, LastOrderDate) high-water mark, or None before the first load."""
+    with target_connection(conn) as conn:
+        cur = cursor(conn)
+        cur.execute("SELECT LastOrderId, LastOrderDate FROM EtlWatermark WHERE PipelineName = ?", (pipeline,))
+        row = cur.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return int(row[0]), pd.Timestamp(row[1])
+
+def set_watermark(order_id, order_date, conn=None, pipeline="northwind"):
+    """Records the high-water mark reached by the last successful load."""
+    with target_connection(conn) as conn:
+        cur = cursor(conn)
+        cur.execute("DELETE FROM EtlWatermark WHERE PipelineName = ?", (pipeline,))
+        cur.execute(
+            "INSERT INTO EtlWatermark (PipelineName, LastOrderId, LastOrderDate, UpdatedAt) VALUES (?, ?, ?, ?)",
+            (pipeline, int(order_id), pd.Timestamp(order_date).to_pydatetime(), datetime.now()),
+        )
+        conn.commit()
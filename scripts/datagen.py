@@ -0,0 +1,423 @@
+# datagen.py
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from settings import DATA_DIR, DATAGEN_WORKERS
+
+GENERATED_DIR = os.path.join(DATA_DIR, "generated")
+
+# Per unit of scale factor: SF 1 is about 1M order lines, SF 100 about 100M
+ORDERS_PER_SF = 400_000
+CUSTOMERS_PER_SF = 1_000
+# Orders per generated chunk; each chunk has its own seed, so output does not depend on the worker count
+ORDERS_PER_CHUNK = 250_000
+MAX_LINES_PER_ORDER = 10
+
+START_DATE = "2006-01-01"
+YEARS = 3
+
+# Country -> (share of customers, [(city, state/province)])
+COUNTRIES = {
+    "USA": (0.34, [("Seattle", "WA"), ("Boston", "MA"), ("New York", "NY"), ("Chicago", "IL"), ("Los Angeles", "CA"),
+                   ("Las Vegas", "NV"), ("Portland", "OR"), ("Denver", "CO"), ("Miami", "FL"), ("Memphis", "TN")]),
+    "Germany": (0.12, [("Berlin", None), ("München", None), ("Hamburg", None), ("Frankfurt a.M.", None)]),
+    "UK": (0.10, [("London", None), ("Manchester", None), ("Cowes", "Isle of Wight")]),
+    "France": (0.09, [("Paris", None), ("Lyon", None), ("Marseille", None), ("Nantes", None)]),
+    "Brazil": (0.07, [("Sao Paulo", "SP"), ("Rio de Janeiro", "RJ"), ("Campinas", "SP")]),
+    "Canada": (0.06, [("Vancouver", "BC"), ("Montréal", "Québec"), ("Toronto", "ON")]),
+    "Mexico": (0.05, [("México D.F.", None)]),
+    "Spain": (0.04, [("Madrid", None), ("Barcelona", None), ("Sevilla", None)]),
+    "Italy": (0.04, [("Roma", None), ("Milano", None), ("Torino", None)]),
+    "Sweden": (0.03, [("Stockholm", None), ("Luleå", None)]),
+    "Venezuela": (0.02, [("Caracas", "DF"), ("Barquisimeto", "Lara")]),
+    "Austria": (0.02, [("Graz", None), ("Salzburg", None)]),
+    "Belgium": (0.02, [("Bruxelles", None), ("Charleroi", None)]),
+}
+
+# Category -> (share of products, list price range)
+CATEGORIES = {
+    "Beverages": (0.16, (4.5, 46.0)),
+    "Condiments": (0.10, (10.0, 40.0)),
+    "Dairy products": (0.08, (2.5, 55.0)),
+    "Confections": (0.10, (9.2, 81.0)),
+    "Baked Goods & Mixes": (0.07, (9.2, 25.0)),
+    "Jams, Preserves": (0.06, (25.0, 81.0)),
+    "Dried Fruit & Nuts": (0.08, (10.0, 53.0)),
+    "Canned Fruit & Vegetables": (0.08, (1.2, 39.0)),
+    "Canned Meat": (0.05, (9.0, 18.4)),
+    "Grains": (0.05, (7.0, 38.0)),
+    "Pasta": (0.04, (19.5, 38.0)),
+    "Sauces": (0.04, (19.0, 40.0)),
+    "Soups": (0.04, (1.95, 19.0)),
+    "Oil": (0.03, (21.35, 35.0)),
+    "Cereal": (0.03, (3.5, 9.2)),
+    "Chips, Snacks": (0.02, (1.8, 3.0)),
+}
+
+FIRST_NAMES = ["Anna", "Antonio", "Thomas", "Christina", "Martin", "Francisco", "Ming-Yang", "Elizabeth", "Sven",
+               "Roland", "Peter", "John", "Andre", "Carlos", "Helena", "Daniel", "Jean Philippe", "Catherine",
+               "Alexander", "George", "Bernard", "Karen", "Amritansh", "Soo Jung", "Nancy", "Andrew", "Jan",
+               "Mariya", "Steven", "Michael", "Robert", "Laura"]
+LAST_NAMES = ["Bedecs", "Gratacos Solsona", "Axen", "Lee", "O'Donnell", "Pérez-Olaeta", "Xie", "Andersen",
+              "Mortensen", "Wacker", "Krschne", "Edwards", "Ludick", "Grilo", "Kupkova", "Goldschmidt", "Bagel",
+              "Autier Miconi", "Eggerer", "Li", "Tham", "Toh", "Raghav", "Lee", "Freehafer", "Cencini", "Kotas",
+              "Sergienko", "Thorpe", "Neipper", "Zare", "Giussani"]
+JOB_TITLES = ["Owner", "Purchasing Manager", "Purchasing Representative", "Accounting Manager",
+              "Accounting Assistant", "Purchasing Assistant"]
+
+# Relative order volume per calendar month (Q4 peak) and weekday (Mon..Sun)
+MONTH_WEIGHTS = [0.85, 0.80, 0.95, 0.95, 1.0, 0.95, 0.90, 0.90, 1.05, 1.10, 1.25, 1.35]
+WEEKDAY_WEIGHTS = [1.1, 1.1, 1.1, 1.1, 1.0, 0.45, 0.3]
+# Year-over-year growth of order volume
+ANNUAL_GROWTH = 0.15
+
+CSV_OPTIONS = dict(quoting_style="needed")
+
+
+def _zipf_weights(rng, n, exponent):
+    """Power-law popularity over n items, in random order (so ids do not encode rank)."""
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+
+def _ordinal(n):
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
+
+def _initial(k):
+    """Spreadsheet-style letters for k >= 1: A..Z, AA, AB, ..."""
+    letters = ""
+    while k:
+        k, r = divmod(k - 1, 26)
+        letters = chr(ord("A") + r) + letters
+    return letters
+
+
+def _people(rng, n):
+    """First and last names of n people, no two with the same full name.
+
+    (first, last) pairs are drawn without replacement; once every pair is
+    used, each further round of pairs gets a middle initial ("Anna B. Lee").
+    """
+    firsts = np.array(list(dict.fromkeys(FIRST_NAMES)), dtype=object)
+    lasts = np.array(list(dict.fromkeys(LAST_NAMES)), dtype=object)
+    pairs = len(firsts) * len(lasts)
+    rounds = -(-n // pairs)
+    picks = np.concatenate([rng.permutation(pairs) for _ in range(rounds)])[:n]
+    first, last = firsts[picks % len(firsts)], lasts[picks // len(firsts)]
+    for k in range(1, rounds):
+        rows = slice(k * pairs, (k + 1) * pairs)
+        first[rows] = [f"{name} {_initial(k)}." for name in first[rows]]
+    return first, last
+
+
+def _addresses(rng, n):
+    """Country, city, state and street per row, with countries drawn by their customer share."""
+    names = list(COUNTRIES)
+    shares = np.array([COUNTRIES[c][0] for c in names])
+    country_idx = rng.choice(len(names), n, p=shares / shares.sum())
+    countries = np.array(names, dtype=object)[country_idx]
+    cities = np.empty(n, dtype=object)
+    states = np.empty(n, dtype=object)
+    for i, name in enumerate(names):
+        rows = np.flatnonzero(country_idx == i)
+        places = COUNTRIES[name][1]
+        pick = rng.integers(0, len(places), len(rows))
+        cities[rows] = [places[p][0] for p in pick]
+        states[rows] = [places[p][1] for p in pick]
+    streets = np.array([f"123 {_ordinal(k)} Street" for k in rng.integers(1, 300, n)], dtype=object)
+    return countries, cities, states, streets
+
+
+def generate_customers(rng, n):
+    first, last = _people(rng, n)
+    countries, cities, states, streets = _addresses(rng, n)
+    return pd.DataFrame({
+        "ID": np.arange(1, n + 1),
+        "Company": [f"Company {i}" for i in range(1, n + 1)],
+        "Last Name": last,
+        "First Name": first,
+        "E-mail Address": None,
+        "Job Title": rng.choice(JOB_TITLES, n),
+        "Business Phone": "(123)555-0100",
+        "Home Phone": None,
+        "Mobile Phone": None,
+        "Fax Number": "(123)555-0101",
+        "Address": streets,
+        "City": cities,
+        "State/Province": states,
+        "ZIP/Postal Code": "99999",
+        "Country/Region": countries,
+        "Web Page": None,
+        "Notes": None,
+        "Attachments": None,
+    })
+
+
+def generate_employees(rng, n):
+    first, last = _people(rng, n)
+    titles = np.where(np.arange(n) == 0, "Vice President, Sales",
+                      np.where(np.arange(n) % 5 == 1, "Sales Manager", "Sales Representative"))
+    countries, cities, states, streets = _addresses(rng, n)
+    return pd.DataFrame({
+        "ID": np.arange(1, n + 1),
+        "Company": "Northwind Traders",
+        "Last Name": last,
+        "First Name": first,
+        "E-mail Address": [f"{f.lower()}@northwindtraders.com" for f in first],
+        "Job Title": titles,
+        "Business Phone": "(123)555-0100",
+        "Home Phone": "(123)555-0102",
+        "Mobile Phone": None,
+        "Fax Number": "(123)555-0103",
+        "Address": [s.replace("Street", "Avenue") for s in streets],
+        "City": cities,
+        "State/Province": states,
+        "ZIP/Postal Code": "99999",
+        "Country/Region": countries,
+        "Web Page": "#http://northwindtraders.com#",
+        "Notes": None,
+        "Attachments": None,
+    })
+
+
+def generate_products(rng, n):
+    names = list(CATEGORIES)
+    shares = np.array([CATEGORIES[c][0] for c in names])
+    category_idx = rng.choice(len(names), n, p=shares / shares.sum())
+    low = np.array([CATEGORIES[c][1][0] for c in names])[category_idx]
+    high = np.array([CATEGORIES[c][1][1] for c in names])[category_idx]
+    list_price = (low + rng.random(n) * (high - low)).round(2)
+    categories = np.array(names, dtype=object)[category_idx]
+    return pd.DataFrame({
+        "Supplier IDs": rng.integers(1, 11, n).astype(str),
+        "ID": np.arange(1, n + 1),
+        "Product Code": [f"NWTP-{i}" for i in range(1, n + 1)],
+        "Product Name": [f"Northwind Traders {c} {i}" for i, c in enumerate(categories, 1)],
+        "Description": None,
+        "Standard Cost": (list_price * 0.75).round(4),
+        "List Price": list_price,
+        "Reorder Level": rng.choice([10, 20, 25, 30], n),
+        "Target Level": rng.choice([40, 60, 80, 100], n),
+        "Quantity Per Unit": rng.choice(["10 boxes x 20 bags", "24 - 12 oz bottles", "12 - 550 ml bottles", "48 pieces"], n),
+        "Discontinued": rng.random(n) < 0.05,
+        "Minimum Reorder Quantity": rng.choice([None, 10, 25], n),
+        "Category": categories,
+        "Attachments": None,
+    })
+
+
+def _order_date_cdf(start, years):
+    """Cumulative share of orders over consecutive days: yearly growth, Q4 season and quiet weekends."""
+    days = pd.date_range(start, periods=int(round(365.25 * years)), freq="D")
+    elapsed_years = (days - days[0]).days / 365.25
+    weights = (1 + ANNUAL_GROWTH) ** elapsed_years
+    weights = weights * np.asarray(MONTH_WEIGHTS)[days.month - 1] * np.asarray(WEEKDAY_WEIGHTS)[days.weekday]
+    cdf = np.cumsum(weights)
+    return days.values, cdf / cdf[-1]
+
+
+class Plan:
+    """Everything a worker needs to generate any chunk of orders: dimension sizes, skew and dates."""
+
+    def __init__(self, scale_factor, seed=42, start=START_DATE, years=YEARS):
+        self.scale_factor = scale_factor
+        self.seed = seed
+        self.n_orders = max(1, int(round(ORDERS_PER_SF * scale_factor)))
+        self.n_customers = max(29, int(round(CUSTOMERS_PER_SF * scale_factor)))
+        self.n_employees = max(9, int(round(9 * scale_factor ** 0.5)))
+        self.n_products = max(45, int(round(80 * scale_factor ** 0.5)))
+        self.n_chunks = -(-self.n_orders // ORDERS_PER_CHUNK)
+
+        rng = np.random.default_rng([seed, 0])
+        self.customers = generate_customers(rng, self.n_customers)
+        self.employees = generate_employees(rng, self.n_employees)
+        self.products = generate_products(rng, self.n_products)
+        # Skew: a few customers, best-sellers and top sales reps account for most of the volume
+        self.customer_weights = _zipf_weights(rng, self.n_customers, 0.9)
+        self.employee_weights = _zipf_weights(rng, self.n_employees, 0.7)
+        self.product_weights = _zipf_weights(rng, self.n_products, 1.1)
+        self.days, self.date_cdf = _order_date_cdf(start, years)
+
+    def chunk_orders(self, chunk):
+        """Order ids [first, last] of one chunk."""
+        first = chunk * ORDERS_PER_CHUNK + 1
+        return first, min(self.n_orders, first + ORDERS_PER_CHUNK - 1)
+
+    def generate_chunk(self, chunk):
+        """Returns (orders, order_details) for one chunk, from that chunk's own random stream."""
+        rng = np.random.default_rng([self.seed, 1, chunk])
+        first, last = self.chunk_orders(chunk)
+        order_ids = np.arange(first, last + 1)
+        n = len(order_ids)
+
+        # Dates follow order ids: order k sits at quantile k / n_orders of the date distribution
+        quantiles = (order_ids - 1 + rng.random(n)) / self.n_orders
+        # Whole seconds, so CSV timestamps read like the Access exports ("2006-01-15 00:00:00")
+        order_dates = self.days[np.searchsorted(self.date_cdf, quantiles)].astype("datetime64[s]")
+        delay = pd.to_timedelta(1 + rng.geometric(0.35, n), unit="D")
+        shipped = pd.Series(order_dates + delay)
+        age = (self.days[-1] - order_dates).astype("timedelta64[D]").astype(np.int64)
+        # Recent orders are often still open; a few old ones never shipped
+        unshipped = rng.random(n) < np.where(age < 30, 0.6, 0.02)
+        shipped[unshipped] = pd.NaT
+        paid = rng.random(n) < np.where(unshipped, 0.3, 0.97)
+
+        customer = rng.choice(self.n_customers, n, p=self.customer_weights)
+        c = self.customers
+        orders = pd.DataFrame({
+            "Order ID": order_ids,
+            "Employee ID": rng.choice(self.n_employees, n, p=self.employee_weights) + 1,
+            "Customer ID": customer + 1,
+            "Order Date": order_dates,
+            "Shipped Date": shipped.dt.date,
+            "Shipper ID": np.where(unshipped, np.nan, rng.integers(1, 4, n)),
+            "Ship Name": (c["First Name"] + " " + c["Last Name"]).to_numpy()[customer],
+            "Ship Address": c["Address"].to_numpy()[customer],
+            "Ship City": c["City"].to_numpy()[customer],
+            "Ship State/Province": c["State/Province"].to_numpy()[customer],
+            "Ship ZIP/Postal Code": c["ZIP/Postal Code"].to_numpy()[customer],
+            "Ship Country/Region": c["Country/Region"].to_numpy()[customer],
+            "Shipping Fee": np.where(rng.random(n) < 0.3, 0.0, rng.gamma(2.0, 25.0, n).round(2)),
+            "Taxes": 0.0,
+            "Payment Type": np.where(paid, rng.choice(["Check", "Credit Card", "Cash"], n, p=[0.4, 0.45, 0.15]), None),
+            "Paid Date": pd.Series(order_dates).dt.date.where(paid, None),
+            "Notes": None,
+            "Tax Rate": 0.0,
+            "Tax Status": None,
+            "Status ID": np.where(unshipped, np.where(paid, 1, 0), 3),
+        })
+
+        lines = np.minimum(1 + rng.poisson(1.5, n), MAX_LINES_PER_ORDER)
+        n_lines = int(lines.sum())
+        line_no = np.arange(n_lines) - np.repeat(np.cumsum(lines) - lines, lines)
+        detail_orders = np.repeat(order_ids, lines)
+        product = rng.choice(self.n_products, n_lines, p=self.product_weights)
+        list_price = self.products["List Price"].to_numpy()[product]
+        # Occasional negotiated prices
+        unit_price = np.where(rng.random(n_lines) < 0.1, (list_price * rng.uniform(0.8, 1.0, n_lines)).round(2), list_price)
+        details = pd.DataFrame({
+            # Unique without knowing the line counts of earlier chunks
+            "ID": detail_orders * MAX_LINES_PER_ORDER + line_no,
+            "Order ID": detail_orders,
+            "Product ID": product + 1,
+            "Quantity": np.clip(rng.lognormal(3.0, 0.9, n_lines), 1, 500).round().astype(np.int64),
+            "Unit Price": unit_price,
+            "Discount": rng.choice([0.0, 0.05, 0.1, 0.15, 0.2], n_lines, p=[0.72, 0.12, 0.09, 0.04, 0.03]),
+            "Status ID": np.repeat(np.where(unshipped, 1, 2), lines),
+            "Date Allocated": None,
+            "Purchase Order ID": None,
+            "Inventory ID": None,
+        })
+        return orders, details
+
+
+def _write(df, path, fmt, header=True):
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == "parquet":
+        pq.write_table(table, path)
+    else:
+        pa_csv.write_csv(table, path, pa_csv.WriteOptions(include_header=header, **CSV_OPTIONS))
+
+
+# Set once per worker process by _init_worker
+_plan = None
+
+
+def _init_worker(plan):
+    global _plan
+    _plan = plan
+
+
+def _generate_chunk(chunk, parts_dir, fmt):
+    orders, details = _plan.generate_chunk(chunk)
+    ext = "parquet" if fmt == "parquet" else "csv"
+    for table, df in (("orders", orders), ("order_details", details)):
+        os.makedirs(os.path.join(parts_dir, table), exist_ok=True)
+        # CSV parts after the first are appended to the first, so only it keeps the header
+        _write(df, os.path.join(parts_dir, table, f"part-{chunk:05d}.{ext}"), fmt, header=chunk == 0)
+    return chunk, len(orders), len(details)
+
+
+def _concat_parts(parts_dir, path):
+    with open(path, "wb") as out:
+        for name in sorted(os.listdir(parts_dir)):
+            with open(os.path.join(parts_dir, name), "rb") as part:
+                shutil.copyfileobj(part, out, 1 << 20)
+    shutil.rmtree(parts_dir)
+
+
+def generate(scale_factor, output_dir=None, seed=42, workers=DATAGEN_WORKERS, fmt="csv", start=START_DATE, years=YEARS):
+    """Writes Access-shaped Customers, Employees, Products, Orders and Order Details for a scale factor.
+
+    Files are named like the Access exports (access_customers.csv, access_orders.csv,
+    ...). Orders are generated in fixed chunks, each seeded from (seed, chunk), on
+    `workers` processes; the output is identical for any worker count. CSV
+    chunks are concatenated into one file per table; Parquet tables are
+    directories of part files. Returns {table: row count}.
+    """
+    output_dir = output_dir or os.path.join(GENERATED_DIR, f"sf{scale_factor:g}")
+    os.makedirs(output_dir, exist_ok=True)
+    ext = "parquet" if fmt == "parquet" else "csv"
+    start_time = time.perf_counter()
+    plan = Plan(scale_factor, seed, start, years)
+    counts = {}
+    for table, df in (("customers", plan.customers), ("employees", plan.employees), ("products", plan.products)):
+        _write(df, os.path.join(output_dir, f"access_{table}.{ext}"), fmt)
+        counts[table] = len(df)
+
+    # Chunks are written to a fresh directory: parts left by an interrupted run must not end up in the output
+    parts_dir = os.path.join(output_dir, "_parts")
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    counts["orders"] = counts["order_details"] = 0
+    chunks = range(plan.n_chunks)
+    if workers <= 1 or plan.n_chunks == 1:
+        _init_worker(plan)
+        results = (_generate_chunk(chunk, parts_dir, fmt) for chunk in chunks)
+        for chunk, n_orders, n_lines in results:
+            counts["orders"] += n_orders
+            counts["order_details"] += n_lines
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(plan,)) as pool:
+            futures = [pool.submit(_generate_chunk, chunk, parts_dir, fmt) for chunk in chunks]
+            for future in futures:
+                chunk, n_orders, n_lines = future.result()
+                counts["orders"] += n_orders
+                counts["order_details"] += n_lines
+                print(f"[datagen] chunk {chunk + 1}/{plan.n_chunks}: {n_orders:,} orders, {n_lines:,} lines")
+
+    for table in ("orders", "order_details"):
+        if fmt == "csv":
+            _concat_parts(os.path.join(parts_dir, table), os.path.join(output_dir, f"access_{table}.csv"))
+        else:
+            # A directory can only replace an empty one: drop the previous run's table first
+            path = os.path.join(output_dir, f"access_{table}")
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(os.path.join(parts_dir, table), path)
+    os.rmdir(parts_dir)
+
+    elapsed = time.perf_counter() - start_time
+    print(f"Generated SF {scale_factor:g} (seed {seed}) in {output_dir} in {elapsed:.1f}s: "
+          + ", ".join(f"{n:,} {table}" for table, n in counts.items()))
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates Access-shaped Northwind tables at a scale factor (SF 1 ~ 1M order lines).")
+    parser.add_argument("scale_factor", type=float)
+    parser.add_argument("--output", help="output directory (default: data/generated/sf<SF>)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=DATAGEN_WORKERS)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--start", default=START_DATE, help="first order date")
+    parser.add_argument("--years", type=float, default=YEARS, help="length of the order date range")
+    args = parser.parse_args()
+    generate(args.scale_factor, args.output, args.seed, args.workers, args.format, args.start, args.years)
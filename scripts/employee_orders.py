@@ -0,0 +1,107 @@
+# employee_orders.py
+import math
+import threading
+from collections import OrderedDict, namedtuple
+import pandas as pd
+from data_helpers import ALL_EMPLOYEE_ORDERS_QUERY, fetch_from_access, get_employee_orders
+from settings import EMPLOYEE_ORDERS_PRELOAD, EMPLOYEE_ORDERS_CACHE_SIZE, EMPLOYEE_ORDERS_PAGE_SIZE
+
+ORDER_COLUMNS = ["Order ID", "Order Date", "Shipped Date", "CustomerName"]
+
+OrdersPage = namedtuple("OrdersPage", ["orders", "page", "pages", "total"])
+
+
+class EmployeeOrdersLookup:
+    """Orders of each employee (with customer names), indexed by employee ID.
+
+    With `preload`, every order is read in one query on first use and split
+    into one frame per employee, so each lookup is a dict access. Otherwise
+    an employee's orders are read on their first lookup with the
+    parameterized EMPLOYEE_ORDERS_QUERY and kept in an LRU of `cache_size`
+    employees. Sorted views used for paging are kept in the same LRU. Frames
+    are shared between callers and must not be modified in place. Source
+    errors propagate and nothing is cached for a failed read.
+    """
+
+    def __init__(self, preload=EMPLOYEE_ORDERS_PRELOAD, cache_size=EMPLOYEE_ORDERS_CACHE_SIZE):
+        self.preload = preload
+        self.cache_size = cache_size
+        self._index = None  # employee ID -> orders, when preloaded
+        self._lru = OrderedDict()  # (employee ID,) or (employee ID, sort column, descending) -> orders
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "queries": 0}
+
+    def _build_index(self):
+        df = fetch_from_access(ALL_EMPLOYEE_ORDERS_QUERY)
+        self.stats["queries"] += 1
+        if df.empty:
+            return {}
+        # One grouping pass gives every employee's row positions
+        positions = df.groupby("Employee ID", sort=False).indices
+        orders = df[ORDER_COLUMNS]
+        return {int(emp): orders.take(rows).reset_index(drop=True) for emp, rows in positions.items()}
+
+    def _cached(self, key):
+        """Returns a cached entry and marks it recently used. Caller holds the lock."""
+        value = self._lru.get(key)
+        if value is not None:
+            self._lru.move_to_end(key)
+        return value
+
+    def _remember(self, key, value):
+        """Adds an entry, evicting the least recently used ones. Caller holds the lock."""
+        self._lru[key] = value
+        while len(self._lru) > self.cache_size:
+            self._lru.popitem(last=False)
+
+    def orders(self, employee_id):
+        """All orders of an employee, in source order (an empty frame for unknown IDs)."""
+        employee_id = int(employee_id)
+        with self._lock:
+            if self.preload:
+                if self._index is None:
+                    self._index = self._build_index()
+                orders = self._index.get(employee_id)
+                self.stats["hits"] += 1
+                return orders if orders is not None else pd.DataFrame(columns=ORDER_COLUMNS)
+            orders = self._cached((employee_id,))
+            if orders is not None:
+                self.stats["hits"] += 1
+                return orders
+        # Read outside the lock, so lookups of cached employees are not held up by the query
+        orders = get_employee_orders(employee_id).reindex(columns=ORDER_COLUMNS)
+        with self._lock:
+            self.stats["misses"] += 1
+            self.stats["queries"] += 1
+            self._remember((employee_id,), orders)
+        return orders
+
+    def page(self, employee_id, page=1, page_size=EMPLOYEE_ORDERS_PAGE_SIZE, sort_by="Order Date", descending=True):
+        """One page (1-based, clamped to the last page) of an employee's orders sorted by a column."""
+        if sort_by not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort_by!r}; expected one of {ORDER_COLUMNS}")
+        orders = self.orders(employee_id)
+        key = (int(employee_id), sort_by, descending)
+        with self._lock:
+            ordered = self._cached(key)
+        if ordered is None:
+            # Stable, so orders with equal keys keep their Order ID order
+            ordered = orders.sort_values(sort_by, ascending=not descending, kind="stable",
+                                         na_position="last", ignore_index=True)
+            with self._lock:
+                self._remember(key, ordered)
+        total = len(ordered)
+        pages = max(1, math.ceil(total / page_size))
+        page = min(max(1, page), pages)
+        start = (page - 1) * page_size
+        return OrdersPage(ordered.iloc[start:start + page_size], page, pages, total)
+
+    def clear(self):
+        """Drops the index and cached orders, so the next lookups read the source again."""
+        with self._lock:
+            self._index = None
+            self._lru.clear()
+
+    def report(self):
+        return (f"Employee orders: {self.stats['hits']} cached lookups, {self.stats['misses']} misses, "
+                f"{self.stats['queries']} source queries")
@@ -1,7 +1,32 @@
 # scripts/employee_orders_viewer.py
 import sys
 import pandas as pd
-from data_helpers import get_employees, get_employee_orders
+from data_helpers import get_employees
+from employee_orders import EmployeeOrdersLookup
+
+# Sort command keywords -> order columns
+SORT_KEYS = {"id": "Order ID", "date": "Order Date", "shipped": "Shipped Date", "customer": "CustomerName"}
+
+HELP = ("Commands: <Employee ID> shows their orders, 'n'/'p' next/previous page, "
+        f"'s {{{'|'.join(SORT_KEYS)}}} [asc|desc]' sorts, 'q' quits.")
+
+def show_page(lookup, emp_id, page, sort_by, descending):
+    try:
+        result = lookup.page(emp_id, page, sort_by=sort_by, descending=descending)
+    except Exception as e:
+        # Nothing was cached, so repeating the command reads the source again
+        print(f"[ERROR] Could not read the orders of Employee ID {emp_id}: {e}")
+        return page
+    if result.total == 0:
+        print(f"\nNo orders found for Employee ID {emp_id}.")
+        return result.page
+    order = "descending" if descending else "ascending"
+    print(f"\nOrders for Employee ID {emp_id} (page {result.page}/{result.pages}, by {sort_by} {order}):")
+    print("=" * 60)
+    print(result.orders.to_string(index=False))
+    print("=" * 60)
+    print(f"Total Orders: {result.total}")
+    return result.page
 
 def main():
     print("--- Northwind Employee Orders Viewer ---")
@@ -17,36 +42,47 @@ def main():
         # Using to_string for better alignment in CLI
         print(employees.to_string(index=False, header=["ID", "Full Name"]))
         print("-" * 30)
+        print(HELP)
+
+        employee_ids = set(employees["ID"].astype(int))
+        lookup = EmployeeOrdersLookup()
+        emp_id, page, sort_by, descending = None, 1, "Order Date", True
 
         while True:
-            emp_id_input = input("\nEnter Employee ID to view orders (or 'q' to quit): ").strip()
+            command = input("\nEnter Employee ID to view orders (or 'q' to quit): ").strip()
             
-            if emp_id_input.lower() == 'q':
+            if command.lower() == 'q':
                 print("Exiting...")
                 break
+
+            if command.lower() in ("n", "p") or command.lower().startswith("s"):
+                if emp_id is None:
+                    print("Choose an employee first.")
+                    continue
+                if command.lower() == "n":
+                    page += 1
+                elif command.lower() == "p":
+                    page -= 1
+                else:
+                    args = command.lower().split()
+                    if len(args) not in (2, 3) or args[1] not in SORT_KEYS or args[2:] not in ([], ["asc"], ["desc"]):
+                        print(HELP)
+                        continue
+                    sort_by, descending, page = SORT_KEYS[args[1]], args[2:] != ["asc"], 1
+                page = show_page(lookup, emp_id, page, sort_by, descending)
+                continue
             
-            if not emp_id_input.isdigit():
+            if not command.isdigit():
                 print("Invalid input. Please enter a numerical Employee ID.")
                 continue
             
-            emp_id = int(emp_id_input)
-            
             # Check if emp_id exists in employees list
-            if emp_id not in employees['ID'].values:
-                print(f"Employee ID {emp_id} not found.")
+            if int(command) not in employee_ids:
+                print(f"Employee ID {command} not found.")
                 continue
 
-            orders = get_employee_orders(emp_id)
-
-            if orders.empty:
-                print(f"\nNo orders found for Employee ID {emp_id}.")
-            else:
-                print(f"\nOrders for Employee ID {emp_id}:")
-                print("=" * 60)
-                # Filter out some rows if too many? No, let's show all for now.
-                print(orders.to_string(index=False))
-                print("=" * 60)
-                print(f"Total Oders: {len(orders)}")
+            emp_id, page = int(command), 1
+            page = show_page(lookup, emp_id, page, sort_by, descending)
                 
     except Exception as e:
         print(f"[ERROR] An unexpected error occurred: {e}")
@@ -1,163 +1,333 @@
 
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
-from data_helpers import fetch_from_access
-from database_manager import clear_tables, load_data
-from settings import DATA_DIR
-import os
+from aggregates import refresh_aggregates
+from data_helpers import fetch_from_access, set_source
+from database_manager import clear_tables, load_data, upsert_data, upsert_frames, get_watermark, set_watermark
+from instrumentation import frame_bytes, run_report, span
+from query_cache import bump_load_version
+from settings import INCREMENTAL_LOOKBACK_DAYS, EXTRACT_WORKERS, STREAM_CHUNK_SIZE, STREAM_QUEUE_SIZE, WAREHOUSE_EXPORT_CSV
+from transform_spec import (compile_spec, DIM_CUSTOMER_SPEC, DIM_EMPLOYEE_SPEC, DIM_PRODUCT_SPEC,
+                            DIM_DATE_SPEC, FACT_ORDERS_SPEC, FACT_ORDER_DETAILS_SPEC)
+from warehouse import (write_warehouse, write_dimensions, append_warehouse, reset_warehouse, export_wide_csv,
+                       locate_orders)
 
-def run_etl_pipeline():
-    print("--- Starting ETL Pipeline (Access -> SQL Server) ---")
-    
-    def to_sql_date(val):
-        """Converts pandas date/NaT to python date/None."""
-        if pd.isna(val):
-            return None
-        return val.to_pydatetime() if hasattr(val, 'to_pydatetime') else val
-
-    # 1. Extraction from Access
-    raw_customers = fetch_from_access("SELECT * FROM Customers")
-    raw_employees = fetch_from_access("SELECT * FROM Employees")
-    raw_orders = fetch_from_access("SELECT * FROM Orders")
-    raw_products = fetch_from_access("SELECT * FROM Products")
-    raw_order_details = fetch_from_access("SELECT [Order ID], [Product ID], [Unit Price], Quantity, Discount FROM [Order Details]")
-    
-    # 2. Transformation
-    
-    # DimCustomer
-    dim_customers = raw_customers.copy()
-    dim_customers["CustomerId"] = dim_customers["ID"].astype(str)
-    dim_customers["CompanyName"] = dim_customers["Company"]
-    dim_customers["ContactName"] = (dim_customers["First Name"].fillna("") + " " + dim_customers["Last Name"].fillna("")).str.strip()
-    dim_customers["Address"] = dim_customers["Address"]
-    dim_customers["City"] = dim_customers["City"]
-    dim_customers["Region"] = dim_customers["State/Province"]
-    dim_customers["PostalCode"] = dim_customers["ZIP/Postal Code"]
-    dim_customers["Country"] = dim_customers["Country/Region"]
-    dim_customers["Phone"] = dim_customers["Business Phone"]
-    
-    dim_customers = dim_customers[[
-        "CustomerId", "CompanyName", "ContactName", "Address", "City", 
-        "Region", "PostalCode", "Country", "Phone"
-    ]].fillna("Unknown")
-
-    # DimEmployee
-    dim_employees = raw_employees.copy()
-    dim_employees["EmployeeId"] = dim_employees["ID"].astype(str)
-    dim_employees["FirstName"] = dim_employees["First Name"]
-    dim_employees["LastName"] = dim_employees["Last Name"]
-    dim_employees["Title"] = dim_employees["Job Title"]
-    dim_employees["City"] = dim_employees["City"]
-    dim_employees["Region"] = dim_employees["State/Province"]
-    dim_employees["Country"] = dim_employees["Country/Region"]
-    dim_employees["HomePhone"] = dim_employees["Home Phone"]
-    # Missing in Access, fill with None for now
-    dim_employees["BirthDate"] = None
-    dim_employees["HireDate"] = None
-    
-    dim_employees = dim_employees[[
-        "EmployeeId", "FirstName", "LastName", "Title", "BirthDate", 
-        "HireDate", "City", "Region", "Country", "HomePhone"
-    ]].fillna("Unknown")
-    # Restore None for date fields
-    dim_employees.loc[dim_employees["BirthDate"] == "Unknown", "BirthDate"] = None
-    dim_employees.loc[dim_employees["HireDate"] == "Unknown", "HireDate"] = None
-
-    # DimProduct
-    dim_products = raw_products.rename(columns={
-        "ID": "ProductId",
-        "Product Name": "ProductName",
-        "Category": "Category",
-        "List Price": "UnitPrice"
-    })[["ProductId", "ProductName", "Category", "UnitPrice"]]
-    dim_products = dim_products.fillna("Unknown")
-
-    # DimDate
-    raw_orders["OrderDate_Parsed"] = pd.to_datetime(raw_orders["Order Date"])
-    unique_dates = pd.Series(raw_orders["OrderDate_Parsed"].dropna().unique()).sort_values()
-    
-    dim_date = pd.DataFrame({"FullDate": unique_dates})
-    dim_date["DateId"] = dim_date["FullDate"].dt.strftime("%Y%m%d").astype(int)
-    dim_date["Day"] = dim_date["FullDate"].dt.day
-    dim_date["Month"] = dim_date["FullDate"].dt.month
-    dim_date["MonthName"] = dim_date["FullDate"].dt.strftime("%B")
+ORDER_DETAILS_QUERY = "SELECT [Order ID], [Product ID], [Unit Price], Quantity, Discount FROM [Order Details]"
+
+# New orders are found through the Order ID watermark; orders edited after
+# loading (e.g. shipped later) are re-extracted through the Order Date lookback.
+DELTA_ORDERS_FILTER = "[Order ID] > ? OR [Order Date] >= ?"
+
+
+def extraction_queries(watermark=None):
+    """Returns {table: (query, params)} for the Access extraction. With a watermark, only the order delta is read."""
+    queries = {
+        "customers": ("SELECT * FROM Customers", None),
+        "employees": ("SELECT * FROM Employees", None),
+        "products": ("SELECT * FROM Products", None),
+    }
+    if watermark is None:
+        queries["orders"] = ("SELECT * FROM Orders", None)
+        queries["order_details"] = (ORDER_DETAILS_QUERY, None)
+    else:
+        last_id, last_date = watermark
+        cutoff = (last_date - pd.Timedelta(days=INCREMENTAL_LOOKBACK_DAYS)).to_pydatetime()
+        params = (last_id, cutoff)
+        queries["orders"] = (f"SELECT * FROM Orders WHERE {DELTA_ORDERS_FILTER}", params)
+        queries["order_details"] = (
+            f"{ORDER_DETAILS_QUERY} WHERE [Order ID] IN (SELECT [Order ID] FROM Orders WHERE {DELTA_ORDERS_FILTER})",
+            params,
+        )
+    return queries
+
+
+def _timed_fetch(name, query, params):
+    start = time.perf_counter()
+    # Runs on a pool thread, outside the submitting thread's "extract" span
+    with span(f"extract.{name}", parent="extract") as s:
+        df = fetch_from_access(query, params)
+        s.add(rows=len(df), bytes_read=frame_bytes(df))
+    elapsed = time.perf_counter() - start
+    print(f"[Extract] {name}: {len(df)} rows in {elapsed:.2f}s")
+    return df, elapsed
+
+
+def extract_and_transform_dimensions(watermark=None, workers=EXTRACT_WORKERS, tables=None):
+    """Extracts all source tables concurrently, one pooled Access connection per worker.
+
+    Dimension transforms run as soon as their table arrives, while the larger
+    order extracts are still in flight. `tables` restricts the extraction to
+    some of the source tables. Returns (raw, dims, timings).
+    """
+    raw, dims, timings = {}, {}, {}
+    start = time.perf_counter()
+    with span("extract", workers=workers) as extract, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_timed_fetch, name, query, params): name
+            for name, (query, params) in extraction_queries(watermark).items()
+            if tables is None or name in tables
+        }
+        for future in as_completed(futures):
+            name = futures[future]
+            raw[name], timings[name] = future.result()
+            extract.add(rows=len(raw[name]), bytes_read=frame_bytes(raw[name]))
+            if name in DIMENSION_TRANSFORMS:
+                key, transform_fn = DIMENSION_TRANSFORMS[name]
+                with span(f"transform.{key}", rows=len(raw[name])):
+                    dims[key] = transform_fn(raw[name])
+    wall = time.perf_counter() - start
+    print(f"Extraction finished in {wall:.2f}s ({sum(timings.values()):.2f}s of table reads on {workers} workers)")
+    return raw, dims, timings
+
+
+transform_customers = compile_spec(DIM_CUSTOMER_SPEC)
+transform_employees = compile_spec(DIM_EMPLOYEE_SPEC)
+transform_products = compile_spec(DIM_PRODUCT_SPEC)
+transform_dates = compile_spec(DIM_DATE_SPEC)
+transform_orders = compile_spec(FACT_ORDERS_SPEC)
+transform_order_details = compile_spec(FACT_ORDER_DETAILS_SPEC)
+
+DIMENSION_TRANSFORMS = {
+    "customers": ("dim_customers", transform_customers),
+    "employees": ("dim_employees", transform_employees),
+    "products": ("dim_products", transform_products),
+}
+
+
+def transform_facts(raw_orders, raw_order_details, dims):
+    """Builds DimDate and the fact tables, keeping only rows whose dimension keys exist."""
+    dim_customers = dims["dim_customers"]
+    dim_employees = dims["dim_employees"]
+    dim_products = dims["dim_products"]
+
+    # Parsed once, in place: DimDate, DateId and the watermark all read it
+    raw_orders["Order Date"] = pd.to_datetime(raw_orders["Order Date"])
+
+    unique_dates = pd.Series(raw_orders["Order Date"].dropna().unique()).sort_values()
+    dim_date = transform_dates(pd.DataFrame({"FullDate": unique_dates}))
     dim_date = dim_date.drop_duplicates(subset=["DateId"])
 
-    # FactOrders
-    fact_orders = raw_orders.copy()
-    fact_orders["OrderId"] = fact_orders["Order ID"].astype(int)
-    fact_orders["CustomerId"] = fact_orders["Customer ID"].fillna(-1).astype(int).astype(str) 
-    fact_orders["EmployeeId"] = fact_orders["Employee ID"].fillna(-1).astype(int).astype(str)
-    fact_orders["DateId"] = fact_orders["OrderDate_Parsed"].apply(
-        lambda x: int(x.strftime("%Y%m%d")) if pd.notna(x) else -1
-    )
-    fact_orders["ShippedDate"] = pd.to_datetime(fact_orders["Shipped Date"]).apply(to_sql_date)
-    fact_orders["ShippingFee"] = fact_orders["Shipping Fee"].fillna(0)
-    fact_orders["Taxes"] = fact_orders["Taxes"].fillna(0)
-    fact_orders["DeliveredFlag"] = fact_orders["Shipped Date"].notna().astype(int)
-    
-    fact_orders = fact_orders[[
-        "OrderId", "CustomerId", "EmployeeId", "DateId", 
-        "ShippedDate", "ShippingFee", "Taxes", "DeliveredFlag"
-    ]]
-
-    # FactOrderDetails
-    fact_order_details = raw_order_details.rename(columns={
-        "Order ID": "OrderId",
-        "Product ID": "ProductId",
-        "Unit Price": "UnitPrice",
-        "Quantity": "Quantity",
-        "Discount": "Discount"
-    })[["OrderId", "ProductId", "UnitPrice", "Quantity", "Discount"]].fillna(0)
-
-    # 3. Data Integrity / Filtering
-    valid_custs = set(dim_customers["CustomerId"])
-    valid_emps = set(dim_employees["EmployeeId"])
-    valid_dates = set(dim_date["DateId"])
-    valid_prods = set(dim_products["ProductId"])
+    fact_orders = transform_orders(raw_orders)
+    fact_order_details = transform_order_details(raw_order_details)
 
+    # Data Integrity / Filtering
     fact_orders = fact_orders[
-        fact_orders["CustomerId"].isin(valid_custs) & 
-        fact_orders["EmployeeId"].isin(valid_emps) &
-        fact_orders["DateId"].isin(valid_dates) &
+        fact_orders["CustomerId"].isin(dim_customers["CustomerId"]) &
+        fact_orders["EmployeeId"].isin(dim_employees["EmployeeId"]) &
+        fact_orders["DateId"].isin(dim_date["DateId"]) &
         (fact_orders["DateId"] != -1)
     ]
-    
+
     fact_order_details = fact_order_details[
         fact_order_details["OrderId"].isin(fact_orders["OrderId"]) &
-        fact_order_details["ProductId"].isin(valid_prods)
+        fact_order_details["ProductId"].isin(dim_products["ProductId"])
     ]
 
-    # 4. Loading
-    clear_tables()
-    load_data(dim_customers, dim_employees, dim_date, dim_products, fact_orders, fact_order_details)
-
-    print("Generating enriched denormalized CSV for visualizations...")
-    # Join all data for easy visualization
-    # Start with fact_order_details as the base for granular analysis (Revenue per product)
-    # Both fact_order_details and dim_products have UnitPrice. We'll use the one from details for Revenue.
-    
-    # Merge order details with fact orders
-    enriched_df = fact_order_details.merge(fact_orders, on="OrderId", how="left")
-    
-    # Merge with dimensions
-    # Standardize Customer columns as primary for visualizations
-    enriched_df = enriched_df.merge(dim_customers, on="CustomerId", how="left")
-    
-    # Use suffix for Employee dimensions to avoid clash with Customer info
-    enriched_df = enriched_df.merge(dim_employees, on="EmployeeId", how="left", suffixes=('', '_emp'))
-    
-    # Merge with products (already handled clashes with suffixes)
-    enriched_df = enriched_df.merge(dim_products, on="ProductId", how="left", suffixes=('', '_prod'))
-    
-    enriched_df = enriched_df.merge(dim_date, on="DateId", how="left")
-
-    # Metrics - Use UnitPrice from fact_order_details
-    enriched_df["Revenue"] = enriched_df["UnitPrice"] * enriched_df["Quantity"] * (1 - enriched_df["Discount"])
-    
-    warehouse_dir = os.path.join(DATA_DIR, "warehouse")
-    os.makedirs(warehouse_dir, exist_ok=True)
-    csv_path = os.path.join(warehouse_dir, "merged_northwind.csv")
-    enriched_df.to_csv(csv_path, index=False)
-    print(f"Denormalized data saved to {csv_path}")
-    
+    return {
+        "dim_customers": dim_customers,
+        "dim_employees": dim_employees,
+        "dim_date": dim_date,
+        "dim_products": dim_products,
+        "fact_orders": fact_orders,
+        "fact_order_details": fact_order_details,
+    }
+
+
+def _drain(q, handle, errors):
+    """Consumes a stage queue until the sentinel; after a failure, keeps draining so producers never block."""
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        if not errors:
+            try:
+                handle(item)
+            except Exception as e:
+                errors.append(e)
+
+
+def stream_facts(watermark, dims, chunksize=STREAM_CHUNK_SIZE, queue_size=STREAM_QUEUE_SIZE):
+    """Streams orders in chunks through transform, load and warehouse stages.
+
+    Orders are read in Order ID order, each chunk's details are fetched by
+    Order ID range, and the transformed chunk is handed to a loader thread
+    and a warehouse writer thread through bounded queues, so at most
+    `queue_size` chunks wait per stage. Returns the highest (Order ID, Order Date) seen.
+    """
+    incremental = watermark is not None
+    # Each order is in one chunk, so the partitions of the orders chunks replace can be found before any is written
+    located = locate_orders() if incremental else None
+    query, params = extraction_queries(watermark)["orders"]
+    load_queue = queue.Queue(maxsize=queue_size)
+    warehouse_queue = queue.Queue(maxsize=queue_size)
+    errors = []
+
+    def load(frames):
+        with span("load.chunk", rows=len(frames["fact_order_details"])):
+            upsert_frames({
+                "DimDate": frames["dim_date"],
+                "FactOrders": frames["fact_orders"],
+                "FactOrderDetails": frames["fact_order_details"],
+            })
+
+    def store(item):
+        frames, order_ids = item
+        if incremental:
+            write_warehouse(frames, order_ids, export_csv=False, located=located)
+        else:
+            append_warehouse(frames)
+
+    workers = [
+        threading.Thread(target=_drain, args=(load_queue, load, errors), name="etl-load"),
+        threading.Thread(target=_drain, args=(warehouse_queue, store, errors), name="etl-warehouse"),
+    ]
+    for w in workers:
+        w.start()
+
+    last_id, last_date, n_chunks = None, None, 0
+    chunks = fetch_from_access(f"{query} ORDER BY [Order ID]", params, chunksize=chunksize)
+    try:
+        while not errors:
+            with span("extract.orders_chunk") as s:
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    s.add(rows=len(chunk), bytes_read=frame_bytes(chunk))
+            if chunk is None:
+                break
+            order_ids = chunk["Order ID"].astype(int)
+            with span("extract.order_details_chunk") as s:
+                details = fetch_from_access(
+                    f"{ORDER_DETAILS_QUERY} WHERE [Order ID] BETWEEN ? AND ?",
+                    (int(order_ids.min()), int(order_ids.max())),
+                )
+                s.add(rows=len(details), bytes_read=frame_bytes(details))
+            details = details[details["Order ID"].isin(order_ids)]
+            with span("transform.facts", rows=len(details)):
+                frames = transform_facts(chunk, details, dims)
+
+            load_queue.put(frames)
+            # Customers, employees and products were written to the warehouse once, before streaming
+            warehouse_queue.put(({name: frames[name] for name in ("dim_date", "fact_orders", "fact_order_details")}, order_ids))
+
+            n_chunks += 1
+            chunk_last_date = chunk["Order Date"].max()
+            last_id = max(last_id or 0, int(order_ids.max()))
+            if pd.notna(chunk_last_date):
+                last_date = chunk_last_date if last_date is None else max(last_date, chunk_last_date)
+            print(f"[Stream] chunk {n_chunks}: {len(frames['fact_orders'])} orders, {len(frames['fact_order_details'])} lines")
+    finally:
+        chunks.close()
+        load_queue.put(None)
+        warehouse_queue.put(None)
+        for w in workers:
+            w.join()
+
+    if errors:
+        raise errors[0]
+    return last_id, last_date
+
+
+def advance_watermark(watermark, last_id, last_date):
+    """Stores the new high-water mark, never moving it backwards."""
+    if last_id is None:
+        return
+    if watermark is not None:
+        last_id = max(last_id, watermark[0])
+        last_date = watermark[1] if pd.isna(last_date) else max(last_date, watermark[1])
+    if pd.notna(last_date):
+        set_watermark(last_id, last_date)
+
+
+def run_streaming_etl(watermark):
+    """Loads the dimensions once, then streams the facts chunk by chunk."""
+    raw, dims, timings = extract_and_transform_dimensions(watermark, tables=DIMENSION_TRANSFORMS)
+    if watermark is None:
+        clear_tables()
+        reset_warehouse()
+    with span("load.dimensions", rows=sum(len(df) for df in dims.values())):
+        upsert_frames({
+            "DimCustomer": dims["dim_customers"],
+            "DimEmployee": dims["dim_employees"],
+            "DimProduct": dims["dim_products"],
+        })
+    write_dimensions(dims)
+
+    last_id, last_date = stream_facts(watermark, dims)
+    if last_id is None:
+        print("No new or changed orders since the last load.")
+        return
+    advance_watermark(watermark, last_id, last_date)
+    if WAREHOUSE_EXPORT_CSV:
+        export_wide_csv()
+
+
+def run_etl_pipeline(incremental=False, streaming=False, source=None, source_path=None):
+    """Runs the ETL, writing a run report of its timed steps (see instrumentation.py).
+
+    `source` selects the extraction backend ("odbc", "files" or "sqlite", see
+    data_helpers.SOURCES; EXTRACT_SOURCE by default), reading from `source_path` when given.
+    """
+    if source is not None:
+        set_source(source, source_path)
+    with run_report("etl") as run:
+        run.add(incremental=incremental, streaming=streaming, source=source)
+        _run_etl_pipeline(incremental, streaming)
+
+
+def _run_etl_pipeline(incremental, streaming):
+    print("--- Starting ETL Pipeline (Access -> SQL Server) ---")
+
+    watermark = get_watermark() if incremental else None
+    if incremental and watermark is None:
+        print("No watermark found, running a full load.")
+    elif watermark is not None:
+        print(f"Incremental load from Order ID > {watermark[0]} / Order Date >= {watermark[1]:%Y-%m-%d} - {INCREMENTAL_LOOKBACK_DAYS}d")
+
+    if streaming:
+        # Cached query results go stale as soon as the first chunk is written, and stay so if the run fails
+        bump_load_version()
+        run_streaming_etl(watermark)
+        refresh_aggregates()
+        bump_load_version()
+        print("--- ETL Finished Successfully ---")
+        return
+
+    # 1. Extraction from Access, with dimension transforms overlapping the fact extracts
+    raw, dims, timings = extract_and_transform_dimensions(watermark)
+
+    if watermark is not None and raw["orders"].empty:
+        print("No new or changed orders since the last load.")
+        print("--- ETL Finished Successfully ---")
+        return
+
+    # 2. Transformation of the facts, once the dimensions are ready
+    with span("transform.facts", rows=len(raw["order_details"])):
+        frames = transform_facts(raw["orders"], raw["order_details"], dims)
+
+    # 3. Loading. Cached query results go stale with the first write, and stay so if a later step fails
+    bump_load_version()
+    with span("load", rows=sum(len(df) for df in frames.values()), incremental=watermark is not None):
+        if watermark is None:
+            clear_tables()
+            load_data(**frames)
+        else:
+            upsert_data(**frames)
+
+    raw_orders = raw["orders"]
+    print("Writing the star-schema warehouse for visualizations...")
+    replaced = None if watermark is None else raw_orders["Order ID"].astype(int)
+    write_warehouse(frames, replaced)
+
+    # Only once both targets hold the orders: a failed run re-extracts them (merging them again is harmless)
+    if not raw_orders.empty:
+        advance_watermark(watermark, int(raw_orders["Order ID"].max()), raw_orders["Order Date"].max())
+
+    print("Materializing summary tables for reporting...")
+    refresh_aggregates()
+    # Results cached while the load was running may mix old and new data
+    bump_load_version()
+
     print("--- ETL Finished Successfully ---")
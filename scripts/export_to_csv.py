@@ -1,23 +1,30 @@
 import os
 import pandas as pd
-import pyodbc
-from settings import DATA_DIR, SQL_SERVER, SQL_DATABASE, SQL_DRIVER
+from settings import DATA_DIR
 from data_helpers import fetch_from_access
-from database_manager import get_sql_conn_str
+from sources import SOURCE_TABLES
+from database_manager import SQL_POOL
 
 def export_access_to_csv(export_dir):
     print("--- Exporting Access Data ---")
+    # Every source table, so the exports can stand in for Access (EXTRACT_SOURCE = "files")
     tables = {
         "Customers": "SELECT * FROM Customers",
         "Employees": "SELECT * FROM Employees",
-        "Orders": "SELECT * FROM Orders"
+        "Products": "SELECT * FROM Products",
+        "Orders": "SELECT * FROM Orders",
+        "Order Details": "SELECT * FROM [Order Details]",
     }
     
     for table_name, query in tables.items():
         print(f"Exporting {table_name} from Access...")
-        df = fetch_from_access(query)
+        try:
+            df = fetch_from_access(query)
+        except Exception:
+            # Reported by fetch_from_access; the other tables are still exported
+            continue
         if not df.empty:
-            file_path = os.path.join(export_dir, f"access_{table_name.lower()}.csv")
+            file_path = os.path.join(export_dir, f"access_{SOURCE_TABLES[table_name]}.csv")
             df.to_csv(file_path, index=False)
             print(f"Saved to {file_path}")
         else:
@@ -25,8 +32,7 @@ def export_access_to_csv(export_dir):
 
 def export_sql_to_csv(export_dir):
     print("\n--- Exporting SQL Server Data ---")
-    conn_str = f"DRIVER={{{SQL_DRIVER}}};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};Trusted_Connection=yes;"
-    
+
     tables = [
         "DimCustomer",
         "DimEmployee",
@@ -37,18 +43,17 @@ def export_sql_to_csv(export_dir):
     ]
     
     try:
-        conn = pyodbc.connect(conn_str)
-        for table in tables:
-            print(f"Exporting {table} from SQL Server...")
-            query = f"SELECT * FROM {table}"
-            df = pd.read_sql(query, conn)
-            if not df.empty:
-                file_path = os.path.join(export_dir, f"sql_{table.lower()}.csv")
-                df.to_csv(file_path, index=False)
-                print(f"Saved to {file_path}")
-            else:
-                print(f"No data found for {table} in SQL Server.")
-        conn.close()
+        with SQL_POOL.connection() as conn:
+            for table in tables:
+                print(f"Exporting {table} from SQL Server...")
+                query = f"SELECT * FROM {table}"
+                df = pd.read_sql(query, conn)
+                if not df.empty:
+                    file_path = os.path.join(export_dir, f"sql_{table.lower()}.csv")
+                    df.to_csv(file_path, index=False)
+                    print(f"Saved to {file_path}")
+                else:
+                    print(f"No data found for {table} in SQL Server.")
     except Exception as e:
         print(f"[ERROR] SQL Server export failed: {e}")
 
@@ -1,24 +1,21 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
 import matplotlib.cm as cm
 import numpy as np
-from settings import DATA_DIR, FIGURES_DIR
+from settings import FIGURES_DIR
+from build_cache import BuildCache
+from warehouse import read_warehouse
 
 os.makedirs(FIGURES_DIR, exist_ok=True)
 
-def load_data():
-    data_path = os.path.join(DATA_DIR, "warehouse", "merged_northwind.csv")
-    if not os.path.exists(data_path):
-        raise FileNotFoundError(f"Warehouse data not found at {data_path}")
-    df = pd.read_csv(data_path)
-    df['FullDate'] = pd.to_datetime(df['FullDate'])
-    return df
+def load_data(columns=None, start=None, end=None):
+    """Loads the warehouse, reading only the requested columns and the partitions within [start, end]."""
+    return read_warehouse(columns=columns, start=start, end=end)
 
 def plot_orders_by_country(df):
     plt.figure(figsize=(12, 6))
-    country_orders = df['Country_x'].value_counts().reset_index()
+    country_orders = df['Country'].value_counts().reset_index()
     country_orders.columns = ['Country', 'OrderCount']
     sns.barplot(data=country_orders, x='Country', y='OrderCount', palette='viridis')
     plt.title('Total Orders by Country')
@@ -72,11 +69,11 @@ def plot_3d_orders(df):
 
     df['MonthNum'] = df['FullDate'].dt.month
 
-    agg = df.groupby(['MonthNum', 'Country_x']).size().reset_index(name='OrderCount')
+    agg = df.groupby(['MonthNum', 'Country']).size().reset_index(name='OrderCount')
 
-    countries = agg['Country_x'].unique()
+    countries = agg['Country'].unique()
     country_map = {c: i for i, c in enumerate(countries)}
-    agg['CountryId'] = agg['Country_x'].map(country_map)
+    agg['CountryId'] = agg['Country'].map(country_map)
     
     fig = plt.figure(figsize=(12, 8))
     ax = fig.add_subplot(111, projection='3d')
@@ -106,14 +103,26 @@ def plot_3d_orders(df):
     print(f"Saved {save_path}")
     plt.close()
 
+# (plot, columns it reads, file it writes)
+PLOTS = [
+    (plot_orders_by_country, ['Country'], "orders_by_country.png"),
+    (plot_orders_by_employee, ['FirstName', 'LastName'], "orders_by_employee.png"),
+    (plot_monthly_trend, ['FullDate'], "monthly_orders_trend.png"),
+    (plot_3d_orders, ['FullDate', 'Country'], "3d_orders_by_month_country.png"),
+]
+
 if __name__ == "__main__":
     print("--- Generating Figures ---")
     try:
-        df = load_data()
-        plot_orders_by_country(df)
-        plot_orders_by_employee(df)
-        plot_monthly_trend(df)
-        plot_3d_orders(df)
+        # Only the columns some plot reads
+        df = load_data(columns=list(dict.fromkeys(col for _, columns, _ in PLOTS for col in columns)))
+        cache = BuildCache("generate_figures")
+        # Each plot is keyed by the columns it reads; the plots add helper columns to df, so hash first
+        for plot, columns, filename in PLOTS:
+            cache.run(f"static/{plot.__name__}", [os.path.join(FIGURES_DIR, filename)], lambda: plot(df),
+                      data=df[columns], code=plot)
+        cache.save()
+        print(cache.summary())
         print("--- Figures Generated Successfully ---")
     except Exception as e:
         print(f"[ERROR] Failed to generate figures: {e}")
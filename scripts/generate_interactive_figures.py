@@ -1,9 +1,17 @@
-import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
-from settings import DATA_DIR, FIGURES_DIR
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from settings import FIGURES_DIR, FIGURE_WORKERS, FIGURE_HTML_MODE
+from aggregates import aggregate, load_aggregates
+from build_cache import BuildCache
+from html_export import PLOTLYJS_BUNDLE, html_size_report, write_figure_html, write_plotly_bundle
+from instrumentation import path_size, record, run_report, span
+from warehouse import read_warehouse
 
 os.makedirs(FIGURES_DIR, exist_ok=True)
 
@@ -45,19 +53,73 @@ def apply_theme(fig):
     fig.update_layout(**COMMON_LAYOUT)
     return fig
 
+def member_groups(frame, member, by, value='Revenue'):
+    """Sums `value` by `member` and `by` in one grouped pass; yields (member, {column: array} sorted by `by`) per member.
+
+    The sorted result keeps each member's rows contiguous, so they are cut
+    at the boundaries instead of filtering the frame once per member.
+    """
+    grouped = frame.groupby([member] + by, observed=True)[value].sum().reset_index()
+    keys = grouped[member].to_numpy()
+    columns = {col: grouped[col].to_numpy() for col in by + [value]}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+    ends = np.r_[starts[1:], len(grouped)]
+    for start, end in zip(starts, ends):
+        # Array slices are views, and plotly takes NumPy arrays without converting them
+        yield keys[start], {col: values[start:end] for col, values in columns.items()}
+
+def dropdown_figure(entries, title, x=0.1, y=1.1):
+    """A figure showing one trace at a time, picked from a dropdown of the entries' labels.
+
+    `entries` are (label, trace) pairs, the first shown initially; `title`
+    is formatted with each label.
+    """
+    labels = [label for label, _ in entries]
+    traces = [trace for _, trace in entries]
+    for i, trace in enumerate(traces):
+        trace.visible = i == 0
+    # All traces in one call: adding them one at a time re-validates the figure's data on every add
+    fig = go.Figure(data=traces)
+    # Boolean arrays rather than lists: the n x n visibility flags are copied on every layout update
+    positions = np.arange(len(labels))
+    buttons = [
+        dict(
+            method="update",
+            label=label,
+            args=[{"visible": positions == i}, {"title": title.format(label=label)}]
+        ) for i, label in enumerate(labels)
+    ]
+    fig.update_layout(
+        updatemenus=[dict(
+            active=0,
+            buttons=buttons,
+            x=x, y=y,
+            xanchor='left', yanchor='top',
+            bgcolor=THEME_COLORS['background'],
+            font=dict(color=THEME_COLORS['text'])
+        )],
+        title=title.format(label=labels[0]) if labels else None
+    )
+    return fig
+
+
 
+# Columns read by the create_* functions below; nothing else is loaded from the warehouse.
+FIGURE_COLUMNS = ['OrderId', 'FullDate', 'Revenue', 'DeliveredFlag', 'Category', 'Country', 'FirstName', 'LastName']
 
-def load_data():
-    data_path = os.path.join(DATA_DIR, "warehouse", "merged_northwind.csv")
-    if not os.path.exists(data_path):
-        raise FileNotFoundError(f"Warehouse data not found at {data_path}")
-    df = pd.read_csv(data_path)
-    df['FullDate'] = pd.to_datetime(df['FullDate'])
-    return df
+# Summary tables the create_* functions read instead of order lines when materialized
+FIGURE_AGGREGATES = [
+    'AggDeliveryStatus', 'AggRevenueByCategory', 'AggRevenueByCountry', 'AggRevenueByMonth',
+    'AggRevenueByMonthCountry', 'AggRevenueByEmployeeMonth', 'AggRevenueByEmployee'
+]
 
-def create_delivery_stats(df):
+def load_data(columns=None, start=None, end=None):
+    """Loads the warehouse, reading only the requested columns and the partitions within [start, end]."""
+    return read_warehouse(columns=columns, start=start, end=end)
+
+def create_delivery_stats(df, aggs=None):
     """Create interactive doughnut chart for delivery statistics"""
-    delivery_counts = df['DeliveredFlag'].value_counts()
+    delivery_counts = aggregate(df, aggs, 'AggDeliveryStatus').set_index('DeliveredFlag')['Lines']
     
     fig = go.Figure(data=[go.Pie(
         labels=['Delivered', 'Pending'],
@@ -74,20 +136,20 @@ def create_delivery_stats(df):
         title='Order Delivery Status',
         showlegend=True,
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-        annotations=[dict(text=f"{len(df)}<br>Items", x=0.5, y=0.5, font_size=20, showarrow=False, font_color=THEME_COLORS['text'])]
+        annotations=[dict(text=f"{delivery_counts.sum()}<br>Items", x=0.5, y=0.5, font_size=20, showarrow=False, font_color=THEME_COLORS['text'])]
     )
     
     apply_theme(fig)
     html_path = os.path.join(FIGURES_DIR, "delivery_stats_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "delivery_stats.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_revenue_by_category(df):
+def create_revenue_by_category(df, aggs=None):
     """Create interactive bar chart for revenue by category"""
-    cat_rev = df.groupby('Category')['Revenue'].sum().reset_index().sort_values('Revenue', ascending=False)
+    cat_rev = aggregate(df, aggs, 'AggRevenueByCategory')[['Category', 'Revenue']].sort_values('Revenue', ascending=False)
     
     fig = px.bar(
         cat_rev,
@@ -104,14 +166,14 @@ def create_revenue_by_category(df):
     
     html_path = os.path.join(FIGURES_DIR, "revenue_by_category_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "revenue_by_category.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_orders_by_country(df):
+def create_orders_by_country(df, aggs=None):
     """Create interactive bar chart for orders by country"""
-    country_orders = df['Country'].value_counts().reset_index().head(10)
+    country_orders = aggregate(df, aggs, 'AggRevenueByCountry').nlargest(10, 'Lines')[['Country', 'Lines']]
     country_orders.columns = ['Country', 'OrderCount']
     
     fig = px.bar(
@@ -128,16 +190,15 @@ def create_orders_by_country(df):
     
     apply_theme(fig)
     html_path = os.path.join(FIGURES_DIR, "orders_by_country_interactive.html")
-    png_path = os.path.join(FIGURES_DIR, "orders_by_country.png")
-    fig.write_html(html_path)
+    png_path = os.path.join(FIGURES_DIR, "orders_by_country_interactive.png")
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_monthly_trend(df):
+def create_monthly_trend(df, aggs=None):
     """Create interactive area chart for monthly trends"""
-    df['YearMonth'] = df['FullDate'].dt.to_period('M').astype(str)
-    monthly_rev = df.groupby('YearMonth')['Revenue'].sum().reset_index()
+    monthly_rev = aggregate(df, aggs, 'AggRevenueByMonth')[['YearMonth', 'Revenue']]
     
     fig = px.area(
         monthly_rev,
@@ -158,86 +219,41 @@ def create_monthly_trend(df):
     apply_theme(fig)
     html_path = os.path.join(FIGURES_DIR, "monthly_trend_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "revenue_trend.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_3d_scatter(df):
+def create_3d_scatter(df, aggs=None):
     """Create interactive 3D scatter plot with Year selection"""
-    df['Year'] = df['FullDate'].dt.year
-    df['MonthNum'] = df['FullDate'].dt.month
+    month_country = aggregate(df, aggs, 'AggRevenueByMonthCountry')
     
-    years = sorted(df['Year'].unique())
-    fig = go.Figure()
-
-    # Add "All Years" trace (aggregated)
-    agg_all = df.groupby(['MonthNum', 'Country'])[['Revenue']].sum().reset_index()
-    fig.add_trace(go.Scatter3d(
-        x=agg_all['MonthNum'],
-        y=agg_all['Country'],
-        z=agg_all['Revenue'],
-        mode='markers',
-        marker=dict(
-            size=6,
-            color=agg_all['Revenue'],
-            colorscale='Viridis',
-            opacity=0.8
-        ),
-        name='All Years',
-        visible=True,
-        hovertemplate="Month: %{x}<br>Country: %{y}<br>Revenue: $%{z:,.2f}<extra></extra>"
-    ))
-
-    # Add individual year traces
-    for year in years:
-        agg_year = df[df['Year'] == year].groupby(['MonthNum', 'Country'])[['Revenue']].sum().reset_index()
-        fig.add_trace(go.Scatter3d(
-            x=agg_year['MonthNum'],
-            y=agg_year['Country'],
-            z=agg_year['Revenue'],
+    def scatter(data, name, hovertemplate):
+        return go.Scatter3d(
+            x=data['MonthNum'],
+            y=data['Country'],
+            z=data['Revenue'],
             mode='markers',
             marker=dict(
                 size=6,
-                color=agg_year['Revenue'],
+                color=data['Revenue'],
                 colorscale='Viridis',
                 opacity=0.8
             ),
-            name=str(year),
-            visible=False,
-            hovertemplate=f"Year: {year}<br>Month: %{{x}}<br>Country: %{{y}}<br>Revenue: $%{{z:,.2f}}<extra></extra>"
-        ))
-
-    # Create dropdown buttons
-    buttons = []
-    # "All Years" button
-    buttons.append(dict(
-        method="update",
-        label="All Years",
-        args=[{"visible": [True] + [False] * len(years)},
-              {"title": "3D Analysis: Revenue Seasonality (All Years)"}]
-    ))
-    # Individual year buttons
-    for i, year in enumerate(years):
-        visible_flags = [False] * (len(years) + 1)
-        visible_flags[i + 1] = True
-        buttons.append(dict(
-            method="update",
-            label=str(year),
-            args=[{"visible": visible_flags},
-                  {"title": f"3D Analysis: Revenue Seasonality ({year})"}]
-        ))
+            name=name,
+            hovertemplate=hovertemplate
+        )
+
+    # "All Years" trace (aggregated), then one trace per year from a single grouped pass
+    agg_all = month_country.groupby(['MonthNum', 'Country'])[['Revenue']].sum().reset_index()
+    entries = [("All Years", scatter(agg_all, 'All Years', "Month: %{x}<br>Country: %{y}<br>Revenue: $%{z:,.2f}<extra></extra>"))]
+    entries += [
+        (str(year), scatter(agg_year, str(year), f"Year: {year}<br>Month: %{{x}}<br>Country: %{{y}}<br>Revenue: $%{{z:,.2f}}<extra></extra>"))
+        for year, agg_year in member_groups(month_country, 'Year', ['MonthNum', 'Country'])
+    ]
+    fig = dropdown_figure(entries, "3D Analysis: Revenue Seasonality ({label})")
 
     fig.update_layout(
-        updatemenus=[dict(
-            active=0,
-            buttons=buttons,
-            x=0.1, y=1.1,
-            xanchor='left', yanchor='top',
-            bgcolor=THEME_COLORS['background'],
-            font=dict(color=THEME_COLORS['text'])
-        )],
-        title='3D Analysis: Revenue Seasonality (All Years)',
         scene=dict(
             xaxis=dict(backgroundcolor=THEME_COLORS['background'], gridcolor=THEME_COLORS['grid'], title='Month'),
             yaxis=dict(backgroundcolor=THEME_COLORS['background'], gridcolor=THEME_COLORS['grid'], title='Country'),
@@ -251,88 +267,43 @@ def create_3d_scatter(df):
     
     html_path = os.path.join(FIGURES_DIR, "3d_orders_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "3d_orders.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_employee_performance_3d(df):
+def create_employee_performance_3d(df, aggs=None):
     """Create a 3D scatter plot of Employee performance with Year selection"""
-    df['Year'] = df['FullDate'].dt.year
-    df['EmployeeName'] = df['FirstName'].astype(str) + ' ' + df['LastName'].astype(str)
+    emp_month = aggregate(df, aggs, 'AggRevenueByEmployeeMonth')
     
-    years = sorted(df['Year'].unique())
-    fig = go.Figure()
-
-    # Add "All Years" trace
-    emp_all_rev = df.groupby(['EmployeeName'])['Revenue'].sum().reset_index()
-    # To keep it 3D, we'll plot against a dummy axis or just show the same for all years if needed, 
-    # but more logically we show all (Employee, Year, Revenue) points for "All Years"
-    emp_year_rev_all = df.groupby(['EmployeeName', 'Year'])['Revenue'].sum().reset_index()
-    
-    fig.add_trace(go.Scatter3d(
-        x=emp_year_rev_all['EmployeeName'],
-        y=emp_year_rev_all['Year'],
-        z=emp_year_rev_all['Revenue'],
-        mode='markers',
-        marker=dict(
-            size=8,
-            color=emp_year_rev_all['Revenue'],
-            colorscale='Plasma',
-            opacity=0.9
-        ),
-        name='All Years',
-        visible=True,
-        hovertemplate="Employee: %{x}<br>Year: %{y}<br>Revenue: $%{z:,.2f}<extra></extra>"
-    ))
-
-    # Add individual year traces
-    for year in years:
-        emp_year_rev = df[df['Year'] == year].groupby(['EmployeeName'])['Revenue'].sum().reset_index()
-        fig.add_trace(go.Scatter3d(
-            x=emp_year_rev['EmployeeName'],
-            y=[year] * len(emp_year_rev),
-            z=emp_year_rev['Revenue'],
+    def scatter(data, years, name, size, hovertemplate):
+        return go.Scatter3d(
+            x=data['EmployeeName'],
+            y=years,
+            z=data['Revenue'],
             mode='markers',
             marker=dict(
-                size=10,
-                color=emp_year_rev['Revenue'],
+                size=size,
+                color=data['Revenue'],
                 colorscale='Plasma',
                 opacity=0.9
             ),
-            name=str(year),
-            visible=False,
-            hovertemplate=f"Year: {year}<br>Employee: %{{x}}<br>Revenue: $%{{z:,.2f}}<extra></extra>"
-        ))
-
-    # Create dropdown buttons
-    buttons = []
-    buttons.append(dict(
-        method="update",
-        label="All Years",
-        args=[{"visible": [True] + [False] * len(years)},
-              {"title": "3D Analysis: Employee Performance (All Years)"}]
-    ))
-    for i, year in enumerate(years):
-        visible_flags = [False] * (len(years) + 1)
-        visible_flags[i + 1] = True
-        buttons.append(dict(
-            method="update",
-            label=str(year),
-            args=[{"visible": visible_flags},
-                  {"title": f"3D Analysis: Employee Performance ({year})"}]
-        ))
+            name=name,
+            hovertemplate=hovertemplate
+        )
+
+    # "All Years" shows every (Employee, Year, Revenue) point; each year's trace comes from one grouped pass
+    emp_year_rev_all = emp_month.groupby(['EmployeeName', 'Year'])['Revenue'].sum().reset_index()
+    entries = [("All Years", scatter(emp_year_rev_all, emp_year_rev_all['Year'], 'All Years', 8,
+                                     "Employee: %{x}<br>Year: %{y}<br>Revenue: $%{z:,.2f}<extra></extra>"))]
+    entries += [
+        (str(year), scatter(emp_year_rev, np.full(len(emp_year_rev['Revenue']), year), str(year), 10,
+                            f"Year: {year}<br>Employee: %{{x}}<br>Revenue: $%{{z:,.2f}}<extra></extra>"))
+        for year, emp_year_rev in member_groups(emp_month, 'Year', ['EmployeeName'])
+    ]
+    fig = dropdown_figure(entries, "3D Analysis: Employee Performance ({label})")
 
     fig.update_layout(
-        updatemenus=[dict(
-            active=0,
-            buttons=buttons,
-            x=0.1, y=1.1,
-            xanchor='left', yanchor='top',
-            bgcolor=THEME_COLORS['background'],
-            font=dict(color=THEME_COLORS['text'])
-        )],
-        title='3D Analysis: Employee Performance (All Years)',
         scene=dict(
             xaxis=dict(backgroundcolor=THEME_COLORS['background'], gridcolor=THEME_COLORS['grid'], title='Employee'),
             yaxis=dict(backgroundcolor=THEME_COLORS['background'], gridcolor=THEME_COLORS['grid'], title='Year'),
@@ -346,61 +317,38 @@ def create_employee_performance_3d(df):
     
     html_path = os.path.join(FIGURES_DIR, "employee_3d_performance_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "employee_3d_performance.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_employee_explorer(df):
+def create_employee_explorer(df, aggs=None):
     """Create a Plotly figure with a dropdown for employees showing their revenue over time."""
-    df['EmployeeName'] = df['FirstName'].astype(str) + ' ' + df['LastName'].astype(str)
-    employees = sorted(df['EmployeeName'].unique())
-    
-    fig = go.Figure()
-
-    for emp in employees:
-        emp_df = df[df['EmployeeName'] == emp].copy()
-        emp_df['YearMonth'] = emp_df['FullDate'].dt.to_period('M').astype(str)
-        monthly = emp_df.groupby('YearMonth')['Revenue'].sum().reset_index()
-        
-        fig.add_trace(go.Bar(
+    emp_month = aggregate(df, aggs, 'AggRevenueByEmployeeMonth')
+    # One grouped pass gives every employee's monthly revenue, in employee order
+    entries = [
+        (emp, go.Bar(
             x=monthly['YearMonth'],
             y=monthly['Revenue'],
             name=emp,
-            visible=(emp == employees[0]),
             marker_color=THEME_COLORS['primary']
         ))
-
-    dropdown_buttons = [
-        dict(
-            method="update",
-            label=emp,
-            args=[{"visible": [emp == e for e in employees]},
-                  {"title": f"Revenue Trend: {emp}"}]
-        ) for emp in employees
+        for emp, monthly in member_groups(emp_month, 'EmployeeName', ['YearMonth'])
     ]
+    fig = dropdown_figure(entries, "Revenue Trend: {label}", x=0, y=1.15)
 
     fig.update_layout(
-        updatemenus=[dict(
-            active=0, 
-            buttons=dropdown_buttons, 
-            x=0, y=1.15, 
-            xanchor='left', yanchor='top',
-            bgcolor=THEME_COLORS['background'],
-            font=dict(color=THEME_COLORS['text'])
-        )],
-        title=f"Revenue Trend: {employees[0]}",
         xaxis_title="Month",
         yaxis_title="Revenue ($)"
     )
     
     apply_theme(fig)
     html_path = os.path.join(FIGURES_DIR, "employee_explorer_interactive.html")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     print(f"Saved {html_path}")
     return fig
 
-def create_dashboard(df):
+def create_dashboard(df, aggs=None):
     """Create a unified premium dashboard with Revenue focus"""
     fig = make_subplots(
         rows=3, cols=2,
@@ -418,7 +366,7 @@ def create_dashboard(df):
         horizontal_spacing=0.08
     )
 
-    delivery_counts = df['DeliveredFlag'].value_counts()
+    delivery_counts = aggregate(df, aggs, 'AggDeliveryStatus').set_index('DeliveredFlag')['Lines']
     fig.add_trace(go.Pie(
         labels=['Delivered', 'Pending'],
         values=[delivery_counts.get(1, 0), delivery_counts.get(0, 0)],
@@ -428,7 +376,7 @@ def create_dashboard(df):
         showlegend=False
     ), row=1, col=1)
 
-    cat_rev = df.groupby('Category')['Revenue'].sum().head(5).reset_index()
+    cat_rev = aggregate(df, aggs, 'AggRevenueByCategory')[['Category', 'Revenue']].head(5)
     fig.add_trace(go.Bar(
         x=cat_rev['Category'], 
         y=cat_rev['Revenue'],
@@ -436,8 +384,7 @@ def create_dashboard(df):
         showlegend=False
     ), row=1, col=2)
 
-    df['YearMonth'] = df['FullDate'].dt.to_period('M').astype(str)
-    monthly = df.groupby('YearMonth')['Revenue'].sum().reset_index()
+    monthly = aggregate(df, aggs, 'AggRevenueByMonth')[['YearMonth', 'Revenue']]
     fig.add_trace(go.Scatter(
         x=monthly['YearMonth'], 
         y=monthly['Revenue'],
@@ -448,7 +395,7 @@ def create_dashboard(df):
         showlegend=False
     ), row=2, col=1)
 
-    country_rev = df.groupby('Country')['Revenue'].sum().sort_values(ascending=False).head(5).sort_values().reset_index()
+    country_rev = aggregate(df, aggs, 'AggRevenueByCountry').set_index('Country')['Revenue'].sort_values(ascending=False).head(5).sort_values().reset_index()
     fig.add_trace(go.Bar(
         y=country_rev['Country'], 
         x=country_rev['Revenue'],
@@ -457,7 +404,7 @@ def create_dashboard(df):
         showlegend=False
     ), row=3, col=1)
 
-    emp_rev = df.groupby('FirstName')['Revenue'].sum().sort_values(ascending=False).head(5).reset_index()
+    emp_rev = aggregate(df, aggs, 'AggRevenueByEmployee').groupby('FirstName')['Revenue'].sum().sort_values(ascending=False).head(5).reset_index()
     fig.add_trace(go.Bar(
         x=emp_rev['FirstName'],
         y=emp_rev['Revenue'],
@@ -474,29 +421,165 @@ def create_dashboard(df):
     
     html_path = os.path.join(FIGURES_DIR, "dashboard_interactive.html")
     png_path = os.path.join(FIGURES_DIR, "dashboard_interactive.png")
-    fig.write_html(html_path)
+    write_figure_html(fig, html_path)
     fig.write_image(png_path)
     print(f"Stats: Dashboard generated at {html_path}")
     return fig
 
-def generate_all_figures():
-    """Main function to run generation of all figures"""
+FIGURE_BUILDERS = [
+    create_delivery_stats,
+    create_revenue_by_category,
+    create_orders_by_country,
+    create_monthly_trend,
+    create_3d_scatter,
+    create_employee_explorer,
+    create_employee_performance_3d,
+    create_dashboard,
+]
+
+# Summary tables each figure consumes (hashed as its input data) and the files it writes
+FIGURE_INPUTS = {
+    'create_delivery_stats': ['AggDeliveryStatus'],
+    'create_revenue_by_category': ['AggRevenueByCategory'],
+    'create_orders_by_country': ['AggRevenueByCountry'],
+    'create_monthly_trend': ['AggRevenueByMonth'],
+    'create_3d_scatter': ['AggRevenueByMonthCountry'],
+    'create_employee_explorer': ['AggRevenueByEmployeeMonth'],
+    'create_employee_performance_3d': ['AggRevenueByEmployeeMonth'],
+    'create_dashboard': ['AggDeliveryStatus', 'AggRevenueByCategory', 'AggRevenueByMonth', 'AggRevenueByCountry', 'AggRevenueByEmployee'],
+}
+FIGURE_OUTPUTS = {
+    'create_delivery_stats': ['delivery_stats_interactive.html', 'delivery_stats.png'],
+    'create_revenue_by_category': ['revenue_by_category_interactive.html', 'revenue_by_category.png'],
+    'create_orders_by_country': ['orders_by_country_interactive.html', 'orders_by_country_interactive.png'],
+    'create_monthly_trend': ['monthly_trend_interactive.html', 'revenue_trend.png'],
+    'create_3d_scatter': ['3d_orders_interactive.html', '3d_orders.png'],
+    'create_employee_explorer': ['employee_explorer_interactive.html'],
+    'create_employee_performance_3d': ['employee_3d_performance_interactive.html', 'employee_3d_performance.png'],
+    'create_dashboard': ['dashboard_interactive.html', 'dashboard_interactive.png'],
+}
+
+def figure_outputs(name):
+    """Paths of the files a figure writes, with the .gz siblings of its pages in "shared" HTML mode."""
+    files = FIGURE_OUTPUTS[name]
+    if FIGURE_HTML_MODE == "shared":
+        files = files + [f"{f}.gz" for f in files if f.endswith(".html")]
+    return [os.path.join(FIGURES_DIR, f) for f in files]
+
+def plan_figures(cache, df, aggs):
+    """Plans every figure build, keyed by its input slice, the theme, the HTML mode and its code."""
+    params = {'theme': THEME_COLORS, 'layout': COMMON_LAYOUT, 'html': FIGURE_HTML_MODE, 'plotlyjs': PLOTLYJS_BUNDLE}
+    plans = {}
+    for builder in FIGURE_BUILDERS:
+        name = builder.__name__
+        data = {agg: aggregate(df, aggs, agg) for agg in FIGURE_INPUTS[name]}
+        plans[name] = cache.plan(f"interactive/{name}", figure_outputs(name), data=data, params=params,
+                                 code=[builder, apply_theme, write_figure_html])
+    return plans
+
+# Set once per worker process by _init_worker, so tasks only carry a figure name
+_shared_df = None
+_shared_aggs = None
+
+def _init_worker(df, aggs):
+    global _shared_df, _shared_aggs
+    _shared_df, _shared_aggs = df, aggs
+
+def _render_figure(name):
+    """Builds and exports one figure from the shared data; returns (name, seconds, error, span record)."""
+    builder = next(b for b in FIGURE_BUILDERS if b.__name__ == name)
+    start = time.perf_counter()
+    error = None
+    # Measured here, possibly in a worker process; the parent adds the record to its run report
+    with span(f"figures.{name}", parent="figures", pid=os.getpid()) as s:
+        try:
+            builder(_shared_df, _shared_aggs)
+        except Exception as e:
+            error = traceback.format_exc()
+            message = str(e).strip().splitlines()
+            s.error = f"{type(e).__name__}: {message[0] if message else ''}"
+        s.add(bytes_written=path_size(*figure_outputs(name)))
+    return name, time.perf_counter() - start, error, s.to_dict()
+
+def generate_all_figures(workers=FIGURE_WORKERS, force=False, context=None):
+    """Main function to run generation of all figures.
+
+    Figures whose input data, theme and code are unchanged since the last run
+    are skipped (see build_cache.py; `force` rebuilds everything). The rest are
+    rendered on a pool of `workers` processes (in-process when workers <= 1).
+    A failing figure is reported and does not stop the others. With an
+    analysis_context.AnalysisContext, the summary tables come from it.
+    Returns {figure: seconds} for the figures that were written. A run
+    report of the planning and per-figure spans is written (see instrumentation.py).
+    """
+    with run_report("figures") as run:
+        return _generate_all_figures(workers, force, context, run)
+
+def _generate_all_figures(workers, force, context, run):
     print("--- Generating Premium Interactive Figures & PNGs ---")
     try:
-        df = load_data()
-        create_delivery_stats(df)
-        create_revenue_by_category(df)
-        create_orders_by_country(df)
-        create_monthly_trend(df)
-        create_3d_scatter(df)
-        create_employee_explorer(df)
-        create_employee_performance_3d(df)
-        create_dashboard(df)
-        print("--- Success ---")
+        if context is not None:
+            aggs, df = context.aggregates(FIGURE_AGGREGATES), None
+        else:
+            # Summary tables materialized by the ETL make the order lines unnecessary
+            aggs = load_aggregates(FIGURE_AGGREGATES)
+            df = None if len(aggs) == len(FIGURE_AGGREGATES) else load_data(columns=FIGURE_COLUMNS)
+        with span("figures.plan", figures=len(FIGURE_BUILDERS)):
+            cache = BuildCache("generate_interactive_figures", force=force)
+            plans = plan_figures(cache, df, aggs)
     except Exception as e:
-        import traceback
         traceback.print_exc()
         print(f"[ERROR] {e}")
+        return {}
+
+    names = [name for name, plan in plans.items() if plan.reason is not None]
+    for name, plan in plans.items():
+        print(f"  {name}: {'rebuild (' + plan.reason + ')' if plan.reason else 'up to date'}")
+    if FIGURE_HTML_MODE == "shared":
+        # Written once here rather than raced for by the workers
+        write_plotly_bundle()
+    start = time.perf_counter()
+    in_process = workers <= 1 or not names
+    if in_process:
+        _init_worker(df, aggs)
+        results = [_render_figure(name) for name in names]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(names)), initializer=_init_worker, initargs=(df, aggs)) as pool:
+            futures = {pool.submit(_render_figure, name): name for name in names}
+            results = []
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception:
+                    # The worker itself died (e.g. Kaleido crashed it)
+                    results.append((futures[future], 0.0, traceback.format_exc(), None))
+    elapsed = time.perf_counter() - start
+
+    for name, _, error, span_record in results:
+        if span_record is not None:
+            run.add(bytes_written=span_record["bytes_written"])
+            # Spans measured in this process are already in the run report
+            if not in_process:
+                record(span_record)
+        cache.done(plans[name], error=error)
+    cache.save()
+    print(cache.summary())
+
+    # Sizes of the rebuilt pages against standalone pages (see html_export.py)
+    pages = [page for _, _, _, span_record in results if span_record for page in span_record.get("html_pages", [])]
+    if pages:
+        print(html_size_report(pages))
+
+    failed = [(name, error) for name, _, error, _ in results if error]
+    for name, error in failed:
+        print(f"[ERROR] {name} failed:\n{error}")
+    print("Figure timings:")
+    for name, seconds, error, _ in sorted(results, key=lambda r: -r[1]):
+        print(f"  {name:<32} {seconds:7.2f}s{'  FAILED' if error else ''}")
+    print(f"Rendered {len(results) - len(failed)}/{len(results)} figures in {elapsed:.2f}s using {max(1, min(workers, len(names)))} worker(s)")
+    if not failed:
+        print("--- Success ---")
+    return {name: seconds for name, seconds, error, _ in results if not error}
 
 if __name__ == "__main__":
     generate_all_figures()
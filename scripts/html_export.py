@@ -0,0 +1,145 @@
+# html_export.py
+import base64
+import gzip
+import json
+import os
+import numpy as np
+import plotly.io as pio
+import plotly.offline
+from instrumentation import current_span
+from settings import FIGURES_DIR, FIGURE_HTML_MODE
+
+HTML_MODES = ("standalone", "shared")
+
+PLOTLYJS_VERSION = plotly.offline.get_plotlyjs_version()
+# One versioned copy of plotly.js per figures directory, referenced by every page in "shared" mode
+PLOTLYJS_BUNDLE = f"plotly-{PLOTLYJS_VERSION}.min.js"
+# plotly.js decodes {"dtype", "bdata"} typed arrays in trace data from 2.28 on
+TYPED_ARRAYS = tuple(int(part) for part in PLOTLYJS_VERSION.split(".")[:2]) >= (2, 28)
+# Integer types plotly.js reads, narrowest first (it has no 64-bit integers)
+TYPED_ARRAY_INTS = ["i1", "u1", "i2", "u2", "i4", "u4"]
+
+SIZE_REPORT_PATH = os.path.join(FIGURES_DIR, "html_size_report.json")
+
+# How plotly.io's page template loads plotly.js: from the bundle in "shared" mode, inline in write_html's pages
+BUNDLE_SCRIPT_TAG = f'<script charset="utf-8" src="{PLOTLYJS_BUNDLE}"></script>'
+INLINE_SCRIPT_TAGS = "<script></script>"
+
+
+def _write_bytes(path, data):
+    # Pages may be written by several worker processes at once: write aside, then rename
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _gzip(data):
+    # No timestamp in the header, so unchanged pages compress to identical files
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def write_plotly_bundle(directory=FIGURES_DIR):
+    """Writes the shared plotly.js bundle (and its .gz) to `directory` unless it is already there."""
+    path = os.path.join(directory, PLOTLYJS_BUNDLE)
+    if not os.path.exists(path) or not os.path.exists(f"{path}.gz"):
+        os.makedirs(directory, exist_ok=True)
+        data = plotly.offline.get_plotlyjs().encode("utf-8")
+        _write_bytes(f"{path}.gz", _gzip(data))
+        _write_bytes(path, data)
+    return path
+
+
+def typed_array(values):
+    """A 1-D numeric array as plotly.js's {"dtype", "bdata"} spec: little-endian bytes in base64.
+
+    Integers take the narrowest type holding their range (float64 beyond
+    32 bits); floats keep their precision.
+    """
+    dtype = "f4" if values.dtype == np.float32 else "f8"
+    if values.dtype.kind in "iu" and len(values):
+        low, high = values.min(), values.max()
+        dtype = next((t for t in TYPED_ARRAY_INTS if np.iinfo(t).min <= low and high <= np.iinfo(t).max), "f8")
+    data = np.ascontiguousarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {"dtype": dtype, "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+
+
+def encode_arrays(value):
+    """Replaces the numeric NumPy arrays in trace data with typed-array specs (other values are kept)."""
+    if isinstance(value, np.ndarray):
+        return typed_array(value) if value.ndim == 1 and value.dtype.kind in "iuf" else value
+    if isinstance(value, dict):
+        return {k: encode_arrays(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_arrays(v) for v in value]
+    return value
+
+
+def standalone_html_bytes(page_bytes, bundle_bytes):
+    """Size of a shared-mode page with the bundle embedded instead, as write_html writes it.
+
+    Only the script tag loading plotly.js differs; trace arrays are counted
+    as the shared page encodes them.
+    """
+    return page_bytes - len(BUNDLE_SCRIPT_TAG) + len(INLINE_SCRIPT_TAGS) + bundle_bytes
+
+
+def write_figure_html(fig, html_path, mode=FIGURE_HTML_MODE):
+    """Writes an interactive figure page.
+
+    "standalone" is plotly's write_html: every page embeds plotly.js.
+    "shared" pages load the versioned bundle next to them (written on first
+    use), carry their trace arrays as typed binary and get a precompressed
+    `.gz` sibling. The page sizes are added to the caller's span as
+    `html_pages` (see html_size_report).
+    """
+    if mode not in HTML_MODES:
+        raise ValueError(f"Unknown HTML mode {mode!r}; expected one of {HTML_MODES}")
+    if mode == "standalone":
+        fig.write_html(html_path)
+        return
+    directory = os.path.dirname(html_path)
+    bundle = write_plotly_bundle(directory)
+    fig_dict = fig.to_plotly_json()
+    if TYPED_ARRAYS:
+        fig_dict["data"] = encode_arrays(fig_dict["data"])
+    html = pio.to_html(fig_dict, include_plotlyjs=PLOTLYJS_BUNDLE, validate=False).encode("utf-8")
+    gz = _gzip(html)
+    _write_bytes(html_path, html)
+    _write_bytes(f"{html_path}.gz", gz)
+
+    s = current_span()
+    if s is not None:
+        page = {"page": os.path.basename(html_path), "bytes": len(html), "gz_bytes": len(gz),
+                "standalone_bytes": standalone_html_bytes(len(html), os.path.getsize(bundle))}
+        s.add(html_pages=s.attrs.get("html_pages", []) + [page])
+
+
+def html_size_report(pages, directory=FIGURES_DIR, path=SIZE_REPORT_PATH):
+    """Compares shared-mode pages (with the bundle counted once) to standalone pages; writes the report as JSON.
+
+    `pages` are the html_pages recorded by write_figure_html. Returns the
+    report as printable text.
+    """
+    bundle = os.path.join(directory, PLOTLYJS_BUNDLE)
+    bundle_bytes = os.path.getsize(bundle) if os.path.exists(bundle) else 0
+    bundle_gz_bytes = os.path.getsize(f"{bundle}.gz") if os.path.exists(f"{bundle}.gz") else 0
+    pages = sorted(pages, key=lambda p: p["page"])
+    totals = {
+        "standalone_bytes": sum(p["standalone_bytes"] for p in pages),
+        "shared_bytes": sum(p["bytes"] for p in pages) + bundle_bytes,
+        "shared_gz_bytes": sum(p["gz_bytes"] for p in pages) + bundle_gz_bytes,
+    }
+    report = {"plotlyjs": PLOTLYJS_BUNDLE, "bundle_bytes": bundle_bytes, "bundle_gz_bytes": bundle_gz_bytes,
+              "pages": pages, "totals": totals}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    lines = [f"{'page':<44} {'standalone (KB)':>16} {'shared (KB)':>12} {'gzip (KB)':>10}"]
+    for p in pages:
+        lines.append(f"{p['page']:<44} {p['standalone_bytes'] / 1024:>16,.1f} {p['bytes'] / 1024:>12,.1f} {p['gz_bytes'] / 1024:>10,.1f}")
+    lines.append(f"{PLOTLYJS_BUNDLE + ' (shared)':<44} {'':>16} {bundle_bytes / 1024:>12,.1f} {bundle_gz_bytes / 1024:>10,.1f}")
+    lines.append(f"{'total':<44} {totals['standalone_bytes'] / 1024:>16,.1f} "
+                 f"{totals['shared_bytes'] / 1024:>12,.1f} {totals['shared_gz_bytes'] / 1024:>10,.1f}")
+    return "\n".join(lines)
@@ -0,0 +1,317 @@
+# instrumentation.py
+import cProfile
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+from settings import RUN_REPORTS_DIR, PROFILE_STAGES, TRACE_MEMORY_STAGES
+
+# Allocation sites kept per tracemalloc-traced span
+TRACEMALLOC_TOP = 10
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process so far."""
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def path_size(*paths):
+    """Bytes on disk of files and directory trees (missing paths count as 0)."""
+    total = 0
+    for path in paths:
+        if os.path.isfile(path):
+            total += os.path.getsize(path)
+        elif os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def frame_bytes(df):
+    """In-memory size of a DataFrame, as a stand-in for bytes read from sources that do not report it."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class Span:
+    """One timed step: wall and CPU time, rows, bytes read/written and peak memory.
+
+    `stage` is the first component of the dotted name ("load" for
+    "load.FactOrders"). CPU time is the whole process's, so spans running
+    concurrently on threads each include the others' work.
+    """
+
+    def __init__(self, name, parent=None, **attrs):
+        self.name = name
+        self.stage = name.split(".", 1)[0]
+        self.parent = parent
+        self.attrs = attrs
+        self.rows = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.error = None
+        self.wall_s = self.cpu_s = self.peak_rss_mb = None
+        self.traced_peak_mb = None
+
+    def add(self, rows=None, bytes_read=None, bytes_written=None, **attrs):
+        """Adds counts to the span (they accumulate) and extra attributes."""
+        if rows is not None:
+            self.rows = (self.rows or 0) + int(rows)
+        if bytes_read is not None:
+            self.bytes_read = (self.bytes_read or 0) + int(bytes_read)
+        if bytes_written is not None:
+            self.bytes_written = (self.bytes_written or 0) + int(bytes_written)
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        record = {
+            "name": self.name,
+            "stage": self.stage,
+            "parent": self.parent,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "rows": self.rows,
+            "rows_per_s": self.rows / self.wall_s if self.rows and self.wall_s else None,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+            "peak_rss_mb": self.peak_rss_mb,
+        }
+        if self.traced_peak_mb is not None:
+            record["traced_peak_mb"] = self.traced_peak_mb
+        if self.error:
+            record["error"] = self.error
+        record.update(self.attrs)
+        return record
+
+
+class RunReport:
+    """The spans of one pipeline run, written as JSON when the run ends."""
+
+    def __init__(self, name, output_dir=RUN_REPORTS_DIR):
+        self.name = name
+        self.started_at = pd.Timestamp.now()
+        self.run_id = f"{name}-{self.started_at:%Y%m%d-%H%M%S}"
+        # Runs started within the same second get numbered ids
+        n = 1
+        while os.path.exists(os.path.join(output_dir, f"{self.run_id}.json")):
+            n += 1
+            self.run_id = f"{name}-{self.started_at:%Y%m%d-%H%M%S}-{n}"
+        self.path = os.path.join(output_dir, f"{self.run_id}.json")
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        """Adds a finished span, given as a Span or as the dict of a span measured in another process."""
+        with self._lock:
+            self.spans.append(span.to_dict() if isinstance(span, Span) else span)
+
+    def stage_totals(self):
+        """Per stage: wall/CPU time, rows and bytes of its outermost spans (nested spans are not counted twice)."""
+        stage_of = {s["name"]: s["stage"] for s in self.spans}
+        totals = {}
+        for s in self.spans:
+            if s["parent"] is not None and stage_of.get(s["parent"]) == s["stage"]:
+                continue
+            t = totals.setdefault(s["stage"], {"spans": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": 0,
+                                               "bytes_read": 0, "bytes_written": 0, "peak_rss_mb": 0.0})
+            t["spans"] += 1
+            for key in ("wall_s", "cpu_s", "rows", "bytes_read", "bytes_written"):
+                t[key] += s[key] or 0
+            t["peak_rss_mb"] = max(t["peak_rss_mb"], s["peak_rss_mb"] or 0)
+        return totals
+
+    def to_dict(self, root):
+        return {
+            "meta": {
+                "run": self.name,
+                "run_id": self.run_id,
+                "started_at": self.started_at.isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+            },
+            "run": root.to_dict(),
+            "stages": self.stage_totals(),
+            "spans": self.spans,
+        }
+
+    def write(self, root):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.to_dict(root), f, indent=2, default=str)
+
+    def summary(self):
+        lines = [f"{'stage':<12} {'wall (s)':>9} {'cpu (s)':>9} {'rows':>12} {'written (MB)':>13} {'peak RSS (MB)':>14}"]
+        for stage, t in self.stage_totals().items():
+            lines.append(f"{stage:<12} {t['wall_s']:>9.2f} {t['cpu_s']:>9.2f} {t['rows']:>12,} "
+                         f"{t['bytes_written'] / 2**20:>13.1f} {t['peak_rss_mb']:>14.0f}")
+        return "\n".join(lines)
+
+
+# The active run (None outside run_report) and the stages to profile; inherited by forked workers
+_run = None
+_profile_stages = set(PROFILE_STAGES)
+_trace_memory_stages = set(TRACE_MEMORY_STAGES)
+# Open spans of the current thread, innermost last
+_local = threading.local()
+# Only one cProfile profiler and one tracemalloc peak window can be active at a time
+_hooks_lock = threading.Lock()
+_hooks_busy = set()
+
+
+def configure(profile=None, trace_memory=None):
+    """Sets the stages ("extract", "load", ...) run under cProfile or traced with tracemalloc."""
+    global _profile_stages, _trace_memory_stages
+    if profile is not None:
+        _profile_stages = set(profile)
+    if trace_memory is not None:
+        _trace_memory_stages = set(trace_memory)
+
+
+def current_run():
+    return _run
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_span():
+    """The innermost span open on this thread (None outside spans), for helpers that add to their caller's span."""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def _claim(hook, stage, stages):
+    if stage not in stages:
+        return False
+    with _hooks_lock:
+        if hook in _hooks_busy:
+            return False
+        _hooks_busy.add(hook)
+        return True
+
+
+def _release(hook):
+    with _hooks_lock:
+        _hooks_busy.discard(hook)
+
+
+def _profile_path(name):
+    run_id = _run.run_id if _run is not None else f"pid{os.getpid()}"
+    directory = os.path.dirname(_run.path) if _run is not None else RUN_REPORTS_DIR
+    return os.path.join(directory, f"{run_id}.{name}.prof")
+
+
+@contextmanager
+def span(name, rows=None, bytes_read=None, bytes_written=None, parent=None, **attrs):
+    """Measures the enclosed step and records it in the active run.
+
+    Yields the Span so the step can add(rows=..., bytes_written=...) once it
+    knows them. `parent` names the enclosing span for steps run on a pool
+    thread, which do not see the spans open on the submitting thread. Outside a run the span is still measured (a worker process
+    can send span.to_dict() back to the parent) but not recorded. Spans of
+    a stage in the configured profile stages run under cProfile (dumped to
+    `<run id>.<span>.prof` next to the report; cProfile only sees the thread
+    that opened the span); traced-memory stages record tracemalloc's peak and
+    top allocation sites. One span at a time holds each hook.
+    """
+    stack = _stack()
+    s = Span(name, parent=parent or (stack[-1].name if stack else None), **attrs)
+    s.add(rows, bytes_read, bytes_written)
+    profiler = cProfile.Profile() if _claim("profile", s.stage, _profile_stages) else None
+    tracing = _claim("tracemalloc", s.stage, _trace_memory_stages)
+    started_tracing = False
+    if tracing:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_tracing = True
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+
+    stack.append(s)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        s.wall_s = time.perf_counter() - start
+        s.cpu_s = time.process_time() - cpu_start
+        s.peak_rss_mb = peak_rss_mb()
+        stack.pop()
+        if profiler is not None:
+            path = _profile_path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profiler.dump_stats(path)
+            s.attrs["profile"] = path
+            _release("profile")
+        if tracing:
+            s.traced_peak_mb = (tracemalloc.get_traced_memory()[1] - baseline) / 2**20
+            top = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP]
+            s.attrs["top_allocations"] = [f"{stat.traceback}: {stat.size / 2**20:.1f} MB" for stat in top]
+            if started_tracing:
+                tracemalloc.stop()
+            _release("tracemalloc")
+        if _run is not None:
+            _run.record(s)
+
+
+def record(span_dict):
+    """Adds a span measured elsewhere (e.g. in a worker process) to the active run."""
+    if _run is not None:
+        _run.record(span_dict)
+
+
+@contextmanager
+def run_report(name, output_dir=RUN_REPORTS_DIR):
+    """Collects the spans of a run and writes them to `<output_dir>/<name>-<timestamp>.json`.
+
+    The report is written even when the run fails (the error is in the
+    "run" entry). Inside another run, this is just a span of that run.
+    """
+    global _run
+    if _run is not None:
+        with span(name) as s:
+            yield s
+        return
+
+    _run = RunReport(name, output_dir)
+    root = Span(name)
+    stack = _stack()
+    stack.append(root)
+    start, cpu_start = time.perf_counter(), time.process_time()
+    try:
+        yield root
+    except BaseException as e:
+        root.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root.wall_s = time.perf_counter() - start
+        root.cpu_s = time.process_time() - cpu_start
+        root.peak_rss_mb = peak_rss_mb()
+        stack.pop()
+        report, _run = _run, None
+        # The run's own span gives its stage the run's total (nested steps are not added to it)
+        report.record(root)
+        try:
+            report.write(root)
+            print(report.summary())
+            print(f"Run report written to {report.path}")
+        except OSError as e:
+            print(f"[ERROR] Could not write the run report: {e}")
@@ -1,13 +1,28 @@
-
-from database_manager import setup_sql_server
+import argparse
+import instrumentation
+from data_helpers import SOURCES
+from database_manager import setup_target
 from etl_pipeline import run_etl_pipeline
 
-def main():
+def main(incremental=False, streaming=False, source=None, source_path=None):
     try:
-        setup_sql_server()
-        run_etl_pipeline()
+        # An incremental run must keep the existing schema, watermark and history.
+        if not incremental:
+            setup_target()
+        run_etl_pipeline(incremental=incremental, streaming=streaming, source=source, source_path=source_path)
     except Exception as e:
         print(f"\n[FATAL ERROR] Pipeline failed: {e}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Runs the Access -> SQL Server ETL and writes a run report to reports/runs/.")
+    parser.add_argument("--incremental", action="store_true", help="load only the orders past the watermark")
+    parser.add_argument("--streaming", action="store_true", help="stream the facts chunk by chunk")
+    parser.add_argument("--source", choices=list(SOURCES), help="extraction backend (default: EXTRACT_SOURCE in settings)")
+    parser.add_argument("--source-path", help="directory of access_<table>.csv/.parquet files, or the SQLite source file")
+    parser.add_argument("--profile", action="append", default=None, metavar="STAGE",
+                        help="run a stage (extract, transform, load, warehouse, aggregates) under cProfile (repeatable)")
+    parser.add_argument("--trace-memory", action="append", default=None, metavar="STAGE",
+                        help="trace a stage's Python allocations with tracemalloc (repeatable)")
+    args = parser.parse_args()
+    instrumentation.configure(profile=args.profile, trace_memory=args.trace_memory)
+    main(incremental=args.incremental, streaming=args.streaming, source=args.source, source_path=args.source_path)
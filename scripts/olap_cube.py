@@ -1,20 +1,31 @@
-
+import argparse
+import calendar
 import pandas as pd
-import pyodbc
-from settings import SQL_SERVER, SQL_DATABASE, DATA_DIR, FIGURES_DIR
+from cube import Cube, roll_up_grouping_sets
+from database_manager import (get_dialect, get_duckdb_connection, get_sqlite_connection, read_sql, target_connection,
+                              target_identity)
+from instrumentation import path_size, run_report, span
+from query_cache import QUERY_CACHE
+from report_export import SHEET_FORMATS, export_report
+from settings import FIGURES_DIR, OLAP_REPORT_MODE, OLAP_INCLUDE_RAW, OLAP_SHEET_FORMATS
 import os
 
-def get_connection():
-    from settings import SQL_DRIVER
-    conn_str = f"DRIVER={{{SQL_DRIVER}}};SERVER={SQL_SERVER};DATABASE={SQL_DATABASE};Trusted_Connection=yes;"
-    return pyodbc.connect(conn_str)
+CUBE_HIERARCHIES = {
+    "Date": ["Year", "Month", "Day"],
+    "Product": ["Category", "ProductName"],
+    "Geography": ["CustomerCountry", "CustomerCity"],
+}
 
-def generate_olap_report():
-    print("--- Starting OLAP Cube Analysis ---")
-    conn = get_connection()
-    
-    print("Fetching and Denormalizing Data from SQL Server...")
-    query = """
+REPORT_JOINS = """
+    FROM FactOrderDetails fd
+    JOIN FactOrders fo ON fd.OrderId = fo.OrderId
+    JOIN DimProduct p ON fd.ProductId = p.ProductId
+    JOIN DimCustomer c ON fo.CustomerId = c.CustomerId
+    JOIN DimEmployee e ON fo.EmployeeId = e.EmployeeId
+    LEFT JOIN DimDate dp ON fo.DateId = dp.DateId
+"""
+
+BASE_QUERY = f"""
     SELECT 
         fd.OrderId,
         fo.CustomerId,
@@ -30,55 +41,261 @@ def generate_olap_report():
         fd.Discount,
         (fd.UnitPrice * fd.Quantity * (1 - fd.Discount)) as Revenue,
         fo.DeliveredFlag
-    FROM FactOrderDetails fd
-    JOIN FactOrders fo ON fd.OrderId = fo.OrderId
-    JOIN DimProduct p ON fd.ProductId = p.ProductId
-    JOIN DimCustomer c ON fo.CustomerId = c.CustomerId
-    JOIN DimEmployee e ON fo.EmployeeId = e.EmployeeId
-    LEFT JOIN DimDate dp ON fo.DateId = dp.DateId
+    {REPORT_JOINS}
+"""
+
+# Every aggregate the report needs, computed in one scan: name -> grouping columns ([] is the grand total)
+REPORT_GROUPING_SETS = {
+    "year_month_country": ["Year", "Month", "CustomerCountry"],
+    "year_country": ["Year", "CustomerCountry"],
+    "category_product": ["Category", "ProductName"],
+    "category_country": ["Category", "CustomerCountry"],
+    "total": [],
+}
+REPORT_MEASURES = ["Revenue", "Quantity"]
+
+SLICE_CATEGORY = "Beverages"
+DICE_YEARS = [2006]
+DICE_COUNTRIES = ["USA", "UK", "France", "Germany"]
+
+# Grouping column -> SQL expression, per dialect where it differs
+GROUPING_EXPRESSIONS = {
+    "Year": {"mssql": "YEAR(dp.FullDate)", "duckdb": "YEAR(dp.FullDate)",
+             "sqlite": "CAST(strftime('%Y', dp.FullDate) AS INTEGER)"},
+    "Month": "dp.Month",
+    "CustomerCountry": "c.Country",
+    "Category": "p.Category",
+    "ProductName": "p.ProductName",
+}
+
+
+def grouping_sets_query(dialect, sets=REPORT_GROUPING_SETS):
+    """Builds the single aggregate query behind the report.
+
+    SQL Server and DuckDB compute every set with GROUP BY GROUPING SETS and flag
+    each row's set with GROUPING(); SQLite has no grouping sets, so it groups
+    once at the grain of all the sets' columns and the sets are rolled up from
+    that in pandas (see read_report_sets).
     """
-    
-    df = pd.read_sql(query, conn)
-    conn.close()
-    
-    df["FullDate"] = pd.to_datetime(df["FullDate"])
-    df["Year"] = df["FullDate"].dt.year
-    df["Month"] = df["FullDate"].dt.month_name()
-    
-    print(f"Base Cube Loaded: {len(df)} records.")
+    grain = list(dict.fromkeys(col for by in sets.values() for col in by))
+    exprs = {}
+    for col in grain:
+        expr = GROUPING_EXPRESSIONS[col]
+        exprs[col] = expr[dialect] if isinstance(expr, dict) else expr
+    select = [f"{expr} AS {col}" for col, expr in exprs.items()] + [
+        "SUM(fd.UnitPrice * fd.Quantity * (1 - fd.Discount)) AS Revenue",
+        "SUM(fd.Quantity) AS Quantity",
+        "COUNT(*) AS Lines",
+    ]
+    if dialect == "sqlite":
+        group_by = ", ".join(exprs.values())
+    else:
+        select += [f"GROUPING({expr}) AS Grouping_{col}" for col, expr in exprs.items()]
+        group_by = "GROUPING SETS ({})".format(
+            ", ".join("(" + ", ".join(exprs[col] for col in by) + ")" for by in sets.values())
+        )
+    return f"SELECT {', '.join(select)} {REPORT_JOINS} GROUP BY {group_by}"
 
-    # Roll-up: Revenue by Year and Country
-    rollup_revenue = df.groupby(["Year", "CustomerCountry"])["Revenue"].sum().reset_index()
-    print("OLAP Operation: Roll-up (Revenue by Year, Country) done.")
 
-    # Slice: Orders for a specific category, e.g., 'Beverages'
-    slice_beverages = df[df["Category"] == "Beverages"].copy()
-    print(f"OLAP Operation: Slice (Category='Beverages') done.")
+def read_report_sets(conn, sets=REPORT_GROUPING_SETS):
+    """Runs the grouping-sets query; only aggregated rows come back from the database."""
+    dialect = get_dialect(conn)
+    df = read_sql(grouping_sets_query(dialect, sets), conn)
+    measures = REPORT_MEASURES + ["Lines"]
+    if dialect == "sqlite":
+        results = roll_up_grouping_sets(df, sets, measures)
+    else:
+        results = {}
+        grain = [col[len("Grouping_"):] for col in df.columns if col.startswith("Grouping_")]
+        for name, by in sets.items():
+            # GROUPING() is 0 for the columns a row is grouped by and 1 for the rolled-up ones
+            mask = pd.Series(True, index=df.index)
+            for col in grain:
+                mask &= df[f"Grouping_{col}"] == (0 if col in by else 1)
+            frame = df.loc[mask, by + measures].sort_values(by, na_position="first").reset_index(drop=True)
+            for col in by:
+                # Integer keys come back as float, since the rolled-up rows hold NULLs in the same column
+                if frame[col].dtype.kind == "f" and frame[col].notna().all():
+                    frame[col] = frame[col].astype("int64")
+            results[name] = frame
+    for frame in results.values():
+        if "Month" in frame.columns:
+            frame["Month"] = frame["Month"].map(lambda m: calendar.month_name[int(m)] if pd.notna(m) else None)
+    return results
 
-    # Dice: Revenue in 2006 for top countries
-    dice_2006_top = df[
-        (df["Year"] == 2006) & 
-        (df["CustomerCountry"].isin(["USA", "UK", "France", "Germany"]))
-    ].copy()
-    print("OLAP Operation: Dice (2006 & Top Countries) done.")
 
-    # Pivot: Revenue by Category vs Country
-    pivot_revenue = pd.pivot_table(df, values="Revenue", index="Category", columns="CustomerCountry", aggfunc="sum", fill_value=0)
-    print("OLAP Operation: Pivot (Revenue by Category vs Country) done.")
+def report_sheets(sets):
+    """Turns the grouping-set aggregates into the report's roll-up, slice, dice and pivot sheets."""
+    year_country = sets["year_country"]
+    products = sets["category_product"]
+    months = sets["year_month_country"]
+    by_country = sets["category_country"].dropna(subset=["Category", "CustomerCountry"])
+    return {
+        "Revenue_Year_Country": year_country[["Year", "CustomerCountry", "Revenue"]],
+        "Slice_Beverages": products[products["Category"] == SLICE_CATEGORY],
+        "Dice_2006_Top": months[months["Year"].isin(DICE_YEARS) & months["CustomerCountry"].isin(DICE_COUNTRIES)],
+        "Pivot_Category_Country": by_country.pivot(index="Category", columns="CustomerCountry", values="Revenue").fillna(0),
+        "Grand_Total": sets["total"],
+    }
+
+
+def build_report_cube(df, cache=None, cache_key=None):
+    """The report's cube over OLAP-shaped order lines (see analysis_context.OLAP_COLUMNS)."""
+    return Cube(
+        df,
+        dimensions={
+            "Year": df["Year"],
+            "Month": pd.Categorical(df["Month"], categories=list(calendar.month_name)[1:], ordered=True),
+            "Day": df["FullDate"].dt.day,
+            "Category": df["Category"],
+            "ProductName": df["ProductName"],
+            "CustomerCountry": df["CustomerCountry"],
+            "CustomerCity": df["CustomerCity"],
+        },
+        measures=REPORT_MEASURES,
+        hierarchies=CUBE_HIERARCHIES,
+        cache=cache,
+        cache_key=cache_key,
+    )
+
+
+def generate_olap_report(context=None, mode=OLAP_REPORT_MODE, include_raw=OLAP_INCLUDE_RAW, conn=None,
+                         sheet_formats=OLAP_SHEET_FORMATS):
+    """Builds the OLAP workbook from the shared analysis context when given, otherwise from SQL Server.
+
+    "cube" mode (the default) keeps the detail rows behind the slice and dice
+    sheets. In the opt-in "grouping_sets" mode every sheet, plus a Grand_Total,
+    is an aggregate computed in one scan: pushed down to the database, or in one
+    pass over the order lines when they are already in memory or the raw sheet
+    is requested. `include_raw` None writes the raw sheet in "cube" mode only.
+    `conn` replaces the pooled SQL Server connection (e.g. a SQLite or DuckDB
+    copy of the star schema).
+    The workbook is streamed to disk (see report_export.export_report);
+    `sheet_formats` sends sheets to CSV/Parquet files instead, or skips them.
+    A run report of the read, aggregation and export steps is written (see instrumentation.py).
+    """
+    if include_raw is None:
+        include_raw = mode == "cube"
+    with run_report("olap") as run:
+        run.add(mode=mode, include_raw=include_raw)
+        _generate_olap_report(context, mode, include_raw, conn, sheet_formats)
+
+
+def _generate_olap_report(context, mode, include_raw, conn, sheet_formats):
+    print("--- Starting OLAP Cube Analysis ---")
+
+    def read_base_cube():
+        with target_connection(conn) as c:
+            df = read_sql(BASE_QUERY, c)
+        df["FullDate"] = pd.to_datetime(df["FullDate"])
+        df["Year"] = df["FullDate"].dt.year
+        df["Month"] = df["FullDate"].dt.month_name()
+        return df
+
+    def read_sets():
+        with target_connection(conn) as c:
+            return read_report_sets(c)
+
+    # A connection given by the caller is not the warehouse the query cache is versioned against
+    cache = QUERY_CACHE if conn is None else None
+    target = target_identity() if conn is None else None
+    cached = cache.get_or_compute if cache is not None else (lambda key, compute: compute())
+
+    df = None
+    with span("olap.read") as s:
+        if context is not None:
+            df = context.olap_frame()
+            cache, cache_key = QUERY_CACHE, context.cache_key
+        elif mode == "cube" or include_raw:
+            print("Fetching and Denormalizing Data from SQL Server...")
+            # Reused until the next ETL load; the cached frame is shared, so it is only read from here on
+            df = cached({"target": target, "sql": " ".join(BASE_QUERY.split()), "stage": "olap_base"},
+                        read_base_cube)
+            cache_key = f"olap_base:{target}"
+        s.add(rows=0 if df is None else len(df))
+
+    if df is None:
+        print("Aggregating the report's grouping sets in the database...")
+        with span("olap.grouping_sets", pushed_down=True) as s:
+            query = " ".join(grouping_sets_query("mssql").split())
+            sets = cached({"target": target, "sql": query, "stage": "olap_grouping_sets"}, read_sets)
+            s.add(rows=sum(len(frame) for frame in sets.values()))
+        print(f"Grouping sets loaded: {sum(len(s) for s in sets.values())} aggregate rows.")
+        sheets = report_sheets(sets)
+    else:
+        print(f"Base Cube Loaded: {len(df)} records.")
+        with span("olap.cube", rows=len(df)):
+            cube = build_report_cube(df, cache=cache, cache_key=cache_key)
+        with span(f"olap.{mode}", rows=len(df)):
+            if mode == "grouping_sets":
+                sheets = report_sheets(cube.grouping_sets(REPORT_GROUPING_SETS))
+                print("OLAP Operation: Grouping sets (roll-up, slice, dice, pivot) done in one pass.")
+            else:
+                sheets = cube_sheets(cube)
+        if include_raw:
+            sheets = {"Base_Cube_Raw": df, **sheets}
 
     output_path = os.path.join(FIGURES_DIR, "OLAP_Report.xlsx")
     print(f"Exporting to {output_path}...")
     
     try:
-        with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-            df.to_excel(writer, sheet_name="Base_Cube_Raw", index=False)
-            rollup_revenue.to_excel(writer, sheet_name="Revenue_Year_Country", index=False)
-            slice_beverages.to_excel(writer, sheet_name="Slice_Beverages", index=False)
-            dice_2006_top.to_excel(writer, sheet_name="Dice_2006_Top", index=False)
-            pivot_revenue.to_excel(writer, sheet_name="Pivot_Category_Country")
+        with span("olap.export", rows=sum(len(sheet) for sheet in sheets.values())) as s:
+            written = export_report(sheets, output_path, sheet_formats)
+            files = {path for targets in written.values() for path in targets if os.path.isabs(path)}
+            s.add(bytes_written=path_size(output_path, *files), sheets=len(sheets))
+        for sheet_name, targets in written.items():
+            if targets != [sheet_name]:
+                print(f"  {sheet_name}: {', '.join(targets) if targets else 'skipped'}")
         print("Report generated successfully.")
+        print(QUERY_CACHE.report())
     except Exception as e:
         print(f"Failed to write Excel: {e}")
 
+
+def cube_sheets(cube):
+    """The report's sheets as separate cube operations, with detail rows for the slice and dice."""
+    # Roll-up: Revenue by Year and Country (from Year > Month)
+    rollup_revenue = cube.roll_up(["Year", "Month", "CustomerCountry"], "Date", measures=["Revenue"])
+    print("OLAP Operation: Roll-up (Revenue by Year, Country) done.")
+
+    # Slice: Orders for a specific category, e.g., 'Beverages'
+    slice_beverages = cube.slice("Category", SLICE_CATEGORY).to_frame()
+    print(f"OLAP Operation: Slice (Category='{SLICE_CATEGORY}') done.")
+
+    # Dice: Revenue in 2006 for top countries
+    dice_2006_top = cube.dice({
+        "Year": DICE_YEARS,
+        "CustomerCountry": DICE_COUNTRIES,
+    }).to_frame()
+    print("OLAP Operation: Dice (2006 & Top Countries) done.")
+
+    # Pivot: Revenue by Category vs Country
+    pivot_revenue = cube.pivot("Category", "CustomerCountry", "Revenue")
+    print("OLAP Operation: Pivot (Revenue by Category vs Country) done.")
+
+    return {
+        "Revenue_Year_Country": rollup_revenue,
+        "Slice_Beverages": slice_beverages,
+        "Dice_2006_Top": dice_2006_top,
+        "Pivot_Category_Country": pivot_revenue,
+    }
+
+
 if __name__ == "__main__":
-    generate_olap_report()
+    parser = argparse.ArgumentParser(description="Builds figures/OLAP_Report.xlsx from the SQL star schema.")
+    parser.add_argument("--mode", choices=["cube", "grouping_sets"], default=OLAP_REPORT_MODE,
+                        help="\"grouping_sets\" computes every sheet as aggregates in one scan (slice/dice without detail rows)")
+    parser.add_argument("--raw", action=argparse.BooleanOptionalAction, default=OLAP_INCLUDE_RAW,
+                        help="include the Base_Cube_Raw detail sheet (by default in cube mode only)")
+    parser.add_argument("--sqlite", help="read from this SQLite copy of the star schema instead of SQL Server")
+    parser.add_argument("--duckdb", help="read from this DuckDB warehouse file instead of SQL Server")
+    parser.add_argument("--sheet-format", action="append", default=[], metavar="SHEET=FORMAT",
+                        help=f"write a sheet as one of {', '.join(SHEET_FORMATS)} (repeatable)")
+    args = parser.parse_args()
+    formats = dict(OLAP_SHEET_FORMATS)
+    formats.update(item.split("=", 1) for item in args.sheet_format)
+    if args.duckdb:
+        conn = get_duckdb_connection(args.duckdb)
+    else:
+        conn = get_sqlite_connection(args.sqlite) if args.sqlite else None
+    generate_olap_report(mode=args.mode, include_raw=args.raw, conn=conn, sheet_formats=formats)
@@ -0,0 +1,199 @@
+# query_cache.py
+import hashlib
+import json
+import os
+import pickle
+import threading
+import uuid
+from collections import OrderedDict
+import pandas as pd
+from database_manager import read_sql, target_identity
+from settings import WAREHOUSE_DIR, QUERY_CACHE_DIR, QUERY_CACHE_MEMORY_BYTES, QUERY_CACHE_DISK_BYTES
+
+LOAD_VERSION_PATH = os.path.join(WAREHOUSE_DIR, "load_version.json")
+
+
+def load_version():
+    """Returns the id of the last completed warehouse load ("0" before the first one)."""
+    try:
+        with open(LOAD_VERSION_PATH) as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return "0"
+
+
+def bump_load_version():
+    """Records a new warehouse load, which invalidates every cached query result."""
+    version = uuid.uuid4().hex[:12]
+    os.makedirs(WAREHOUSE_DIR, exist_ok=True)
+    tmp_path = f"{LOAD_VERSION_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "loaded_at": pd.Timestamp.now().isoformat()}, f)
+    os.replace(tmp_path, LOAD_VERSION_PATH)
+    return version
+
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class QueryCache:
+    """Two-tier cache of query results, scoped to the current warehouse load version.
+
+    Keys are any JSON-serializable description of a query (target database,
+    SQL text and parameters, or dimensions/measures/filters of a cube operation
+    on a frame named by its source). Results are
+    shared between callers and must not be modified in place. They are
+    kept in an in-memory LRU of at most `memory_bytes` and pickled under
+    `cache_dir`, trimmed oldest-first to `disk_bytes`. When the load version
+    changes, both tiers are dropped.
+    """
+
+    def __init__(self, cache_dir=QUERY_CACHE_DIR, memory_bytes=QUERY_CACHE_MEMORY_BYTES, disk_bytes=QUERY_CACHE_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # digest -> (value, size)
+        self._memory_used = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def _digest(self, key):
+        text = json.dumps(key, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, digest):
+        return os.path.join(self.cache_dir, f"{self._version}-{digest}.pkl")
+
+    def _check_version(self):
+        """Drops both tiers if a load completed since they were filled. Caller holds the lock."""
+        version = load_version()
+        if version == self._version:
+            return
+        if self._version is not None:
+            self.stats["invalidations"] += 1
+        self._version = version
+        self._memory.clear()
+        self._memory_used = 0
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if not name.startswith(f"{version}-"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def _remember(self, digest, value, size):
+        """Adds a result to the memory tier, evicting least recently used entries. Caller holds the lock."""
+        if size > self.memory_bytes:
+            return
+        self._memory[digest] = (value, size)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_used -= evicted
+            self.stats["evictions"] += 1
+
+    def _trim_disk(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        used = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if used <= self.disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            used -= size
+            self.stats["evictions"] += 1
+
+    def get(self, key):
+        """Returns (True, result) on a hit, (False, None) on a miss."""
+        with self._lock:
+            self._check_version()
+            digest = self._digest(key)
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                self.stats["memory_hits"] += 1
+                return True, self._memory[digest][0]
+            path = self._path(digest)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        value = pickle.load(f)
+                except Exception:
+                    pass
+                else:
+                    os.utime(path)
+                    self._remember(digest, value, _size_of(value))
+                    self.stats["disk_hits"] += 1
+                    return True, value
+            self.stats["misses"] += 1
+            return False, None
+
+    def put(self, key, value):
+        with self._lock:
+            self._check_version()
+            digest = self._digest(key)
+            self._remember(digest, value, _size_of(value))
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._path(digest)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self._trim_disk()
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached result for key, computing and storing it on a miss."""
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._memory.clear()
+            self._memory_used = 0
+            if os.path.isdir(self.cache_dir):
+                for name in os.listdir(self.cache_dir):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def report(self):
+        lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        rate = hits / lookups if lookups else 0.0
+        return (f"Query cache: {hits}/{lookups} hits ({rate:.0%}; memory {self.stats['memory_hits']}, "
+                f"disk {self.stats['disk_hits']}), {self.stats['evictions']} evictions")
+
+
+QUERY_CACHE = QueryCache()
+
+
+def cached_read_sql(query, conn, params=None, cache=QUERY_CACHE):
+    """read_sql through the query cache, keyed by the target database, SQL text and parameters.
+
+    Queries on in-memory databases are not cached.
+    """
+    target = target_identity(conn)
+    if target is None:
+        return read_sql(query, conn, params=params)
+    return cache.get_or_compute(
+        {"target": target, "sql": " ".join(query.split()), "params": list(params) if params else None},
+        lambda: read_sql(query, conn, params=params),
+    )
@@ -0,0 +1,95 @@
+# report_export.py
+import os
+import pandas as pd
+from openpyxl import Workbook
+from database_manager import native_values
+
+# Excel's hard limit per worksheet, header row included
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_SHEET_NAME_LENGTH = 31
+# Rows converted to Python values at a time; bounds the export's working memory
+EXPORT_CHUNK_ROWS = 50_000
+
+SHEET_FORMATS = ("xlsx", "csv", "parquet", "skip")
+
+
+def _flat(frame):
+    """Moves a meaningful index (pivot row labels) into columns, as to_excel(index=True) would.
+
+    Only a named index or a MultiIndex counts: the positional index left by
+    filtering rows (slice, dice) is dropped, as to_excel(index=False) did.
+    """
+    if isinstance(frame.index, pd.MultiIndex) or frame.index.name is not None:
+        return frame.reset_index()
+    if isinstance(frame.index, pd.RangeIndex) and frame.index.start == 0 and frame.index.step == 1:
+        return frame
+    return frame.reset_index(drop=True)
+
+
+def _native_rows(frame):
+    """Yields rows of plain Python values (None for missing), one chunk at a time."""
+    for start in range(0, len(frame), EXPORT_CHUNK_ROWS):
+        chunk = frame.iloc[start:start + EXPORT_CHUNK_ROWS]
+        yield from zip(*(native_values(s) for _, s in chunk.items()))
+
+
+def _part_names(name, n_parts):
+    if n_parts == 1:
+        return [name[:EXCEL_SHEET_NAME_LENGTH]]
+    names = []
+    for i in range(1, n_parts + 1):
+        suffix = f"_{i}"
+        names.append(name[:EXCEL_SHEET_NAME_LENGTH - len(suffix)] + suffix)
+    return names
+
+
+def _append_sheet(workbook, name, frame):
+    """Streams a frame into write-only worksheets, continuing on a new one past Excel's row limit."""
+    per_part = EXCEL_MAX_ROWS - 1
+    n_parts = max(1, -(-len(frame) // per_part))
+    names = _part_names(name, n_parts)
+    header = [str(c) for c in frame.columns]
+    rows = _native_rows(frame)
+    for part, part_name in enumerate(names):
+        ws = workbook.create_sheet(part_name)
+        ws.append(header)
+        for _ in range(min(per_part, len(frame) - part * per_part)):
+            ws.append(next(rows))
+    return names
+
+
+def export_report(sheets, output_path, formats=None):
+    """Writes {sheet name: frame} to an .xlsx workbook in constant memory.
+
+    The workbook is written with openpyxl's write-only mode, which streams rows
+    to disk instead of building every cell in memory. Sheets longer than Excel's
+    row limit continue on `<name>_2`, `<name>_3`, ... `formats` maps a sheet
+    name to "csv" or "parquet" (written next to the workbook as
+    `<report>_<sheet>.<ext>`) or "skip"; other sheets go to the workbook.
+    Returns {sheet name: [worksheets or files written]}.
+    """
+    formats = formats or {}
+    unknown = {name: fmt for name, fmt in formats.items() if fmt not in SHEET_FORMATS}
+    if unknown:
+        raise ValueError(f"Unknown sheet formats {unknown}; expected one of {SHEET_FORMATS}")
+    base, _ = os.path.splitext(output_path)
+    workbook = Workbook(write_only=True)
+    written = {}
+    for name, frame in sheets.items():
+        fmt = formats.get(name, "xlsx")
+        frame = _flat(frame)
+        if fmt == "skip":
+            written[name] = []
+        elif fmt == "csv":
+            path = f"{base}_{name}.csv"
+            frame.to_csv(path, index=False, chunksize=EXPORT_CHUNK_ROWS)
+            written[name] = [path]
+        elif fmt == "parquet":
+            path = f"{base}_{name}.parquet"
+            frame.to_parquet(path, index=False)
+            written[name] = [path]
+        else:
+            written[name] = _append_sheet(workbook, name, frame)
+    if any(formats.get(name, "xlsx") == "xlsx" for name in sheets):
+        workbook.save(output_path)
+    return written
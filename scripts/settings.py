@@ -4,6 +4,7 @@ import os
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
+WAREHOUSE_DIR = os.path.join(DATA_DIR, "warehouse")
 FIGURES_DIR = os.path.join(BASE_DIR, "figures")
 ACCESS_DB_PATH = os.path.join(DATA_DIR, "Northwind 2012.accdb")
 
@@ -12,3 +13,73 @@ SQL_DATABASE = "Global_Northwind"
 SQL_DRIVER = "ODBC Driver 17 for SQL Server"
 
 ACCESS_DRIVER = "Microsoft Access Driver (*.mdb, *.accdb)"
+
+# Concurrent Access extraction; each worker leases its own pooled connection
+EXTRACT_WORKERS = 4
+
+# Shared connection pools (see connection_pool.py)
+ACCESS_POOL_SIZE = EXTRACT_WORKERS
+SQL_POOL_SIZE = 4
+POOL_IDLE_TIMEOUT = 300
+
+SQLITE_DB_PATH = os.path.join(WAREHOUSE_DIR, "northwind.sqlite")
+# Warehouse the ETL loads and the reports read: "sqlserver", or "duckdb" for the embedded file at DUCKDB_PATH
+WAREHOUSE_TARGET = "sqlserver"
+DUCKDB_PATH = os.path.join(WAREHOUSE_DIR, "northwind.duckdb")
+LOAD_BATCH_SIZE = 10000
+INCREMENTAL_LOOKBACK_DAYS = 30
+
+# Streaming mode: orders per chunk and chunks allowed to wait in each stage queue
+STREAM_CHUNK_SIZE = 50000
+STREAM_QUEUE_SIZE = 2
+
+# The Parquet warehouse replaces merged_northwind.csv; enable to keep exporting the wide CSV too.
+WAREHOUSE_EXPORT_CSV = False
+
+# Query-result cache (see query_cache.py); invalidated whenever the ETL completes a load
+QUERY_CACHE_DIR = os.path.join(WAREHOUSE_DIR, "query_cache")
+QUERY_CACHE_MEMORY_BYTES = 256 * 1024 * 1024
+QUERY_CACHE_DISK_BYTES = 1024 * 1024 * 1024
+
+# Processes rendering figures in parallel (Kaleido PNG export dominates); 1 renders in-process
+FIGURE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Interactive figure pages (see html_export.py): "standalone" embeds plotly.js in every page; "shared"
+# pages load one versioned plotly-<version>.min.js next to them, carry trace arrays as typed binary and
+# get precompressed .gz siblings
+FIGURE_HTML_MODE = "shared"
+
+# Figure build cache (see build_cache.py): earlier builds kept per figure for instant restores
+BUILD_CACHE_KEEP = 3
+
+# OLAP report: "cube" keeps the detail rows behind the slice/dice sheets; "grouping_sets" (opt-in)
+# computes every sheet as aggregates in one scan, pushed down to SQL Server, and adds a Grand_Total
+# sheet, so its slice/dice sheets are aggregates. The raw sheet pulls every order line; None writes
+# it in "cube" mode only.
+OLAP_REPORT_MODE = "cube"
+OLAP_INCLUDE_RAW = None
+# Sheets written elsewhere than the streamed workbook: {sheet: "csv" | "parquet" | "skip"}
+OLAP_SHEET_FORMATS = {}
+
+# Synthetic data generator (see datagen.py): processes generating order chunks in parallel
+DATAGEN_WORKERS = os.cpu_count() or 1
+
+# Run reports (see instrumentation.py): one JSON file of timed spans per ETL, figure or OLAP run.
+# Stages listed here ("extract", "transform", "load", "warehouse", "aggregates", "figures", "olap")
+# are also run under cProfile (.prof files next to the report) or traced with tracemalloc.
+RUN_REPORTS_DIR = os.path.join(BASE_DIR, "reports", "runs")
+PROFILE_STAGES = set()
+TRACE_MEMORY_STAGES = set()
+
+# Extraction backend behind fetch_from_access (see sources.py): "odbc" reads the Access database
+# through its Windows ODBC driver; "files" reads Access-shaped access_<table>.csv/.parquet exports
+# with Arrow's multithreaded reader; "sqlite" reads a SQLite copy of the Access tables.
+EXTRACT_SOURCE = "odbc"
+EXTRACT_FILES_DIR = os.path.join(DATA_DIR, "exports")
+EXTRACT_SQLITE_PATH = os.path.join(DATA_DIR, "northwind_source.sqlite")
+
+# Employee orders viewer (see employee_orders.py): read every order once and index it by employee,
+# or read each employee's orders on first lookup and keep the last EMPLOYEE_ORDERS_CACHE_SIZE
+EMPLOYEE_ORDERS_PRELOAD = True
+EMPLOYEE_ORDERS_CACHE_SIZE = 32
+EMPLOYEE_ORDERS_PAGE_SIZE = 25
@@ -0,0 +1,400 @@
+# sources.py
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from connection_pool import ConnectionPool
+from settings import POOL_IDLE_TIMEOUT
+
+# Access source tables and the file stem of their exports (access_<stem>.csv)
+SOURCE_TABLES = {
+    "Customers": "customers",
+    "Employees": "employees",
+    "Products": "products",
+    "Orders": "orders",
+    "Order Details": "order_details",
+}
+
+# Read as text even when every value looks like a number, as the Access columns are
+TEXT_COLUMNS = ["ZIP/Postal Code", "Ship ZIP/Postal Code", "Business Phone", "Home Phone", "Mobile Phone",
+                "Fax Number", "Supplier IDs"]
+
+# Rows copied per INSERT batch by copy_to_sqlite
+SQLITE_COPY_BATCH = 100_000
+
+
+class UnsupportedQuery(ValueError):
+    """A query outside the SQL subset a file source evaluates itself."""
+
+
+def access_to_sqlite(query):
+    """Rewrites the Access SQL the scripts use into SQLite: `&` concatenation becomes `||`.
+
+    Bracketed identifiers ([Order ID]) are valid SQLite as they are.
+    """
+    parts = re.split(r"('(?:[^']|'')*')", query)
+    return "".join(part if i % 2 else part.replace("&", "||") for i, part in enumerate(parts))
+
+
+def _sqlite_param(value):
+    # Dates are stored as ISO text, as pandas' to_sql writes them
+    if isinstance(value, (datetime.datetime, pd.Timestamp)):
+        return pd.Timestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+class ExtractSource:
+    """Where fetch_from_access reads the Access-shaped source tables from.
+
+    Sources take the Access SQL the pipeline issues, with `?` parameters, and
+    return DataFrames with the Access column names.
+    """
+
+    name = "source"
+
+    def fetch(self, query, params=None):
+        raise NotImplementedError
+
+    def fetch_chunks(self, query, params=None, chunksize=50_000):
+        df = self.fetch(query, params)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+    def close(self):
+        pass
+
+
+class PooledSqlSource(ExtractSource):
+    """Runs queries on a pooled DB-API connection (the Access database through ODBC)."""
+
+    def __init__(self, pool, name="Access"):
+        self.pool = pool
+        self.name = name
+
+    def translate(self, query, params):
+        return query, params
+
+    def fetch(self, query, params=None):
+        query, params = self.translate(query, params)
+        with self.pool.connection() as conn:
+            return pd.read_sql(query, conn, params=params)
+
+    def fetch_chunks(self, query, params=None, chunksize=50_000):
+        query, params = self.translate(query, params)
+        with self.pool.connection() as conn:
+            yield from pd.read_sql(query, conn, params=params, chunksize=chunksize)
+
+    def close(self):
+        self.pool.close_all()
+
+
+class SqliteSource(PooledSqlSource):
+    """A SQLite copy of the Access tables (same table and column names), e.g. made by copy_to_sqlite."""
+
+    def __init__(self, path, pool_size=4):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"SQLite source {path} does not exist")
+        pool = ConnectionPool(lambda: sqlite3.connect(path, check_same_thread=False), max_size=pool_size,
+                              idle_timeout=POOL_IDLE_TIMEOUT, name="sqlite-source")
+        super().__init__(pool, name="SQLite")
+        self.path = path
+
+    def translate(self, query, params):
+        return access_to_sqlite(query), None if params is None else tuple(_sqlite_param(p) for p in params)
+
+
+# SQL subset evaluated by ArrowFileSource: SELECT <* | columns> FROM <table> [WHERE <predicate>]
+# [ORDER BY <column> [ASC|DESC], ...], where predicates combine column comparisons with `?` or literal
+# values, BETWEEN, IN (<subquery of the same form>), AND, OR and parentheses.
+_TOKEN = re.compile(r"\s*(?:(\[[^\]]+\])|('(?:[^']|'')*')|(\d+(?:\.\d+)?)|(>=|<=|<>|!=|[=<>(),*?])|([A-Za-z_]\w*))")
+_KEYWORDS = {"SELECT", "FROM", "WHERE", "ORDER", "BY", "AND", "OR", "BETWEEN", "IN", "ASC", "DESC"}
+_COMPARISONS = {"=": pc.equal, "<>": pc.not_equal, "!=": pc.not_equal, ">": pc.greater,
+                ">=": pc.greater_equal, "<": pc.less, "<=": pc.less_equal}
+
+
+def _tokenize(query):
+    tokens, pos, query = [], 0, query.strip().rstrip(";")
+    while pos < len(query):
+        m = _TOKEN.match(query, pos)
+        if m is None or m.end() == pos:
+            raise UnsupportedQuery(f"Cannot parse {query[pos:pos + 20]!r}")
+        pos = m.end()
+        name, string, number, symbol, word = m.groups()
+        if name:
+            tokens.append(("name", name[1:-1]))
+        elif string:
+            tokens.append(("value", string[1:-1].replace("''", "'")))
+        elif number:
+            tokens.append(("value", float(number) if "." in number else int(number)))
+        elif symbol:
+            tokens.append(("symbol", symbol))
+        elif word.upper() in _KEYWORDS:
+            tokens.append(("keyword", word.upper()))
+        else:
+            tokens.append(("name", word))
+    return tokens
+
+
+class _Parser:
+    """Compiles a query of the subset into (table, columns, predicate, order); `?` are numbered left to right."""
+
+    def __init__(self, query):
+        self.tokens = _tokenize(query)
+        self.pos = 0
+        self.n_params = 0
+
+    def peek(self, kind=None, value=None):
+        if self.pos >= len(self.tokens):
+            return False
+        k, v = self.tokens[self.pos]
+        return (kind is None or k == kind) and (value is None or v == value)
+
+    def take(self, kind, value=None):
+        if not self.peek(kind, value):
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of query"
+            raise UnsupportedQuery(f"Expected {value or kind}, found {found!r}")
+        self.pos += 1
+        return self.tokens[self.pos - 1][1]
+
+    def parse(self):
+        select = self.select()
+        if self.pos != len(self.tokens):
+            raise UnsupportedQuery(f"Unexpected {self.tokens[self.pos][1]!r}")
+        return select
+
+    def select(self):
+        self.take("keyword", "SELECT")
+        if self.peek("symbol", "*"):
+            self.take("symbol")
+            columns = None
+        else:
+            columns = [self.take("name")]
+            while self.peek("symbol", ","):
+                self.take("symbol")
+                columns.append(self.take("name"))
+        self.take("keyword", "FROM")
+        table = self.take("name")
+        predicate = None
+        if self.peek("keyword", "WHERE"):
+            self.take("keyword")
+            predicate = self.disjunction()
+        order = []
+        if self.peek("keyword", "ORDER"):
+            self.take("keyword")
+            self.take("keyword", "BY")
+            while True:
+                column = self.take("name")
+                direction = "ascending"
+                if self.peek("keyword", "ASC") or self.peek("keyword", "DESC"):
+                    direction = "descending" if self.take("keyword") == "DESC" else "ascending"
+                order.append((column, direction))
+                if not self.peek("symbol", ","):
+                    break
+                self.take("symbol")
+        return table, columns, predicate, order
+
+    def disjunction(self):
+        terms = [self.conjunction()]
+        while self.peek("keyword", "OR"):
+            self.take("keyword")
+            terms.append(self.conjunction())
+        return terms[0] if len(terms) == 1 else ("or", terms)
+
+    def conjunction(self):
+        terms = [self.factor()]
+        while self.peek("keyword", "AND"):
+            self.take("keyword")
+            terms.append(self.factor())
+        return terms[0] if len(terms) == 1 else ("and", terms)
+
+    def operand(self):
+        if self.peek("symbol", "?"):
+            self.take("symbol")
+            self.n_params += 1
+            return ("param", self.n_params - 1)
+        return ("value", self.take("value"))
+
+    def factor(self):
+        if self.peek("symbol", "("):
+            self.take("symbol")
+            inner = self.disjunction()
+            self.take("symbol", ")")
+            return inner
+        column = self.take("name")
+        if self.peek("keyword", "BETWEEN"):
+            self.take("keyword")
+            low = self.operand()
+            self.take("keyword", "AND")
+            return ("between", column, low, self.operand())
+        if self.peek("keyword", "IN"):
+            self.take("keyword")
+            self.take("symbol", "(")
+            subquery = self.select()
+            self.take("symbol", ")")
+            return ("in", column, subquery)
+        op = self.take("symbol")
+        if op not in _COMPARISONS:
+            raise UnsupportedQuery(f"Unsupported operator {op!r}")
+        return ("compare", op, column, self.operand())
+
+
+class ArrowFileSource(ExtractSource):
+    """Access-shaped table files read with Arrow: access_<table>.csv, .parquet, or a directory of Parquet parts.
+
+    CSV files are parsed by Arrow's multithreaded reader and kept in memory
+    (as Arrow tables) until the file changes, so the per-chunk queries of a
+    streaming load do not re-read them. The pipeline's SELECT/WHERE/ORDER BY
+    queries are evaluated with Arrow compute kernels; other SQL (joins,
+    expressions) runs on an in-memory SQLite copy of the tables it names.
+    """
+
+    name = "Arrow"
+
+    def __init__(self, directory):
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"Source directory {directory} does not exist")
+        self.directory = directory
+        self._tables = {}  # table -> (file mtime, Arrow table)
+        self._locks = {table: threading.Lock() for table in SOURCE_TABLES}
+        self._sqlite_lock = threading.Lock()
+        self._sqlite = None  # (mtimes of the copied tables, connection)
+
+    def _path(self, table):
+        stem = SOURCE_TABLES.get(table)
+        if stem is None:
+            raise KeyError(f"Unknown source table {table!r}; expected one of {list(SOURCE_TABLES)}")
+        for path in (f"access_{stem}.parquet", f"access_{stem}", f"access_{stem}.csv"):
+            path = os.path.join(self.directory, path)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"No access_{stem}.csv or .parquet in {self.directory}")
+
+    def _read(self, path):
+        if os.path.isdir(path) or path.endswith(".parquet"):
+            table = pq.read_table(path)
+        else:
+            table = pa_csv.read_csv(path, read_options=pa_csv.ReadOptions(use_threads=True),
+                                    convert_options=pa_csv.ConvertOptions(
+                                        column_types={c: pa.string() for c in TEXT_COLUMNS},
+                                        strings_can_be_null=True))
+        # Dates without a time of day (Shipped Date, Paid Date) are timestamps, as read through ODBC
+        for i, field in enumerate(table.schema):
+            if pa.types.is_date(field.type):
+                table = table.set_column(i, field.name, pc.cast(table.column(i), pa.timestamp("s")))
+        return table
+
+    def table(self, table):
+        """The whole source table as an Arrow table, read once per file version."""
+        path = self._path(table)
+        mtime = os.stat(path).st_mtime_ns
+        with self._locks[table]:
+            cached = self._tables.get(table)
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, self._read(path))
+                self._tables[table] = cached
+        return cached[1]
+
+    def _scalar(self, operand, params, column_type):
+        kind, value = operand
+        value = params[value] if kind == "param" else value
+        if isinstance(value, pd.Timestamp):
+            value = value.to_pydatetime()
+        try:
+            return pa.scalar(value, type=column_type)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, TypeError):
+            return pa.scalar(value)
+
+    def _mask(self, data, predicate, params):
+        kind = predicate[0]
+        if kind in ("and", "or"):
+            combine = pc.and_kleene if kind == "and" else pc.or_kleene
+            mask = self._mask(data, predicate[1][0], params)
+            for term in predicate[1][1:]:
+                mask = combine(mask, self._mask(data, term, params))
+            return mask
+        column = data.column(predicate[2] if kind == "compare" else predicate[1])
+        if kind == "compare":
+            return _COMPARISONS[predicate[1]](column, self._scalar(predicate[3], params, column.type))
+        if kind == "between":
+            return pc.and_kleene(pc.greater_equal(column, self._scalar(predicate[2], params, column.type)),
+                                 pc.less_equal(column, self._scalar(predicate[3], params, column.type)))
+        values = self._select(predicate[2], params)
+        return pc.is_in(column, value_set=pc.unique(values.column(0).combine_chunks()).cast(column.type))
+
+    def _select(self, select, params):
+        table, columns, predicate, order = select
+        data = self.table(table)
+        if predicate is not None:
+            data = data.filter(self._mask(data, predicate, params))
+        if order:
+            data = data.sort_by(order)
+        return data if columns is None else data.select(columns)
+
+    def query_arrow(self, query, params=None):
+        """Evaluates a query of the supported subset to an Arrow table (raises UnsupportedQuery otherwise)."""
+        parser = _Parser(query)
+        select = parser.parse()
+        params = list(params or ())
+        if len(params) != parser.n_params:
+            raise ValueError(f"Query has {parser.n_params} parameters, {len(params)} given")
+        return self._select(select, params)
+
+    def _sqlite_copy(self, tables):
+        """An in-memory SQLite database holding `tables`, rebuilt when one of their files changes."""
+        mtimes = {t: os.stat(self._path(t)).st_mtime_ns for t in tables}
+        with self._sqlite_lock:
+            if self._sqlite is None or any(self._sqlite[0].get(t) != m for t, m in mtimes.items()):
+                conn = sqlite3.connect(":memory:", check_same_thread=False)
+                for t in tables:
+                    self.table(t).to_pandas().to_sql(t, conn, index=False)
+                if self._sqlite is not None:
+                    self._sqlite[1].close()
+                self._sqlite = (mtimes, conn)
+            return self._sqlite[1]
+
+    def fetch(self, query, params=None):
+        try:
+            return self.query_arrow(query, params).to_pandas()
+        except UnsupportedQuery:
+            pass
+        tables = [t for t in SOURCE_TABLES if re.search(rf"(?:FROM|JOIN)\s+(?:\[{t}\]|{t}\b)", query, re.I)]
+        conn = self._sqlite_copy(tables)
+        params = None if params is None else tuple(_sqlite_param(p) for p in params)
+        with self._sqlite_lock:
+            return pd.read_sql(access_to_sqlite(query), conn, params=params)
+
+    def fetch_chunks(self, query, params=None, chunksize=50_000):
+        try:
+            result = self.query_arrow(query, params)
+        except UnsupportedQuery:
+            yield from super().fetch_chunks(query, params, chunksize)
+            return
+        for batch_start in range(0, result.num_rows, chunksize):
+            yield result.slice(batch_start, chunksize).to_pandas()
+
+    def close(self):
+        self._tables.clear()
+        if self._sqlite is not None:
+            self._sqlite[1].close()
+            self._sqlite = None
+
+
+def copy_to_sqlite(source, path, tables=SOURCE_TABLES):
+    """Copies the source tables into a SQLite file usable as a SqliteSource (replacing its tables)."""
+    conn = sqlite3.connect(path)
+    try:
+        for table in tables:
+            df = source.fetch(f"SELECT * FROM [{table}]")
+            df.to_sql(table, conn, index=False, if_exists="replace", chunksize=SQLITE_COPY_BATCH)
+            print(f"Copied {len(df)} rows of {table} to {path}")
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,132 @@
+# transform_spec.py
+from collections import namedtuple
+import pandas as pd
+
+# One target column: where it comes from, how it is typed and what fills missing values.
+# `source` is a column name, a tuple of names (joined with spaces) or None (constant `default`).
+Column = namedtuple("Column", ["target", "source", "dtype", "default"])
+
+DIM_CUSTOMER_SPEC = [
+    Column("CustomerId", "ID", "key", None),
+    Column("CompanyName", "Company", "str", "Unknown"),
+    Column("ContactName", ("First Name", "Last Name"), "str", "Unknown"),
+    Column("Address", "Address", "str", "Unknown"),
+    Column("City", "City", "str", "Unknown"),
+    Column("Region", "State/Province", "str", "Unknown"),
+    Column("PostalCode", "ZIP/Postal Code", "str", "Unknown"),
+    Column("Country", "Country/Region", "str", "Unknown"),
+    Column("Phone", "Business Phone", "str", "Unknown"),
+]
+
+DIM_EMPLOYEE_SPEC = [
+    Column("EmployeeId", "ID", "key", None),
+    Column("FirstName", "First Name", "str", "Unknown"),
+    Column("LastName", "Last Name", "str", "Unknown"),
+    Column("Title", "Job Title", "str", "Unknown"),
+    # Missing in Access
+    Column("BirthDate", None, "date", None),
+    Column("HireDate", None, "date", None),
+    Column("City", "City", "str", "Unknown"),
+    Column("Region", "State/Province", "str", "Unknown"),
+    Column("Country", "Country/Region", "str", "Unknown"),
+    Column("HomePhone", "Home Phone", "str", "Unknown"),
+]
+
+DIM_PRODUCT_SPEC = [
+    Column("ProductId", "ID", "int", None),
+    Column("ProductName", "Product Name", "str", "Unknown"),
+    Column("Category", "Category", "str", "Unknown"),
+    Column("UnitPrice", "List Price", "float", 0.0),
+]
+
+# Applied to a frame holding one FullDate per distinct order date
+DIM_DATE_SPEC = [
+    Column("FullDate", "FullDate", "date", None),
+    Column("DateId", "FullDate", "datekey", -1),
+    Column("Day", "FullDate", "day", None),
+    Column("Month", "FullDate", "month", None),
+    Column("MonthName", "FullDate", "month_name", None),
+]
+
+FACT_ORDERS_SPEC = [
+    Column("OrderId", "Order ID", "int", None),
+    Column("CustomerId", "Customer ID", "key", -1),
+    Column("EmployeeId", "Employee ID", "key", -1),
+    Column("DateId", "Order Date", "datekey", -1),
+    Column("ShippedDate", "Shipped Date", "date", None),
+    Column("ShippingFee", "Shipping Fee", "float", 0.0),
+    Column("Taxes", "Taxes", "float", 0.0),
+    Column("DeliveredFlag", "Shipped Date", "flag", None),
+]
+
+FACT_ORDER_DETAILS_SPEC = [
+    Column("OrderId", "Order ID", "int", 0),
+    Column("ProductId", "Product ID", "int", 0),
+    Column("UnitPrice", "Unit Price", "float", 0.0),
+    Column("Quantity", "Quantity", "int", 0),
+    Column("Discount", "Discount", "float", 0.0),
+]
+
+
+def _date_values(s):
+    return s if pd.api.types.is_datetime64_any_dtype(s) else pd.to_datetime(s)
+
+
+def _compile_column(col):
+    """Returns a function building one target Series from the source frame with vectorized ops only."""
+    source, default = col.source, col.default
+
+    if source is None:
+        if col.dtype == "date":
+            return lambda df: pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        return lambda df: pd.Series(default, index=df.index, dtype=object)
+
+    if isinstance(source, tuple):
+        def read(df):
+            joined = df[source[0]].fillna("").astype(str)
+            for name in source[1:]:
+                joined = joined + " " + df[name].fillna("").astype(str)
+            return joined.str.strip()
+    else:
+        def read(df):
+            return df[source]
+
+    if col.dtype == "str":
+        return lambda df: read(df).astype(object).fillna(default)
+    if col.dtype == "key":
+        # Integer ids stored as text keys; a missing id becomes the default (e.g. -1)
+        if default is None:
+            return lambda df: read(df).astype("int64").astype(str)
+        return lambda df: read(df).fillna(default).astype("int64").astype(str)
+    if col.dtype == "int":
+        if default is None:
+            return lambda df: read(df).astype("int64")
+        return lambda df: read(df).fillna(default).astype("int64")
+    if col.dtype == "float":
+        return lambda df: read(df).fillna(default).astype("float64")
+    if col.dtype == "date":
+        return lambda df: _date_values(read(df))
+    if col.dtype == "datekey":
+        def datekey(df):
+            d = _date_values(read(df))
+            key = d.dt.year * 10000 + d.dt.month * 100 + d.dt.day
+            return key.fillna(default).astype("int64")
+        return datekey
+    if col.dtype == "day":
+        return lambda df: _date_values(read(df)).dt.day.astype("int64")
+    if col.dtype == "month":
+        return lambda df: _date_values(read(df)).dt.month.astype("int64")
+    if col.dtype == "month_name":
+        return lambda df: _date_values(read(df)).dt.month_name()
+    if col.dtype == "flag":
+        return lambda df: read(df).notna().astype("int64")
+    raise ValueError(f"Unknown dtype '{col.dtype}' for column {col.target}")
+
+
+def compile_spec(spec):
+    """Compiles a column spec into a function mapping a source frame to the target frame."""
+    builders = [(col.target, _compile_column(col)) for col in spec]
+
+    def apply(df):
+        return pd.DataFrame({target: build(df) for target, build in builders}, index=df.index)
+    return apply
@@ -0,0 +1,404 @@
+# warehouse.py
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from instrumentation import path_size, span
+from settings import WAREHOUSE_DIR, WAREHOUSE_EXPORT_CSV
+
+# Star layout: order lines partitioned by Year/Month, one small file per dimension
+STAR_DIR = os.path.join(WAREHOUSE_DIR, "star")
+FACTS_DIR = os.path.join(STAR_DIR, "fact_order_lines")
+DIMENSIONS_DIR = os.path.join(STAR_DIR, "dimensions")
+LEGACY_CSV = os.path.join(WAREHOUSE_DIR, "merged_northwind.csv")
+
+PARTITION_COLS = ["Year", "Month"]
+
+# Dimension file -> (ETL frame, key column)
+DIMENSIONS = {
+    "DimCustomer": ("dim_customers", "CustomerId"),
+    "DimEmployee": ("dim_employees", "EmployeeId"),
+    "DimProduct": ("dim_products", "ProductId"),
+    "DimDate": ("dim_date", "DateId"),
+}
+
+# Column of the order-line facts; everything else is joined from a dimension on read
+FACT_COLUMNS = [
+    "OrderId", "ProductId", "UnitPrice", "Quantity", "Discount", "CustomerId", "EmployeeId", "DateId",
+    "ShippedDate", "ShippingFee", "Taxes", "DeliveredFlag", "FullDate", "Revenue", "Year", "Month",
+]
+
+# Wide column name -> (dimension, attribute). Names and suffixes match the former pre-joined file.
+DIMENSION_COLUMNS = {
+    "CompanyName": ("DimCustomer", "CompanyName"),
+    "ContactName": ("DimCustomer", "ContactName"),
+    "Address": ("DimCustomer", "Address"),
+    "City": ("DimCustomer", "City"),
+    "Region": ("DimCustomer", "Region"),
+    "PostalCode": ("DimCustomer", "PostalCode"),
+    "Country": ("DimCustomer", "Country"),
+    "Phone": ("DimCustomer", "Phone"),
+    "FirstName": ("DimEmployee", "FirstName"),
+    "LastName": ("DimEmployee", "LastName"),
+    "Title": ("DimEmployee", "Title"),
+    "BirthDate": ("DimEmployee", "BirthDate"),
+    "HireDate": ("DimEmployee", "HireDate"),
+    "City_emp": ("DimEmployee", "City"),
+    "Region_emp": ("DimEmployee", "Region"),
+    "Country_emp": ("DimEmployee", "Country"),
+    "HomePhone": ("DimEmployee", "HomePhone"),
+    "ProductName": ("DimProduct", "ProductName"),
+    "Category": ("DimProduct", "Category"),
+    "UnitPrice_prod": ("DimProduct", "UnitPrice"),
+    "Day": ("DimDate", "Day"),
+    "MonthName": ("DimDate", "MonthName"),
+}
+WIDE_COLUMNS = FACT_COLUMNS[:-2] + list(DIMENSION_COLUMNS) + PARTITION_COLS
+
+# Warehouse schema, applied when writing and when reading. Repetitive strings
+# are dictionary-encoded (pandas category, Parquet dictionary pages); integers
+# are downcast; money is fixed-point on disk (decimal, exact to 1/10000 like
+# SQL Server MONEY) and float in memory.
+DATE_COLS = ["FullDate", "ShippedDate", "BirthDate", "HireDate"]
+CATEGORY_COLS = [
+    "CompanyName", "ContactName", "Address", "City", "Region", "PostalCode",
+    "Country", "Phone", "FirstName", "LastName", "Title", "City_emp", "Region_emp", "Country_emp",
+    "HomePhone", "ProductName", "Category", "MonthName",
+]
+INT_COLS = {
+    "OrderId": "int32", "ProductId": "int32", "CustomerId": "int32", "EmployeeId": "int32",
+    "DateId": "int32", "Quantity": "int32",
+    "Year": "int16", "Month": "int8", "Day": "int8", "DeliveredFlag": "int8",
+}
+# column -> (decimal precision, scale on disk, dtype in memory)
+FIXED_POINT_COLS = {
+    "UnitPrice": (19, 4, "float64"),
+    "UnitPrice_prod": (19, 4, "float64"),
+    "ShippingFee": (19, 4, "float64"),
+    "Taxes": (19, 4, "float64"),
+    "Revenue": (19, 4, "float64"),
+    "Discount": (9, 4, "float32"),
+}
+
+
+def _to_int(s, dtype):
+    if not pd.api.types.is_numeric_dtype(s):
+        # Text keys of the SQL star schema (CustomerId, EmployeeId)
+        s = pd.to_numeric(s)
+    # Nullable integer type when a left join left gaps
+    return s.astype(dtype.capitalize() if s.isna().any() else dtype)
+
+
+def _sorted_categories(s):
+    """Drops unused categories and sorts the rest, so category codes follow label order (see cube.Dimension).
+
+    Rebuilding the codes also shrinks them from Arrow's int32 indices to the smallest integer type.
+    """
+    codes, categories = s.cat.codes.to_numpy(), s.cat.categories
+    used = np.bincount(codes[codes >= 0], minlength=len(categories)) > 0
+    kept = pd.Index(sorted(categories[used]), dtype=categories.dtype)
+    # Old code -> new code; the appended slot maps the missing-value code -1 to itself
+    remap = np.append(kept.get_indexer(categories), -1)
+    return pd.Series(pd.Categorical.from_codes(remap[codes], categories=kept), index=s.index, name=s.name)
+
+
+def apply_schema(df):
+    """Casts the columns of `df` that the warehouse schema declares; other columns are left as they are."""
+    df = df.copy(deep=False)
+    for col in DATE_COLS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col])
+    for col in CATEGORY_COLS:
+        if col in df.columns:
+            s = df[col]
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                s = s.astype("category")
+            df[col] = _sorted_categories(s)
+    for col, dtype in INT_COLS.items():
+        if col in df.columns:
+            df[col] = _to_int(df[col], dtype)
+    for col, (_, scale, dtype) in FIXED_POINT_COLS.items():
+        if col in df.columns:
+            df[col] = df[col].astype("float64").round(scale).astype(dtype)
+    return df
+
+
+def coerce_types(df):
+    """Gives the order lines their schema types and partition columns before they are written."""
+    full_date = pd.to_datetime(df["FullDate"])
+    return apply_schema(df.assign(FullDate=full_date, Year=full_date.dt.year, Month=full_date.dt.month))
+
+
+def _to_arrow(df):
+    """Converts a schema-typed frame to Arrow, storing money columns as fixed-point decimals."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for col, (precision, scale, _) in FIXED_POINT_COLS.items():
+        if col in table.column_names:
+            i = table.column_names.index(col)
+            table = table.set_column(i, col, pc.cast(table.column(i), pa.decimal128(precision, scale)))
+    return table
+
+
+def _from_arrow(table):
+    """Converts a warehouse table back to a schema-typed frame (decimals become floats in Arrow, not Python objects)."""
+    for col, (_, _, dtype) in FIXED_POINT_COLS.items():
+        if col in table.column_names:
+            i = table.column_names.index(col)
+            table = table.set_column(i, col, pc.cast(table.column(i), pa.from_numpy_dtype(dtype)))
+    return apply_schema(table.to_pandas())
+
+
+def _write_partitions(df):
+    """Writes order lines to their partitions as new files; returns the bytes written."""
+    # Grouping rows by partition first gives each file a few large row groups instead of one per input batch
+    df = df.sort_values(PARTITION_COLS, kind="stable")
+    written = []
+    pq.write_to_dataset(_to_arrow(df), FACTS_DIR, partition_cols=PARTITION_COLS,
+                        file_visitor=lambda f: written.append(f.path))
+    return sum(os.path.getsize(path) for path in written)
+
+
+def build_fact_lines(frames):
+    """Joins FactOrderDetails with FactOrders (and the order date) into the order-line facts."""
+    lines = frames["fact_order_details"].merge(frames["fact_orders"], on="OrderId", how="left")
+    dates = frames["dim_date"]
+    positions = _key_positions(dates["DateId"].to_numpy(), lines["DateId"].to_numpy())
+    lines["FullDate"] = _take(pd.to_datetime(dates["FullDate"]), positions)
+    lines["Revenue"] = lines["UnitPrice"] * lines["Quantity"] * (1 - lines["Discount"])
+    return lines
+
+
+def _dimension_path(name):
+    return os.path.join(DIMENSIONS_DIR, f"{name}.parquet")
+
+
+def write_dimensions(frames, replace=False):
+    """Writes the dimension frames present in `frames`, upserting by key unless `replace` is set.
+
+    Returns the bytes written.
+    """
+    os.makedirs(DIMENSIONS_DIR, exist_ok=True)
+    written = 0
+    for name, (frame_name, key) in DIMENSIONS.items():
+        if frame_name not in frames:
+            continue
+        dim = apply_schema(frames[frame_name])
+        path = _dimension_path(name)
+        if not replace and os.path.exists(path):
+            existing = read_dimension(name)
+            dim = apply_schema(pd.concat([existing[~existing[key].isin(dim[key])], dim], ignore_index=True))
+        pq.write_table(_to_arrow(dim.sort_values(key, ignore_index=True)), path)
+        _dimension_cache.pop(name, None)
+        written += os.path.getsize(path)
+    return written
+
+
+# Dimension name -> (file mtime, frame); dimensions are small and read by every query
+_dimension_cache = {}
+
+
+def read_dimension(name):
+    """Returns a dimension table (categorical attributes stay dictionary-encoded), cached until its file changes."""
+    path = _dimension_path(name)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _dimension_cache.get(name)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, _from_arrow(pq.read_table(path, read_dictionary=CATEGORY_COLS)))
+        _dimension_cache[name] = cached
+    return cached[1]
+
+
+def _key_positions(dim_keys, fact_keys):
+    """Returns, for each fact key, the row of that key in the dimension (-1 when absent).
+
+    Dense keys (surrogate ids) index a lookup array directly; sparse ones
+    (yyyymmdd DateIds) are found by binary search over the sorted keys.
+    """
+    dim_keys = np.asarray(dim_keys, dtype=np.int64)
+    fact_keys = np.asarray(fact_keys, dtype=np.int64)
+    if len(dim_keys) == 0:
+        return np.full(len(fact_keys), -1, dtype=np.int64)
+    low, high = dim_keys.min(), dim_keys.max()
+    if high - low <= 4 * len(dim_keys) + 1024:
+        lookup = np.full(high - low + 2, -1, dtype=np.int64)
+        lookup[dim_keys - low] = np.arange(len(dim_keys))
+        # Keys outside [low, high] land on the trailing -1 slot
+        offsets = fact_keys - low
+        offsets[(offsets < 0) | (offsets > high - low)] = high - low + 1
+        return lookup[offsets]
+    order = np.argsort(dim_keys, kind="stable")
+    sorted_keys = dim_keys[order]
+    found = np.searchsorted(sorted_keys, fact_keys).clip(max=len(sorted_keys) - 1)
+    return np.where(sorted_keys[found] == fact_keys, order[found], -1)
+
+
+def _take(values, positions):
+    """Gathers dimension attribute values by row position; -1 gives a missing value. Categoricals stay codes."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = np.append(values.cat.codes.to_numpy(), -1)[positions]
+        # Keeps only the labels the selected order lines use, as for a category column read from the facts
+        return _sorted_categories(pd.Series(pd.Categorical.from_codes(codes, dtype=values.dtype))).array
+    return pd.api.extensions.take(values.array, positions, allow_fill=True)
+
+
+def _partition_path(year, month):
+    return os.path.join(FACTS_DIR, f"Year={year}", f"Month={month}")
+
+
+def _partitions_of(df):
+    return set(zip(df["Year"].tolist(), df["Month"].tolist()))
+
+
+def locate_orders():
+    """The Year/Month partition of every order in the warehouse, as OrderId, Year and Month columns."""
+    if not os.path.exists(FACTS_DIR):
+        return pd.DataFrame({"OrderId": [], "Year": [], "Month": []}, dtype="int64")
+    return read_warehouse(columns=["OrderId"] + PARTITION_COLS).drop_duplicates(ignore_index=True)
+
+
+def write_warehouse(frames, replaced_order_ids=None, export_csv=WAREHOUSE_EXPORT_CSV, located=None):
+    """Writes the ETL frames as order-line facts partitioned by Year/Month plus one file per dimension.
+
+    With replaced_order_ids, only the partitions holding those orders (before or
+    after the change) are rewritten and the dimensions are upserted; the rest of
+    the history is left on disk. The orders' current partitions are looked up
+    in `located` (see locate_orders), which callers writing several batches of
+    distinct orders read once; by default they are read from the warehouse.
+    """
+    with span("warehouse.write", incremental=replaced_order_ids is not None) as s:
+        df = coerce_types(build_fact_lines(frames)[FACT_COLUMNS[:-2]])
+
+        if replaced_order_ids is None:
+            reset_warehouse()
+            touched = _partitions_of(df)
+        elif not os.path.exists(FACTS_DIR):
+            # No facts to replace yet; the dimensions on disk (e.g. just written by the streaming ETL) are kept
+            os.makedirs(FACTS_DIR)
+            touched = _partitions_of(df)
+        else:
+            replaced = set(int(i) for i in replaced_order_ids)
+            if located is None:
+                located = locate_orders()
+            touched = _partitions_of(df) | _partitions_of(located[located["OrderId"].isin(replaced)])
+            kept = []
+            for year, month in touched:
+                path = _partition_path(year, month)
+                if os.path.exists(path):
+                    part = _from_arrow(pq.read_table(path))
+                    part["Year"], part["Month"] = year, month
+                    kept.append(part[~part["OrderId"].isin(replaced)])
+                    shutil.rmtree(path)
+            if kept:
+                df = pd.concat(kept + [df], ignore_index=True)
+            df = coerce_types(df)
+
+        written = _write_partitions(df) if not df.empty else 0
+        written += write_dimensions(frames, replace=replaced_order_ids is None)
+        s.add(rows=len(df), partitions=len(touched), bytes_written=written)
+        print(f"Warehouse written to {STAR_DIR} ({len(touched)} partitions, {len(df)} order lines)")
+
+    if export_csv:
+        export_wide_csv()
+
+
+def reset_warehouse():
+    """Removes the facts and dimensions, before a full load."""
+    if os.path.exists(STAR_DIR):
+        shutil.rmtree(STAR_DIR)
+    _dimension_cache.clear()
+
+
+def append_warehouse(frames):
+    """Adds order lines to their Year/Month partitions as new files and upserts the dimensions in `frames`."""
+    with span("warehouse.append") as s:
+        df = coerce_types(build_fact_lines(frames)[FACT_COLUMNS[:-2]])
+        written = _write_partitions(df) if not df.empty else 0
+        written += write_dimensions(frames)
+        s.add(rows=len(df), bytes_written=written)
+
+
+def export_wide_csv():
+    """Exports the whole warehouse, joined with every dimension, as the legacy wide CSV."""
+    with span("warehouse.export_csv") as s:
+        df = read_warehouse()
+        df.to_csv(LEGACY_CSV, index=False)
+        s.add(rows=len(df), bytes_written=path_size(LEGACY_CSV))
+    print(f"Denormalized CSV exported to {LEGACY_CSV}")
+
+
+def _date_filter(start, end):
+    """Builds a row filter on FullDate plus a Year/Month filter that prunes partitions."""
+    expr = None
+    year_month = ds.field("Year") * 100 + ds.field("Month")
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = (year_month >= start.year * 100 + start.month) & (ds.field("FullDate") >= start)
+    if end is not None:
+        end = pd.Timestamp(end)
+        upper = (year_month <= end.year * 100 + end.month) & (ds.field("FullDate") <= end)
+        expr = upper if expr is None else expr & upper
+    return expr
+
+
+def read_warehouse(columns=None, start=None, end=None):
+    """Reads the order lines, projecting `columns` and keeping FullDate within [start, end].
+
+    Only the partitions overlapping the date range and only the requested fact
+    columns are read. Dimension attributes (CompanyName, ProductName, ...) are
+    joined afterwards, for the dimensions asked for only, by looking up each
+    fact key's row in the dimension. Columns default to the wide layout of the
+    former pre-joined file. Falls back to the legacy merged_northwind.csv when
+    the warehouse has not been built yet.
+    """
+    if not os.path.exists(FACTS_DIR):
+        return _read_legacy_csv(columns, start, end)
+
+    columns = WIDE_COLUMNS if columns is None else list(columns)
+    unknown = [c for c in columns if c not in FACT_COLUMNS and c not in DIMENSION_COLUMNS]
+    if unknown:
+        raise KeyError(f"Unknown warehouse columns {unknown}")
+    needed = {}
+    for col in columns:
+        if col in DIMENSION_COLUMNS:
+            dim, attr = DIMENSION_COLUMNS[col]
+            needed.setdefault(dim, {})[col] = attr
+    keys = [DIMENSIONS[dim][1] for dim in needed]
+    fact_columns = list(dict.fromkeys([c for c in columns if c in FACT_COLUMNS] + keys))
+
+    dataset = ds.dataset(FACTS_DIR, format="parquet", partitioning="hive")
+    facts = _from_arrow(dataset.to_table(columns=fact_columns, filter=_date_filter(start, end)))
+
+    joined = {}
+    for dim, attrs in needed.items():
+        dimension = read_dimension(dim)
+        key = DIMENSIONS[dim][1]
+        positions = _key_positions(dimension[key].to_numpy(), facts[key].to_numpy())
+        for col, attr in attrs.items():
+            joined[col] = _take(dimension[attr], positions)
+    joined = pd.DataFrame(joined, index=facts.index)
+    return pd.concat([facts, joined], axis=1)[columns]
+
+
+def _read_legacy_csv(columns, start, end):
+    if not os.path.exists(LEGACY_CSV):
+        raise FileNotFoundError(f"Warehouse data not found at {FACTS_DIR} or {LEGACY_CSV}")
+    usecols = None
+    if columns is not None:
+        # Year is derived from FullDate, which is also needed for date filtering
+        usecols = list(dict.fromkeys([c for c in columns if c != "Year"] + ["FullDate"]))
+    df = pd.read_csv(LEGACY_CSV, usecols=usecols)
+    if "FullDate" in df.columns:
+        df["FullDate"] = pd.to_datetime(df["FullDate"])
+    if start is not None:
+        df = df[df["FullDate"] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df["FullDate"] <= pd.Timestamp(end)]
+    if columns is None or "Year" in columns:
+        df["Year"] = df["FullDate"].dt.year
+    if columns is not None:
+        df = df[columns]
+    return apply_schema(df.reset_index(drop=True))